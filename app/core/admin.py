@@ -8,8 +8,8 @@ from .models import (ECCRConfiguration, MetadataFieldOverwrite,
 
 @admin.register(XSRConfiguration)
 class XSRConfigurationAdmin(admin.ModelAdmin):
-    list_display = ('xsr_api_endpoint', 'token')
-    fields = ['xsr_api_endpoint', 'token']
+    list_display = ('xsr_api_endpoint', 'token', 'max_workers')
+    fields = ['xsr_api_endpoint', 'token', 'max_workers']
 
 
 @admin.register(ECCRConfiguration)
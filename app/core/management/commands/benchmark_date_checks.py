@@ -0,0 +1,103 @@
+import time
+
+from core.management.commands.benchmark_source_normalization import \
+    read_search_result_items
+from core.management.utils.xia_internal import (clear_date_cache, dict_flatten,
+                                                is_date)
+from core.management.utils.xsr_client import is_date_path
+from dateutil.parser import parse
+from django.core.management.base import BaseCommand, CommandError
+
+
+def get_date_values(source_data):
+    """Collect the string values of the date fields of search result
+    items"""
+    date_values = []
+    for item in source_data:
+        for path, value in dict_flatten(item, []).items():
+            if is_date_path(path) and isinstance(value, str):
+                date_values.append(value)
+    return date_values
+
+
+def is_date_with_dateutil(string):
+    """Check a string is a date with dateutil, the way dates were checked
+    before ISO 8601 dates were recognized and results cached"""
+    try:
+        parse(string)
+        return True
+    except (ValueError, OverflowError):
+        return False
+
+
+def is_date_uncached(string):
+    """Check a string is a date with an empty cache, the way the first
+    check of a string is"""
+    clear_date_cache()
+    return is_date(string)
+
+
+def time_date_checks(check, date_values, repeat):
+    """Return the best time taken to check every value along with the
+    results"""
+    best = None
+    results = []
+    for _ in range(repeat):
+        clear_date_cache()
+        start_time = time.perf_counter()
+        results = [check(value) for value in date_values]
+        elapsed = time.perf_counter() - start_time
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, results
+
+
+class Command(BaseCommand):
+    """Django command comparing the time taken to check date values with
+    dateutil and with the ISO 8601 fast path and cache of is_date"""
+
+    help = ('Check the date values of saved XSR search results with dateutil '
+            'and with is_date, check both give the same results and compare '
+            'the time taken')
+
+    def add_arguments(self, parser):
+        parser.add_argument('source_file',
+                            help='XSR search response or list of search '
+                                 'result items in JSON')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Number of times each check is timed')
+
+    def handle(self, *args, **options):
+        date_values = get_date_values(
+            read_search_result_items(options['source_file']))
+        repeat = max(options['repeat'], 1)
+        if not date_values:
+            raise CommandError("No date values in the search results")
+
+        dateutil_time, dateutil_results = time_date_checks(
+            is_date_with_dateutil, date_values, repeat)
+        uncached_time, uncached_results = time_date_checks(
+            is_date_uncached, date_values, repeat)
+        is_date_time, is_date_results = time_date_checks(
+            is_date, date_values, repeat)
+
+        self.stdout.write(
+            f"Checked {len(date_values)} date values, "
+            f"{len(set(date_values))} distinct, best of {repeat} runs")
+        self.stdout.write(f"dateutil: {dateutil_time:.4f} seconds")
+        self.stdout.write(f"is_date without cache: {uncached_time:.4f} "
+                          f"seconds")
+        self.stdout.write(f"is_date: {is_date_time:.4f} seconds")
+        if is_date_time:
+            self.stdout.write(
+                f"speedup: {dateutil_time / is_date_time:.1f}x")
+
+        mismatches = sum(
+            dateutil_result != uncached_result or
+            dateutil_result != is_date_result
+            for dateutil_result, uncached_result, is_date_result
+            in zip(dateutil_results, uncached_results, is_date_results))
+        if mismatches:
+            raise CommandError(f"{mismatches} date checks differ between "
+                               f"dateutil and is_date")
+        self.stdout.write(self.style.SUCCESS("Date checks are identical"))
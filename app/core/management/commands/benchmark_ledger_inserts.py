@@ -0,0 +1,85 @@
+import statistics
+import time
+import uuid
+
+from core.management.utils.record_uuid import uuid7
+from core.models import MetadataLedger
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+
+def create_ledger_records(rows, create_uuid):
+    """Create unsaved MetadataLedger records with keys from create_uuid"""
+    records = []
+    for row in range(rows):
+        key = 'benchmark_' + str(row)
+        records.append(MetadataLedger(
+            metadata_record_uuid=create_uuid(),
+            record_lifecycle_status='Active',
+            source_metadata={'row': row},
+            source_metadata_hash=row.to_bytes(32, 'big'),
+            source_metadata_key=key,
+            source_metadata_key_hash=key))
+    return records
+
+
+def time_bulk_insert(rows, batch_size, create_uuid):
+    """Return the time taken to bulk insert rows records, rolling the
+    inserts back afterwards. Records are inserted with a plain QuerySet so
+    only the inserts are timed, not the sanitizing of MetadataLedger
+    bulk_create"""
+    records = create_ledger_records(rows, create_uuid)
+    queryset = models.QuerySet(MetadataLedger)
+    with transaction.atomic():
+        start_time = time.perf_counter()
+        queryset.bulk_create(records, batch_size=batch_size)
+        elapsed = time.perf_counter() - start_time
+        transaction.set_rollback(True)
+    return elapsed
+
+
+class Command(BaseCommand):
+    """Django command comparing the bulk insert throughput of MetadataLedger
+    with random and time ordered primary keys"""
+
+    help = ('Bulk insert MetadataLedger records with random and time ordered '
+            'UUIDs in alternating rounds, each in a transaction that is '
+            'rolled back, and compare the median records inserted per '
+            'second')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000,
+                            help='Number of records inserted per run')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of records per insert statement')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Number of rounds each key type is timed in')
+
+    def handle(self, *args, **options):
+        rows = max(options['rows'], 1)
+        batch_size = max(options['batch_size'], 1)
+        repeat = max(options['repeat'], 1)
+
+        key_types = (('random', uuid.uuid4), ('ordered', uuid7))
+        # an untimed run warms up the buffer pool for both key types
+        time_bulk_insert(rows, batch_size, uuid.uuid4)
+        timings = {name: [] for name, _ in key_types}
+        for run in range(repeat):
+            # alternate which key type goes first in each round
+            for name, create_uuid in key_types[::1 if run % 2 else -1]:
+                timings[name].append(time_bulk_insert(rows, batch_size,
+                                                      create_uuid))
+
+        results = {name: statistics.median(times)
+                   for name, times in timings.items()}
+        for name, _ in key_types:
+            self.stdout.write(
+                f"{name}: {results[name]:.4f} seconds, "
+                f"{rows / results[name]:.0f} records per second")
+
+        self.stdout.write(
+            f"Inserted {rows} records in batches of {batch_size}, median of "
+            f"{repeat} rounds")
+        if results['ordered']:
+            self.stdout.write(
+                f"speedup: {results['random'] / results['ordered']:.2f}x")
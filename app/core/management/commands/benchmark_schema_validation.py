@@ -0,0 +1,139 @@
+import json
+import time
+
+from core.management.utils.schema_validator import SchemaValidator
+from core.management.utils.xia_internal import dict_flatten
+from core.management.utils.xss_client import get_required_fields_for_validation
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def read_json_file(json_file):
+    """Read a JSON document from a file"""
+    with open(json_file, encoding='utf-8') as json_source:
+        return json.load(json_source)
+
+
+def validate_with_flatten(records, required_column_list,
+                          recommended_column_list):
+    """Find the missing required and recommended fields of records by
+    flattening each of them, the way validation did before schemas were
+    compiled"""
+    results = []
+    for record in records:
+        flattened_data = dict_flatten(record, required_column_list)
+        missing_required = []
+        for item in required_column_list:
+            if item not in flattened_data or not flattened_data[item]:
+                missing_required.append(item)
+        missing_recommended = []
+        for item in recommended_column_list:
+            if item not in flattened_data or not flattened_data[item]:
+                missing_recommended.append(item)
+        results.append((tuple(missing_required), tuple(missing_recommended)))
+    return results
+
+
+def validate_with_validator(records, required_column_list,
+                            recommended_column_list):
+    """Find the missing required and recommended fields of records with a
+    compiled schema validator one record at a time"""
+    validator = SchemaValidator(required_column_list,
+                                recommended_column_list)
+    results = []
+    for record in records:
+        result = validator.validate(record)
+        results.append((result.missing_required,
+                        result.missing_recommended))
+    return results
+
+
+def validate_with_batch(records, required_column_list,
+                        recommended_column_list):
+    """Find the missing required and recommended fields of records with a
+    compiled schema validator in batches, the way validation does"""
+    validator = SchemaValidator(required_column_list,
+                                recommended_column_list)
+    batch_size = max(settings.LEDGER_UPDATE_BATCH_SIZE, 1)
+    results = []
+    for start in range(0, len(records), batch_size):
+        for result in validator.validate_batch(
+                records[start:start + batch_size]):
+            results.append((result.missing_required,
+                            result.missing_recommended))
+    return results
+
+
+def time_validation(validate, records, repeat, *args):
+    """Return the best time taken to validate every record along with the
+    validation results"""
+    best = None
+    results = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        results = validate(records, *args)
+        elapsed = time.perf_counter() - start_time
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, results
+
+
+class Command(BaseCommand):
+    """Django command comparing the time taken to validate metadata by
+    flattening records and with a compiled schema validator"""
+
+    help = ('Validate saved metadata records against an XSS schema by '
+            'flattening each record and with a compiled schema validator '
+            'record by record and in batches, check all of them find the '
+            'same missing fields and compare the time taken')
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema_file',
+                            help='XSS schema in JSON')
+        parser.add_argument('metadata_file',
+                            help='List of metadata records in JSON')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Number of times each path is timed')
+
+    def handle(self, *args, **options):
+        schema_data_dict = read_json_file(options['schema_file'])
+        records = read_json_file(options['metadata_file'])
+        if not isinstance(records, list):
+            raise CommandError("Metadata file must hold a list of records")
+        repeat = max(options['repeat'], 1)
+        # validation checks schema fields in order and without duplicates
+        required_column_list, recommended_column_list = [
+            list(dict.fromkeys(column_list)) for column_list in
+            get_required_fields_for_validation(schema_data_dict)]
+        validate_args = (required_column_list, recommended_column_list)
+
+        flatten_time, flatten_results = time_validation(
+            validate_with_flatten, records, repeat, *validate_args)
+        validator_time, validator_results = time_validation(
+            validate_with_validator, records, repeat, *validate_args)
+        batch_time, batch_results = time_validation(
+            validate_with_batch, records, repeat, *validate_args)
+
+        self.stdout.write(
+            f"Validated {len(records)} records against "
+            f"{len(required_column_list)} required and "
+            f"{len(recommended_column_list)} recommended fields, best of "
+            f"{repeat} runs")
+        self.stdout.write(f"flatten: {flatten_time:.4f} seconds")
+        self.stdout.write(f"validator: {validator_time:.4f} seconds")
+        self.stdout.write(f"batch: {batch_time:.4f} seconds")
+        if validator_time and batch_time:
+            self.stdout.write(
+                f"speedup: {flatten_time / validator_time:.1f}x record by "
+                f"record, {flatten_time / batch_time:.1f}x in batches")
+
+        mismatches = sum(
+            flatten_result != validator_result or
+            flatten_result != batch_result
+            for flatten_result, validator_result, batch_result
+            in zip(flatten_results, validator_results, batch_results))
+        if mismatches:
+            raise CommandError(f"{mismatches} validation results differ "
+                               f"between flatten and the validator")
+        self.stdout.write(self.style.SUCCESS(
+            "Validation results are identical"))
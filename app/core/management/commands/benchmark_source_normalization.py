@@ -0,0 +1,130 @@
+import copy
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from core.management.utils.xia_internal import convert_date_to_isoformat
+from core.management.utils.xsr_client import (code_page_to_records, find_dates,
+                                              find_html,
+                                              normalize_source_record)
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def read_search_result_items(source_file):
+    """Read search result items from a saved XSR search response or from a
+    list of search result items"""
+    with open(source_file, encoding='utf-8') as source:
+        source_data = json.load(source)
+    if isinstance(source_data, dict):
+        source_data = source_data["SearchResult"]["SearchResultItems"]
+    return source_data
+
+
+def normalize_with_dataframe(source_data, code, eccr_uuid, publisher):
+    """Normalize a page of search results through a dataframe, the way
+    extraction did before records were normalized as dictionaries"""
+    source_df = pd.DataFrame(source_data)
+    source_df["code"] = code
+    if eccr_uuid:
+        source_df["eccr_uuid"] = str(eccr_uuid)
+    else:
+        source_df["eccr_uuid"] = eccr_uuid
+    source_df = source_df.where(pd.notnull(source_df), None)
+    source_df = source_df.where(pd.notnull(source_df), None)
+    source_df['SOURCESYSTEM'] = publisher
+    source_remove_nan_df = source_df.replace(np.nan, '', regex=True)
+    source_data_dict = source_remove_nan_df.to_dict(orient='index')
+
+    normalized = []
+    for temp_val in source_data_dict.values():
+        temp_val_html_convert = find_html(find_dates(temp_val))
+        temp_val_convert = json.dumps(temp_val_html_convert,
+                                      default=convert_date_to_isoformat)
+        normalized.append(json.loads(temp_val_convert))
+    return normalized
+
+
+def normalize_with_records(source_data, code, eccr_uuid, publisher):
+    """Normalize a page of search results as dictionaries, the way
+    extraction does"""
+    source_records = code_page_to_records(source_data, code, eccr_uuid)
+    for record in source_records:
+        record['SOURCESYSTEM'] = publisher or ''
+    return [normalize_source_record(record) for record in source_records]
+
+
+def time_normalization(normalize, pages, repeat, *args):
+    """Return the best time taken to normalize every page along with the
+    normalized records"""
+    best = None
+    normalized = []
+    for _ in range(repeat):
+        # both paths may change nested values of the pages in place
+        pages_copy = copy.deepcopy(pages)
+        start_time = time.perf_counter()
+        normalized = [normalize(page, *args) for page in pages_copy]
+        elapsed = time.perf_counter() - start_time
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, [record for page in normalized for record in page]
+
+
+class Command(BaseCommand):
+    """Django command comparing the time taken to normalize search results
+    through dataframes and as dictionaries"""
+
+    help = ('Normalize saved XSR search results through dataframes and as '
+            'dictionaries, check both give the same metadata and compare '
+            'the time taken')
+
+    def add_arguments(self, parser):
+        parser.add_argument('source_file',
+                            help='XSR search response or list of search '
+                                 'result items in JSON')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Number of times each path is timed')
+        parser.add_argument('--page-size', type=int,
+                            default=settings.XSR_RESULTS_PER_PAGE,
+                            help='Number of search result items per page')
+        parser.add_argument('--code', default='benchmark',
+                            help='CWR code added to every record')
+        parser.add_argument('--eccr-uuid', default=None,
+                            help='ECCR UUID added to every record')
+        parser.add_argument('--publisher', default='benchmark',
+                            help='Publisher added to every record')
+
+    def handle(self, *args, **options):
+        source_data = read_search_result_items(options['source_file'])
+        page_size = max(options['page_size'], 1)
+        repeat = max(options['repeat'], 1)
+        pages = [source_data[start:start + page_size]
+                 for start in range(0, len(source_data), page_size)]
+        normalize_args = (options['code'], options['eccr_uuid'],
+                          options['publisher'])
+
+        dataframe_time, dataframe_records = time_normalization(
+            normalize_with_dataframe, pages, repeat, *normalize_args)
+        records_time, records = time_normalization(
+            normalize_with_records, pages, repeat, *normalize_args)
+
+        self.stdout.write(
+            f"Normalized {len(source_data)} records in {len(pages)} pages, "
+            f"best of {repeat} runs")
+        self.stdout.write(f"dataframe: {dataframe_time:.4f} seconds")
+        self.stdout.write(f"records: {records_time:.4f} seconds")
+        if records_time:
+            self.stdout.write(
+                f"speedup: {dataframe_time / records_time:.1f}x")
+
+        # compare the string form so field order and types must match too
+        mismatches = sum(
+            str(dataframe_record) != str(record)
+            for dataframe_record, record in zip(dataframe_records, records))
+        mismatches += abs(len(dataframe_records) - len(records))
+        if mismatches:
+            raise CommandError(f"{mismatches} normalized records differ "
+                               f"between dataframe and records")
+        self.stdout.write(self.style.SUCCESS(
+            "Normalized records are identical"))
@@ -1,113 +1,282 @@
-import hashlib
-import json
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import numpy as np
-import pandas as pd
-from core.management.utils.xia_internal import (convert_date_to_isoformat,
-                                                get_publisher_detail)
-from core.management.utils.xsr_client import (find_dates, find_html,
-                                              get_source_metadata_key_value,
+from core.management.utils.eccr_client import log_eccr_cache_stats
+from core.management.utils.html_converter import log_html_cache_stats
+from core.management.utils.http_client import log_host_stats
+from core.management.utils.metadata_hash import get_metadata_hash, get_raw_hash
+from core.management.utils.model_help import log_sanitize_cache_stats
+from core.management.utils.response_archive import close_response_archive
+from core.management.utils.xia_internal import get_publisher_detail
+from core.management.utils.xsr_client import (get_source_metadata_key_value,
+                                              normalize_source_record,
                                               read_source_file)
 from core.models import MetadataLedger, XSRConfiguration
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import connection, transaction
 from django.utils import timezone
 
 logger = logging.getLogger('dict_config_logger')
 
 
-def get_source_metadata():
-    """Retrieving source metadata"""
-
-    for xsr_obj in XSRConfiguration.objects.all():
-        #  Retrieve metadata from agents as a list of sources
-        df_source_list = read_source_file(xsr_obj)
-        # Iterate through the list of sources and extract metadata
-        for source_item in df_source_list:
+def extract_xsr_source(xsr_obj, resume=False):
+    """Retrieving source metadata from one XSR, returning the time taken
+    and the number of pages and records retrieved and stored. A failing
+    XSR is logged and reported in the result instead of stopping the
+    extraction of other XSRs"""
+    source_stats = {'xsr_api_endpoint': xsr_obj.xsr_api_endpoint,
+                    'pages': 0, 'records': 0, 'stored': 0, 'error': None}
+    start_time = time.perf_counter()
+    try:
+        #  Retrieve metadata from agents one page of sources at a time
+        source_page_list = read_source_file(xsr_obj, resume)
+        # Extract metadata from each page as soon as it is retrieved
+        for source_records in source_page_list:
             logger.info('Loading metadata to be extracted from source')
-            # Changing null values to None for source dataframe
-            std_source_df = source_item.where(pd.notnull(source_item),
-                                              None)
-            if std_source_df.empty:
+            if not source_records:
                 logger.error("Source metadata is empty!")
-            extract_metadata_using_key(std_source_df)
+            source_stats['pages'] += 1
+            source_stats['records'] += len(source_records)
+            source_stats['stored'] += \
+                extract_metadata_using_key(source_records)
+    # the XSR client exits when it can not connect to the XSR
+    except (Exception, SystemExit) as e:  # pylint: disable=broad-except
+        logger.exception("Extraction from XSR " + xsr_obj.xsr_api_endpoint +
+                         " failed")
+        source_stats['error'] = str(e)
+    source_stats['seconds'] = time.perf_counter() - start_time
+    return source_stats
+
+
+def extract_xsr_source_in_thread(xsr_obj, resume=False):
+    """Retrieving source metadata from one XSR in a worker thread and
+    releasing the thread's database connection afterwards"""
+    try:
+        return extract_xsr_source(xsr_obj, resume)
+    finally:
+        connection.close()
+
+
+def get_source_metadata(resume=False, max_sources=None):
+    """Retrieving source metadata from every XSR, extracting up to
+    max_sources XSRs at the same time. Returns the result of every XSR"""
+    if max_sources is None:
+        max_sources = settings.XSR_MAX_SOURCES
+    xsr_list = list(XSRConfiguration.objects.all())
+    max_sources = min(max(max_sources, 1), len(xsr_list))
+
+    if max_sources <= 1:
+        return [extract_xsr_source(xsr_obj, resume) for xsr_obj in xsr_list]
+
+    logger.info("Extracting %d XSRs using %d workers", len(xsr_list),
+                max_sources)
+    with ThreadPoolExecutor(max_workers=max_sources) as executor:
+        return list(executor.map(
+            lambda xsr_obj: extract_xsr_source_in_thread(xsr_obj, resume),
+            xsr_list))
+
 
+def log_source_stats(source_stats_list):
+    """Logging the time taken and the records extracted for every XSR"""
+    for source_stats in source_stats_list:
+        if source_stats['error']:
+            logger.error("XSR %s failed after %.3f seconds, %d pages and "
+                         "%d records retrieved, %d records stored: %s",
+                         source_stats['xsr_api_endpoint'],
+                         source_stats['seconds'], source_stats['pages'],
+                         source_stats['records'], source_stats['stored'],
+                         source_stats['error'])
+        else:
+            logger.info("XSR %s completed in %.3f seconds, %d pages and %d "
+                        "records retrieved, %d records stored",
+                        source_stats['xsr_api_endpoint'],
+                        source_stats['seconds'], source_stats['pages'],
+                        source_stats['records'], source_stats['stored'])
 
-def add_publisher_to_source(source_df):
-    """Add publisher column to source metadata and return source metadata"""
+
+def add_publisher_to_source(source_records):
+    """Add publisher field to source metadata and return source metadata"""
     # Get publisher name from system operator
     publisher = get_publisher_detail()
     if not publisher:
         logger.warning("Publisher field is empty!")
-    # Assign publisher column to source data
-    source_df['SOURCESYSTEM'] = publisher
-    return source_df
+        publisher = ''
+    # Assign publisher field to source data
+    for record in source_records:
+        record['SOURCESYSTEM'] = publisher
+    return source_records
+
+
+def get_active_records_for_keys(key_hashes):
+    """Retrieving the active records in metadata ledger of source keys
+
+    :param key_hashes: hashes of the source keys
+    :return: queryset of the active records"""
+    return MetadataLedger.objects.filter(
+        source_metadata_key_hash__in=list(key_hashes),
+        record_lifecycle_status='Active')
+
+
+def get_unchanged_source_keys(raw_hashes):
+    """Retrieving the keys whose active record in metadata ledger was
+    extracted from the same raw source record
+
+    :param raw_hashes: dictionary of hash of key to hash of raw record
+    :return: set of hashes of keys"""
+    if not raw_hashes:
+        return set()
+    unchanged_keys = set()
+    for key_value_hash, raw_hash in get_active_records_for_keys(
+            raw_hashes).exclude(source_metadata_raw_hash=None).values_list(
+            'source_metadata_key_hash', 'source_metadata_raw_hash'):
+        if bytes(raw_hash) == raw_hashes[key_value_hash]:
+            unchanged_keys.add(key_value_hash)
+    return unchanged_keys
+
 
+def store_source_metadata_batch(records):
+    """Extract data from Experience Source Repository(XSR)
+        and store in metadata ledger for a batch of records
+
+    :param records: list of (key value, hash of key, hash of metadata,
+        metadata, hash of raw record) tuples
+    :return: number of records created"""
+    # A key seen more than once keeps its last version
+    latest_records = {}
+    for key_value, key_value_hash, hash_value, metadata, raw_hash in records:
+        latest_records[key_value_hash] = (key_value, hash_value, metadata,
+                                          raw_hash)
+    if not latest_records:
+        return 0
+
+    # Retrieving the active hashes of every key in one query
+    stale_records = []
+    current_keys = set()
+    outdated_raw_hashes = []
+    for record_pk, key_value_hash, hash_value, raw_hash in \
+            get_active_records_for_keys(latest_records).values_list(
+                'pk', 'source_metadata_key_hash', 'source_metadata_hash',
+                'source_metadata_raw_hash'):
+        latest_raw_hash = latest_records[key_value_hash][3]
+        if bytes(hash_value) == latest_records[key_value_hash][1]:
+            current_keys.add(key_value_hash)
+            # remember the new raw record so it is skipped next time
+            if latest_raw_hash and (raw_hash is None or
+                                    bytes(raw_hash) != latest_raw_hash):
+                outdated_raw_hashes.append(MetadataLedger(
+                    pk=record_pk, source_metadata_raw_hash=latest_raw_hash))
+        else:
+            stale_records.append(record_pk)
+
+    new_records = []
+    for key_value_hash, (key_value, hash_value, metadata, raw_hash) in \
+            latest_records.items():
+        if key_value_hash in current_keys:
+            continue
+        record = MetadataLedger(
+            source_metadata_key=key_value,
+            source_metadata_key_hash=key_value_hash,
+            source_metadata=metadata,
+            source_metadata_hash=hash_value,
+            source_metadata_raw_hash=raw_hash,
+            record_lifecycle_status='Active',
+            code=metadata.get('code'),
+            eccr_uuid=metadata.get('eccr_uuid'))
+        # bulk_create sanitizes the whole batch of records
+        new_records.append(record)
 
-def store_source_metadata(key_value, key_value_hash, hash_value, metadata):
+    with transaction.atomic():
+        # Setting record_status & deleted_date for updated records
+        if stale_records:
+            MetadataLedger.objects.filter(pk__in=stale_records).update(
+                metadata_record_inactivation_date=timezone.now(),
+                record_lifecycle_status='Inactive')
+        if outdated_raw_hashes:
+            MetadataLedger.objects.bulk_update(outdated_raw_hashes,
+                                               ['source_metadata_raw_hash'])
+        MetadataLedger.objects.bulk_create(new_records)
+    return len(new_records)
+
+
+def store_source_metadata(key_value, key_value_hash, hash_value, metadata,
+                          raw_hash=None):
     """Extract data from Experience Source Repository(XSR)
         and store in metadata ledger
     """
-    # Setting record_status & deleted_date for updated record
-    MetadataLedger.objects.filter(
-        source_metadata_key_hash=key_value_hash,
-        record_lifecycle_status='Active').exclude(
-        source_metadata_hash=hash_value).update(
-        metadata_record_inactivation_date=timezone.now())
-    MetadataLedger.objects.filter(
-        source_metadata_key_hash=key_value_hash,
-        record_lifecycle_status='Active').exclude(
-        source_metadata_hash=hash_value).update(
-        record_lifecycle_status='Inactive')
-    # Retrieving existing records or creating new record to MetadataLedger
-    MetadataLedger.objects.get_or_create(
-        source_metadata_key=key_value,
-        source_metadata_key_hash=key_value_hash,
-        source_metadata=metadata,
-        source_metadata_hash=hash_value,
-        record_lifecycle_status='Active',
-        code=metadata["code"],
-        eccr_uuid=metadata['eccr_uuid'])
-
-
-def extract_metadata_using_key(source_df):
+    store_source_metadata_batch([(key_value, key_value_hash, hash_value,
+                                  metadata, raw_hash)])
+
+
+def extract_metadata_using_key(source_records):
     """Creating key, hash of key & hash of metadata """
-    # Convert source data to dictionary and add publisher to metadata
-    source_df = add_publisher_to_source(source_df)
-    source_remove_nan_df = source_df.replace(np.nan, '', regex=True)
-    source_data_dict = source_remove_nan_df.to_dict(orient='index')
+    # Add publisher to metadata
+    source_records = add_publisher_to_source(source_records)
+    keyed_records = []
+    for source_record in source_records:
+        # key dictionary creation function called
+        key = get_source_metadata_key_value(source_record)
+        if key:
+            # creating hash value of raw record
+            keyed_records.append((key, get_raw_hash(source_record),
+                                  source_record))
+
+    # Records extracted from the same raw record are not normalized again
+    unchanged_keys = get_unchanged_source_keys(
+        {key['key_value_hash']: raw_hash
+         for key, raw_hash, _ in keyed_records})
+    records = []
+    for key, raw_hash, source_record in keyed_records:
+        if key['key_value_hash'] in unchanged_keys:
+            continue
+        # function to convert int to date, HTML to text and date to iso
+        # format
+        temp_val_json = normalize_source_record(source_record)
+        # creating hash value of metadata
+        hash_value = get_metadata_hash(temp_val_json)
+        # Collect key, hash of key, hash of metadata, metadata, hash of raw
+        # record
+        records.append((key['key_value'], key['key_value_hash'],
+                        hash_value, temp_val_json, raw_hash))
+    logger.info('%d of %d records unchanged since they were last extracted',
+                len(keyed_records) - len(records), len(keyed_records))
     logger.info('Setting record_status & deleted_date for updated record')
     logger.info('Getting existing records or creating new record to '
                 'MetadataLedger')
-    for temp_key, temp_val in source_data_dict.items():
-        # key dictionary creation function called
-        key = \
-            get_source_metadata_key_value(source_data_dict[temp_key])
-        # function to convert int to date
-        temp_val_date_convert = find_dates(temp_val)
-        # function to convert HTML to text
-        temp_val_html_convert = find_html(temp_val_date_convert)
-        # function to convert date to iso format
-        temp_val_convert = json.dumps(temp_val_html_convert,
-                                      default=convert_date_to_isoformat)
-        temp_val_json = json.loads(temp_val_convert)
-        # creating hash value of metadata
-        hash_value = hashlib.sha512(str(temp_val_json).encode('utf-8')). \
-            hexdigest()
-        if key:
-            # Call store function with key, hash of key, hash of metadata,
-            # metadata
-            store_source_metadata(key['key_value'], key['key_value_hash'],
-                                  hash_value, temp_val_json)
+    # Store the whole batch with a fixed number of queries
+    created = store_source_metadata_batch(records)
+    logger.info('%d of %d records stored in MetadataLedger', created,
+                len(records))
+    return created
 
 
 class Command(BaseCommand):
     """Django command to extract data from Experience Source Repository (
     XSR) """
 
+    def add_arguments(self, parser):
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue an interrupted extraction from '
+                                 'the last stored page, skipping codes '
+                                 'completed within XSR_CHECKPOINT_MAX_AGE '
+                                 'seconds')
+
     def handle(self, *args, **options):
         """
             Metadata is extracted from XSR and stored in Metadata Ledger
         """
-        get_source_metadata()
+        source_stats_list = get_source_metadata(options.get('resume', False))
+        log_source_stats(source_stats_list)
+        log_host_stats()
+        log_eccr_cache_stats()
+        log_html_cache_stats()
+        log_sanitize_cache_stats()
+        close_response_archive()
+        failed = [source_stats for source_stats in source_stats_list
+                  if source_stats['error']]
+        if failed:
+            raise SystemExit('Exiting! Extraction failed for ' +
+                             str(len(failed)) + ' of ' +
+                             str(len(source_stats_list)) + ' XSRs.')
         logger.info('MetadataLedger updated with extracted data from XSR')
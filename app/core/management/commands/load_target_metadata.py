@@ -2,6 +2,8 @@ import json
 import logging
 
 import requests
+from core.management.utils.http_client import log_host_stats
+from core.management.utils.work_queue import claim_records, extend_claim
 from core.management.utils.xia_internal import get_publisher_detail
 from core.management.utils.xis_client import posting_metadata_ledger_to_xis
 from core.models import MetadataLedger
@@ -45,6 +47,12 @@ def post_data_to_xis(data):
         # Getting UUID to update target_metadata_transmission_status to pending
         uuid_val = data.get('unique_record_identifier')
 
+        # Renewing the claim on the records of the batch not posted yet, as
+        # posting a batch one record at a time can outlast the lease
+        if row.get('claim_token'):
+            extend_claim(MetadataLedger.objects.filter(
+                claim_token=row['claim_token']), 'load')
+
         # Updating status in XIA metadata_ledger to 'Pending'
         MetadataLedger.objects.filter(
             metadata_record_uuid=uuid_val).update(
@@ -84,9 +92,9 @@ def post_data_to_xis(data):
     get_records_to_load_into_xis()
 
 
-def get_records_to_load_into_xis():
-    """Retrieve number of Metadata_Ledger records in XIA to load into Target  and
-    calls the post_data_to_xis accordingly"""
+def get_records_to_load():
+    """Retrieve the Metadata_Ledger records in XIA waiting to be loaded into
+    Target"""
     combined_query = MetadataLedger.objects.filter(
         Q(target_metadata_transmission_status='Ready') | Q(
             target_metadata_transmission_status='Failed'))
@@ -98,11 +106,22 @@ def get_records_to_load_into_xis():
         'target_metadata',
         'target_metadata_hash',
         'target_metadata_key',
-        'target_metadata_key_hash', 'eccr_uuid')
+        'target_metadata_key_hash', 'eccr_uuid', 'claim_token')
+    return data
+
+
+def get_records_to_load_into_xis():
+    """Retrieve number of Metadata_Ledger records in XIA to load into Target  and
+    calls the post_data_to_xis accordingly"""
+    data = get_records_to_load()
+
+    # workers running this command at the same time load disjoint batches
+    # of records
+    data = claim_records(data, 'load')
 
     # Checking available no. of records in XIA to
     # load into Target is Zero or not
-    if len(data) == 0:
+    if data is None or len(data) == 0:
         logger.info("Data Loading to target is complete, Zero records are "
                     "available in XIA to transmit")
     else:
@@ -115,3 +134,4 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         """Metadata is load from XIA Metadata_Ledger to Target"""
         get_records_to_load_into_xis()
+        log_host_stats()
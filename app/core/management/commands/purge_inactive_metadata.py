@@ -0,0 +1,177 @@
+import gzip
+import json
+import logging
+import os
+from datetime import timedelta
+
+from core.models import MetadataLedger
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger('dict_config_logger')
+
+
+class LedgerJSONEncoder(DjangoJSONEncoder):
+    """JSON encoder writing binary metadata hashes as hex"""
+
+    def default(self, o):
+        if isinstance(o, (bytes, memoryview)):
+            return bytes(o).hex()
+        return super().default(o)
+
+
+def get_inactive_records(cutoff):
+    """Retrieving inactive records of MetadataLedger inactivated before
+    cutoff"""
+    return MetadataLedger.objects.filter(
+        record_lifecycle_status='Inactive',
+        metadata_record_inactivation_date__lt=cutoff)
+
+
+def get_archive_path(archive_dir):
+    """Creating the path of the history file of a purge"""
+    return os.path.join(archive_dir, 'ledger_history_' +
+                        timezone.now().strftime('%Y%m%dT%H%M%S') +
+                        '.jsonl.gz')
+
+
+def archive_records(archive_path, records):
+    """Appending records to a history file as a gzip member holding one JSON
+    document per line, flushed to disk before the records are deleted.
+    Returns the number of bytes of JSON archived"""
+    lines = [json.dumps(record, cls=LedgerJSONEncoder) + '\n'
+             for record in records]
+    encoded = ''.join(lines).encode('utf-8')
+    with open(archive_path, 'ab') as archive_file:
+        archive_file.write(gzip.compress(encoded))
+        archive_file.flush()
+        os.fsync(archive_file.fileno())
+    return len(encoded)
+
+
+def purge_inactive_records(cutoff, batch_size, archive_path=None):
+    """Moving inactive records of MetadataLedger inactivated before cutoff
+    into a history file in batches of batch_size, each deleted in its own
+    short transaction. Without an archive path records are only counted.
+    Returns the number of records and bytes of JSON purged"""
+    purged = 0
+    purged_bytes = 0
+    last_pk = None
+
+    while True:
+        batch = get_inactive_records(cutoff).order_by('metadata_record_uuid')
+        if last_pk is not None:
+            batch = batch.filter(metadata_record_uuid__gt=last_pk)
+        records = list(batch.values()[:batch_size])
+        if not records:
+            break
+        last_pk = records[-1]['metadata_record_uuid']
+
+        if archive_path is None:
+            purged_bytes += sum(
+                len(json.dumps(record, cls=LedgerJSONEncoder))
+                for record in records)
+        else:
+            purged_bytes += archive_records(archive_path, records)
+            with transaction.atomic():
+                MetadataLedger.objects.filter(
+                    metadata_record_uuid__in=[
+                        record['metadata_record_uuid']
+                        for record in records]).delete()
+        purged += len(records)
+        logger.info("%d inactive records purged", purged)
+    return purged, purged_bytes
+
+
+def get_table_size():
+    """Retrieving the bytes of data and indexes MySQL allocates to
+    MetadataLedger, or None on other databases. Statistics are refreshed
+    first, as information_schema caches them"""
+    if connection.vendor != 'mysql':
+        return None
+    table = MetadataLedger._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE TABLE ' + connection.ops.quote_name(table))
+        cursor.fetchall()
+        cursor.execute(
+            'SELECT data_length + index_length FROM information_schema.TABLES '
+            'WHERE table_schema = DATABASE() AND table_name = %s', [table])
+        row = cursor.fetchone()
+    return int(row[0]) if row else None
+
+
+def optimize_table():
+    """Rebuilding MetadataLedger on MySQL, so InnoDB frees the pages of
+    deleted records instead of keeping them for later inserts"""
+    if connection.vendor != 'mysql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('OPTIMIZE TABLE ' + connection.ops.quote_name(
+            MetadataLedger._meta.db_table))
+        cursor.fetchall()
+
+
+class Command(BaseCommand):
+    """Django command to move inactive versions of records out of
+    MetadataLedger"""
+
+    help = ('Move inactive MetadataLedger records older than the retention '
+            'period into compressed history files')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=settings.LEDGER_RETENTION_DAYS,
+                            help='Purge records inactive for longer than '
+                                 'this number of days')
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.LEDGER_PURGE_BATCH_SIZE,
+                            help='Number of records archived and deleted '
+                                 'at a time')
+        parser.add_argument('--archive-dir',
+                            default=settings.LEDGER_ARCHIVE_DIR,
+                            help='Directory the history files are written '
+                                 'to')
+        parser.add_argument('--optimize', action='store_true',
+                            help='Rebuild the table on MySQL after purging '
+                                 'so the space of purged records is freed')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count the records that would be purged '
+                                 'without changing anything')
+
+    def handle(self, *args, **options):
+        """
+            Inactive records are archived and deleted from Metadata Ledger
+        """
+        cutoff = timezone.now() - timedelta(days=max(options['days'], 0))
+        batch_size = max(options['batch_size'], 1)
+
+        archive_path = None
+        if not options['dry_run']:
+            os.makedirs(options['archive_dir'], exist_ok=True)
+            archive_path = get_archive_path(options['archive_dir'])
+
+        table_size = None if options['dry_run'] else get_table_size()
+        purged, purged_bytes = purge_inactive_records(cutoff, batch_size,
+                                                      archive_path)
+
+        if options['dry_run']:
+            self.stdout.write(
+                f"{purged} inactive records ({purged_bytes} archived JSON "
+                f"bytes) would be purged")
+        elif purged:
+            archive_bytes = os.path.getsize(archive_path)
+            self.stdout.write(
+                f"{purged} inactive records purged, {purged_bytes} archived "
+                f"JSON bytes written to {archive_path} in {archive_bytes} "
+                f"bytes")
+            if options['optimize']:
+                optimize_table()
+            if table_size is not None:
+                self.stdout.write(
+                    f"MetadataLedger data and indexes went from "
+                    f"{table_size} to {get_table_size()} bytes")
+        else:
+            self.stdout.write("No inactive records to purge")
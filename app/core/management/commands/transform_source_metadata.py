@@ -1,7 +1,8 @@
-import hashlib
 import logging
 
 import pandas as pd
+from core.management.utils.metadata_hash import get_metadata_hash
+from core.management.utils.work_queue import iter_claimed_batches
 from core.management.utils.xia_internal import (dict_flatten,
                                                 get_target_metadata_key_value,
                                                 is_date,
@@ -204,9 +205,7 @@ def transform_source_using_key(source_data_dict, target_mapping_dict,
                 # Key creation for target metadata
                 key = get_target_metadata_key_value(target_data_dict[ind1])
 
-                hash_value = hashlib.sha512(
-                    str(target_data_dict[ind1]).encode(
-                        'utf-8')).hexdigest()
+                hash_value = get_metadata_hash(target_data_dict[ind1])
                 store_transformed_source_metadata(key['key_value'],
                                                   key[
                                                       'key_value_hash'],
@@ -229,7 +228,13 @@ class Command(BaseCommand):
         required_column_list, recommended_column_list = \
             get_required_fields_for_validation(schema_data_dict)
         expected_data_types = get_data_types_for_validation(schema_validation)
-        transform_source_using_key(source_data_dict, target_mapping_dict,
-                                   required_column_list, expected_data_types)
+        # workers running this command at the same time transform disjoint
+        # batches of records
+        for claimed_data_dict in iter_claimed_batches(source_data_dict,
+                                                      'transform'):
+            transform_source_using_key(claimed_data_dict,
+                                       target_mapping_dict,
+                                       required_column_list,
+                                       expected_data_types)
 
         logger.info('MetadataLedger updated with transformed data in XIA')
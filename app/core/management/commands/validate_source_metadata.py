@@ -1,10 +1,13 @@
 import logging
 
-from core.management.utils.xia_internal import (dict_flatten,
-                                                required_recommended_logs)
+from core.management.utils.schema_validator import (SchemaValidator,
+                                                    iter_validated_rows)
+from core.management.utils.validation_report import ValidationReport
+from core.management.utils.work_queue import iter_claimed_batches
 from core.management.utils.xss_client import (
     get_required_fields_for_validation, get_source_validation_schema)
 from core.models import MetadataLedger
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
@@ -27,87 +30,85 @@ def get_source_metadata_for_validation():
 
 
 def store_source_metadata_validation_status(source_data_dict,
-                                            key_value_hash, validation_result,
-                                            record_status_result,
-                                            source_metadata):
-    """Storing validation result in MetadataLedger"""
+                                            key_value_hashes,
+                                            validation_result,
+                                            record_status_result):
+    """Storing one validation result for records in MetadataLedger with a
+    single update. The source metadata was sanitized when it was stored and
+    is left unchanged, as sanitizing it again would unescape it twice"""
+    validation_date = timezone.now()
+    records = source_data_dict.filter(
+        source_metadata_key_hash__in=key_value_hashes)
 
     if record_status_result == 'Active':
-        source_data_dict.filter(
-            source_metadata_key_hash=key_value_hash).update(
-            source_metadata=source_metadata,
+        records.update(
             source_metadata_validation_status=validation_result,
-            source_metadata_validation_date=timezone.now(),
+            source_metadata_validation_date=validation_date,
             record_lifecycle_status=record_status_result
         )
     else:
-        source_data_dict.filter(
-            source_metadata_key_hash=key_value_hash).update(
-            source_metadata=source_metadata,
+        records.update(
             source_metadata_validation_status=validation_result,
-            source_metadata_validation_date=timezone.now(),
+            source_metadata_validation_date=validation_date,
             record_lifecycle_status=record_status_result,
-            metadata_record_inactivation_date=timezone.now()
+            metadata_record_inactivation_date=validation_date
         )
 
 
-def logging_required_recommended(required_column_list,
-                                 recommended_column_list,
-                                 flattened_source_data, ind):
-    """ Logging required recommended"""
-    # validate for required values in data
-    for item in required_column_list:
-        # update validation and record status for invalid data
-        # Log out error for missing required values
-        if item in flattened_source_data:
-            if not flattened_source_data[item]:
-                validation_result = 'N'
-                required_recommended_logs(ind, "Required", item)
-        else:
-            validation_result = 'N'
-            required_recommended_logs(ind, "Required", item)
-
-    # validate for recommended values in data
-    for item in recommended_column_list:
-        # Log out warning for missing recommended values
-        if item in flattened_source_data:
-            if not flattened_source_data[item]:
-                required_recommended_logs(ind, "Recommended", item)
-        else:
-            required_recommended_logs(ind, "Recommended", item)
-    return validation_result
+def store_source_metadata_validation_statuses(source_data_dict,
+                                              validation_outcomes):
+    """Storing the validation results of a chunk of records in
+    MetadataLedger with one update per outcome
+
+    :param validation_outcomes: dictionary of key hash lists by validation
+        result and record status"""
+    for (validation_result, record_status_result), key_value_hashes in \
+            validation_outcomes.items():
+        store_source_metadata_validation_status(source_data_dict,
+                                                key_value_hashes,
+                                                validation_result,
+                                                record_status_result)
 
 
 def validate_source_using_key(source_data_dict, required_column_list,
-                              recommended_column_list):
-    """Validating source data against required & recommended column names"""
+                              recommended_column_list, report=None):
+    """Validating source data against required & recommended column names.
+    Outcomes are counted in report, or reported for this call when it is
+    not given"""
 
     logger.info("Validating and updating records in MetadataLedger table for "
                 "Source data")
-    len_source_metadata = len(source_data_dict)
-    for ind in range(len_source_metadata):
+    validator = SchemaValidator(required_column_list,
+                                recommended_column_list)
+    call_report = report or ValidationReport('validate_source')
+    validation_outcomes = {}
+    pending = 0
+    for ind, source_data, result in iter_validated_rows(
+            validator, source_data_dict, 'source_metadata'):
         # Updating default validation for all records
-        validation_result = 'Y'
         record_status_result = 'Active'
 
-        # flattened source data created for reference
-        flattened_source_data = dict_flatten(source_data_dict[ind]
-                                             ['source_metadata'],
-                                             required_column_list)
-        # Logging required recommended
-        validation_result = logging_required_recommended(validation_result,
-                                                         required_column_list,
-                                                         recommended_column_list,
-                                                         flattened_source_data, ind)
-        # assigning key hash value for source metadata
-        key_value_hash = source_data_dict[ind]['source_metadata_key_hash']
-        # Calling function to update validation status
-        store_source_metadata_validation_status(source_data_dict,
-                                                key_value_hash,
-                                                validation_result,
-                                                record_status_result,
-                                                source_data_dict[ind]
-                                                ['source_metadata'])
+        # counting missing values of the validated source data
+        key_value_hash = source_data['source_metadata_key_hash']
+        call_report.add(ind, result, key_value_hash)
+        validation_result = result.validation_result
+        # collecting the key hash value for source metadata by outcome
+        validation_outcomes.setdefault(
+            (validation_result, record_status_result), []).append(
+            key_value_hash)
+        pending += 1
+
+        # Calling function to update validation status of a chunk
+        if pending >= settings.LEDGER_UPDATE_BATCH_SIZE:
+            store_source_metadata_validation_statuses(source_data_dict,
+                                                      validation_outcomes)
+            validation_outcomes = {}
+            pending = 0
+
+    store_source_metadata_validation_statuses(source_data_dict,
+                                              validation_outcomes)
+    if report is None:
+        call_report.log_summary()
 
 
 class Command(BaseCommand):
@@ -121,8 +122,15 @@ class Command(BaseCommand):
         required_column_list, recommended_column_list = \
             get_required_fields_for_validation(schema_data_dict)
         source_data_dict = get_source_metadata_for_validation()
-        validate_source_using_key(source_data_dict, required_column_list,
-                                  recommended_column_list)
+        report = ValidationReport('validate_source')
+        # workers running this command at the same time validate disjoint
+        # batches of records
+        for claimed_data_dict in iter_claimed_batches(source_data_dict,
+                                                      'validate_source'):
+            validate_source_using_key(claimed_data_dict,
+                                      required_column_list,
+                                      recommended_column_list, report)
+        report.log_summary()
 
         logger.info(
             'MetadataLedger updated with source metadata validation status')
@@ -1,7 +1,9 @@
 import logging
 
-from core.management.utils.xia_internal import (dict_flatten, is_date,
-                                                required_recommended_logs)
+from core.management.utils.schema_validator import (SchemaValidator,
+                                                    iter_validated_rows)
+from core.management.utils.validation_report import ValidationReport
+from core.management.utils.work_queue import iter_claimed_batches
 from core.management.utils.xss_client import (
     get_data_types_for_validation, get_required_fields_for_validation,
     get_target_validation_schema)
@@ -66,88 +68,29 @@ def store_target_metadata_validation_status(target_data_dict, key_value_hash,
             metadata_record_inactivation_date=timezone.now())
 
 
-def logging_required_recommended(validation_result,
-                                 record_status_result,
-                                 required_column_list,
-                                 recommended_column_list,
-                                 flattened_source_data, ind):
-    """ Logging required recommended"""
-    # validate for required values in data
-    for item_name in required_column_list:
-        # update validation and record status for invalid data
-        # Log out error for missing required values
-        # item_name = item[:-len(".use")]
-        if item_name in flattened_source_data:
-            if not flattened_source_data[item_name]:
-                validation_result = 'N'
-                record_status_result = 'Inactive'
-                required_recommended_logs(ind, "Required", item_name)
-        else:
-            validation_result = 'N'
-            record_status_result = 'Inactive'
-            required_recommended_logs(ind, "Required", item_name)
-
-    # validate for recommended values in data
-    for item_name in recommended_column_list:
-        # Log out warning for missing recommended values
-        # item_name = item[:-len(".use")]
-        if item_name in flattened_source_data:
-            if not flattened_source_data[item_name]:
-                required_recommended_logs(ind, "Recommended", item_name)
-        else:
-            required_recommended_logs(ind, "Recommended", item_name)
-
-    return validation_result, record_status_result
-
-
-def log_datatype_error(item, expected_data_types,
-                       flattened_source_data, index):
-
-    if item in expected_data_types:
-        # type checking for datetime datatype fields
-        if expected_data_types[item] == "datetime":
-            if not is_date(flattened_source_data[item]):
-                required_recommended_logs(index, "datatype",
-                                          item)
-        # type checking for datatype fields(except datetime)
-        elif (not isinstance(flattened_source_data[item],
-                             expected_data_types[item])):
-            required_recommended_logs(index, "datatype",
-                                      item)
-
-
 def validate_target_using_key(target_data_dict, required_column_list,
-                              recommended_column_list, expected_data_types):
-    """Validating target data against required & recommended column names"""
+                              recommended_column_list, expected_data_types,
+                              report=None):
+    """Validating target data against required & recommended column names.
+    Outcomes are counted in report, or reported for this call when it is
+    not given"""
 
     logger.info('Validating and updating records in MetadataLedger table for '
                 'target data')
-    index = 0
-    for target_data in target_data_dict:
-        # Updating default validation for all records
-        validation_result = 'Y'
-        record_status_result = 'Active'
-
-        # flattened source data created for reference
-        flattened_source_data = dict_flatten(target_data
-                                             ['target_metadata'],
-                                             required_column_list)
-        # Logging required recommended
-        validation_result, record_status_result = \
-            logging_required_recommended(validation_result,
-                                         record_status_result,
-                                         required_column_list,
-                                         recommended_column_list,
-                                         flattened_source_data, index)
-        # Type checking for values in metadata
-        for item in flattened_source_data:
-
-            # check if datatype has been assigned to field
-            log_datatype_error(item, expected_data_types,
-                               flattened_source_data, index)
-
+    validator = SchemaValidator(required_column_list,
+                                recommended_column_list, expected_data_types)
+    call_report = report or ValidationReport('validate_target')
+    for index, target_data, result in iter_validated_rows(
+            validator, target_data_dict, 'target_metadata'):
         # assigning key hash value for source metadata
         key_value_hash = target_data['target_metadata_key_hash']
+        # counting missing values and unexpected data types of the
+        # validated target data
+        call_report.add(index, result, key_value_hash)
+        validation_result = result.validation_result
+        record_status_result = 'Active' if validation_result == 'Y' \
+            else 'Inactive'
+
         # Calling function to update validation status
         store_target_metadata_validation_status(target_data_dict,
                                                 key_value_hash,
@@ -155,8 +98,8 @@ def validate_target_using_key(target_data_dict, required_column_list,
                                                 record_status_result,
                                                 target_data
                                                 ['target_metadata'])
-        # increment index
-        index = index + 1
+    if report is None:
+        call_report.log_summary()
 
 
 class Command(BaseCommand):
@@ -172,7 +115,15 @@ class Command(BaseCommand):
             get_required_fields_for_validation(
                 schema_data_dict)
         expected_data_types = get_data_types_for_validation(schema_data_dict)
-        validate_target_using_key(target_data_dict, required_column_list,
-                                  recommended_column_list, expected_data_types)
+        report = ValidationReport('validate_target')
+        # workers running this command at the same time validate disjoint
+        # batches of records
+        for claimed_data_dict in iter_claimed_batches(target_data_dict,
+                                                      'validate_target'):
+            validate_target_using_key(claimed_data_dict,
+                                      required_column_list,
+                                      recommended_column_list,
+                                      expected_data_types, report)
+        report.log_summary()
         logger.info(
             'MetadataLedger updated with target metadata validation status')
@@ -0,0 +1,52 @@
+import logging
+from datetime import timedelta
+
+from core.models import ExtractionCheckpoint
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger('dict_config_logger')
+
+
+def get_fresh_checkpoints(xsr_obj, cwr_list):
+    """Function to retrieve the checkpoints of CWR codes whose extraction
+    started within the last XSR_CHECKPOINT_MAX_AGE seconds"""
+    oldest = timezone.now() - timedelta(
+        seconds=settings.XSR_CHECKPOINT_MAX_AGE)
+    return {checkpoint.code: checkpoint for checkpoint in
+            ExtractionCheckpoint.objects.filter(
+                xsr_configuration=xsr_obj, code__in=list(cwr_list),
+                started_date__gte=oldest)}
+
+
+def get_checkpoint_start_pages(xsr_obj, cwr_list):
+    """Function to find the page extraction of each CWR code resumes from.
+    Codes completed within the freshness window are left out, codes
+    interrupted within it continue after their last completed page and
+    every other code starts from the first page"""
+    checkpoints = get_fresh_checkpoints(xsr_obj, cwr_list)
+
+    start_pages = {}
+    for code in cwr_list:
+        checkpoint = checkpoints.get(code)
+        if checkpoint is None:
+            start_pages[code] = 1
+        elif checkpoint.completed_date is None:
+            start_pages[code] = checkpoint.page + 1
+    logger.info("Resuming extraction: %d of %d codes are complete, %d "
+                "continue from a later page", len(cwr_list) -
+                len(start_pages), len(cwr_list),
+                sum(page > 1 for page in start_pages.values()))
+    return start_pages
+
+
+def record_checkpoint_page(xsr_obj, code, page, last_page):
+    """Function to record that a page of search results for a CWR code has
+    been stored. The first page restarts the checkpoint of the code"""
+    now = timezone.now()
+    defaults = {'page': page,
+                'completed_date': now if last_page else None}
+    if page == 1:
+        defaults['started_date'] = now
+    ExtractionCheckpoint.objects.update_or_create(
+        xsr_configuration=xsr_obj, code=code, defaults=defaults)
@@ -1,10 +1,18 @@
+import hashlib
+import json
 import logging
+import threading
 
-import requests
+from core.management.utils import http_client
 from core.models import ECCRConfiguration
+from django.conf import settings
+from django.core.cache import cache
 
 logger = logging.getLogger('dict_config_logger')
 
+_cache_stats = {'hits': 0, 'misses': 0}
+_cache_stats_lock = threading.Lock()
+
 
 def get_eccr_api_endpoint():
     """Setting API endpoint from ECCR communication """
@@ -19,27 +27,38 @@ def get_eccr_api_endpoint():
     return eccr_endpoint
 
 
-def get_eccr_uuid(code):
-    """Setting ECCR UUID using CWR Code communication """
+def get_eccr_cache_key(eccr_endpoint, code):
+    """Function to create the cache key of a CWR code. Keys include the ECCR
+    endpoint so changing the ECCR configuration invalidates cached UUIDs"""
+    key_hash = hashlib.sha256(
+        (str(eccr_endpoint) + '\n' + code).encode('utf-8')).hexdigest()
+    return 'eccr_uuid:' + key_hash
 
-    if not get_eccr_api_endpoint():
-        logger.error("ECCR API endpoint not set, please set endpoint")
-        return None
 
-    url = get_eccr_api_endpoint() + "/api/sky/repo/search"
+def record_eccr_cache_lookup(hit):
+    """Function to count ECCR UUID cache hits and misses"""
+    with _cache_stats_lock:
+        _cache_stats['hits' if hit else 'misses'] += 1
 
-    cwr_code = '(markings:' + code + ')'
 
-    payload = {'data': cwr_code,
-               'searchParams': '{"start":0,"size":20}'}
+def get_eccr_cache_stats():
+    """Function to get the number of ECCR UUID cache hits and misses"""
+    with _cache_stats_lock:
+        return dict(_cache_stats)
 
-    files = [
 
-    ]
-    headers = {}
+def log_eccr_cache_stats():
+    """Function to log the number of ECCR UUID cache hits and misses"""
+    cache_stats = get_eccr_cache_stats()
+    logger.info("ECCR UUID cache: %d hits, %d misses", cache_stats['hits'],
+                cache_stats['misses'])
 
-    response = requests.request("POST", url, headers=headers, data=payload,
-                                files=files)
+
+def parse_eccr_job(results):
+    """Function to create the job reference for a CWR code from ECCR
+    search results"""
+    if not results or not results[0].get('@id'):
+        return None
 
     job_resp = {'job': {
                         'reference': "",
@@ -48,20 +67,158 @@ def get_eccr_uuid(code):
                     }
                 }
 
-    if not response.json():
-        return None
-    elif response.json()[0]['@id']:
+    job_resp['job']['reference'] = results[0]['@id']
+
+    if results[0].get('@type'):
+
+        job_resp['job']['job_type'] = results[0]['@type']
 
-        job_resp['job']['reference'] = response.json()[0]['@id']
+    name = results[0].get('name')
+    if isinstance(name, dict) and name.get('@value'):
 
-        if response.json()[0]['@type']:
+        job_resp['job']['name'] = name['@value']
 
-            job_resp['job']['job_type'] = response.json()[0]['@type']
+    return job_resp
 
-        if response.json()[0]['name']['@value']:
 
-            job_resp['job']['name'] = response.json()[0]['name']['@value']
+def post_eccr_search(eccr_endpoint, query, size):
+    """Function to search the ECCR repository and return the results"""
+
+    url = eccr_endpoint + "/api/sky/repo/search"
+
+    payload = {'data': query,
+               'searchParams': json.dumps({"start": 0, "size": size},
+                                          separators=(',', ':'))}
+
+    files = [
 
-        return job_resp
-    else:
+    ]
+    headers = {}
+
+    # searching does not change the repository, so it is safe to retry
+    response = http_client.request("POST", url, idempotent=True,
+                                   headers=headers, data=payload,
+                                   files=files)
+
+    return response.json()
+
+
+def search_eccr_uuid(eccr_endpoint, code):
+    """Function to search ECCR for the job reference of a CWR code"""
+
+    cwr_code = '(markings:' + code + ')'
+
+    return parse_eccr_job(post_eccr_search(eccr_endpoint, cwr_code, 20))
+
+
+def get_result_markings(result):
+    """Function to get the markings of an ECCR search result as a list of
+    strings"""
+    markings = result.get('markings')
+    if markings is None:
+        return []
+    if not isinstance(markings, list):
+        markings = [markings]
+    marking_list = []
+    for marking in markings:
+        if isinstance(marking, dict):
+            marking = marking.get('@value')
+        if marking is not None:
+            marking_list.append(str(marking))
+    return marking_list
+
+
+def search_eccr_uuids(eccr_endpoint, code_list):
+    """Function to search ECCR for the job references of several CWR codes
+    in one combined query. Codes are matched to the first result carrying
+    them in its markings; codes without a match are left out"""
+
+    cwr_codes = '(' + ' OR '.join('markings:' + code
+                                  for code in code_list) + ')'
+
+    results = post_eccr_search(eccr_endpoint, cwr_codes,
+                               20 * len(code_list))
+
+    job_resp_dict = {}
+    for result in results or []:
+        if not isinstance(result, dict):
+            continue
+        for marking in get_result_markings(result):
+            if marking in code_list and marking not in job_resp_dict:
+                job_resp = parse_eccr_job([result])
+                if job_resp:
+                    job_resp_dict[marking] = job_resp
+    return job_resp_dict
+
+
+def get_eccr_uuids(code_list):
+    """Function to resolve the ECCR UUIDs of a list of CWR codes, returning
+    a dictionary of code to job reference. Cached codes are read from the
+    cache, the rest are searched in combined queries of ECCR_BATCH_SIZE
+    codes and only codes those queries did not resolve are searched one at
+    a time"""
+
+    eccr_endpoint = get_eccr_api_endpoint()
+    if not eccr_endpoint:
+        return {code: None for code in code_list}
+
+    job_resp_dict = {}
+    cache_keys = {code: get_eccr_cache_key(eccr_endpoint, code)
+                  for code in code_list}
+
+    cached = {}
+    if settings.ECCR_CACHE_TTL:
+        cached = cache.get_many(list(cache_keys.values()))
+
+    missing_codes = []
+    for code in dict.fromkeys(code_list):
+        if cache_keys[code] in cached:
+            record_eccr_cache_lookup(hit=True)
+            job_resp_dict[code] = cached[cache_keys[code]]['job_resp']
+        else:
+            record_eccr_cache_lookup(hit=False)
+            missing_codes.append(code)
+
+    resolved = {}
+    batch_size = max(settings.ECCR_BATCH_SIZE, 1)
+    for start in range(0, len(missing_codes), batch_size):
+        resolved.update(search_eccr_uuids(
+            eccr_endpoint, missing_codes[start:start + batch_size]))
+
+    unresolved = [code for code in missing_codes if code not in resolved]
+    if unresolved:
+        logger.info("Searching ECCR for %d codes not resolved by the "
+                    "combined search", len(unresolved))
+    for code in unresolved:
+        resolved[code] = search_eccr_uuid(eccr_endpoint, code)
+
+    job_resp_dict.update(resolved)
+
+    if settings.ECCR_CACHE_TTL and resolved:
+        cache.set_many({cache_keys[code]: {'job_resp': job_resp}
+                        for code, job_resp in resolved.items()},
+                       settings.ECCR_CACHE_TTL)
+    return job_resp_dict
+
+
+def get_eccr_uuid(code):
+    """Setting ECCR UUID using CWR Code communication. Results are cached
+    for ECCR_CACHE_TTL seconds"""
+
+    eccr_endpoint = get_eccr_api_endpoint()
+    if not eccr_endpoint:
         return None
+
+    cache_key = get_eccr_cache_key(eccr_endpoint, code)
+    if settings.ECCR_CACHE_TTL:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            record_eccr_cache_lookup(hit=True)
+            return cached['job_resp']
+    record_eccr_cache_lookup(hit=False)
+
+    job_resp = search_eccr_uuid(eccr_endpoint, code)
+
+    if settings.ECCR_CACHE_TTL:
+        cache.set(cache_key, {'job_resp': job_resp}, settings.ECCR_CACHE_TTL)
+    return job_resp
@@ -0,0 +1,51 @@
+import hashlib
+import logging
+import re
+
+import html2text
+from bs4 import BeautifulSoup
+from core.management.utils.memo_cache import BoundedMemo
+
+logger = logging.getLogger('dict_config_logger')
+
+# an HTML tag can only start where "<" is followed by a letter
+_tag_start = re.compile('<[a-zA-Z]')
+
+_text_cache = BoundedMemo(
+    'HTML to text', 'HTML_CACHE_SIZE', 'HTML_CACHE_PERSIST', 'HTML_CACHE_TTL',
+    key_prefix='html2text:' + '.'.join(str(part) for part in
+                                       html2text.__version__))
+
+
+def contains_html(text):
+    """Function to check whether text contains an HTML tag. Text is only
+    parsed when it contains the start of a tag"""
+    if not _tag_start.search(text):
+        return False
+    return bool(BeautifulSoup(text, "html.parser").find())
+
+
+def get_html_cache_stats():
+    """Function to get the number of converted text cache hits and
+    misses"""
+    return _text_cache.get_stats()
+
+
+def log_html_cache_stats():
+    """Function to log the number of converted text cache hits and misses"""
+    _text_cache.log_stats()
+
+
+def clear_html_cache():
+    """Function to empty the in memory cache of converted text"""
+    _text_cache.clear()
+
+
+def html_to_text(html):
+    """Function to convert HTML to text, reusing the text of HTML that has
+    already been converted"""
+    if not isinstance(html, str):
+        return html2text.html2text(html)
+
+    text_hash = hashlib.sha256(html.encode('utf-8')).hexdigest()
+    return _text_cache.memoize(text_hash, html2text.html2text, html)
@@ -0,0 +1,190 @@
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from core.management.utils.response_archive import (get_archive_key,
+                                                    get_response_archive)
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger('dict_config_logger')
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+_host_stats = {}
+_host_stats_lock = threading.Lock()
+
+
+def create_session():
+    """Function to create a requests session backed by a keep-alive
+    connection pool"""
+    adapter = HTTPAdapter(pool_connections=settings.HTTP_POOL_CONNECTIONS,
+                          pool_maxsize=settings.HTTP_POOL_MAXSIZE)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session():
+    """Function to retrieve the session shared by the current process. A new
+    session is created after a fork so pooled connections are never shared
+    between processes"""
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = create_session()
+                _session_pid = pid
+                with _host_stats_lock:
+                    _host_stats.clear()
+    return _session
+
+
+def get_host(url):
+    """Function to get the host and port a URL connects to"""
+    return urlsplit(url).netloc
+
+
+def record_host_stats(url, latency, failed=False, retried=False):
+    """Function to update the request statistics of the host of a URL"""
+    host = get_host(url)
+    with _host_stats_lock:
+        host_stats = _host_stats.setdefault(host, {
+            'url': url,
+            'requests': 0,
+            'failures': 0,
+            'retries': 0,
+            'total_latency': 0.0,
+            'max_latency': 0.0,
+        })
+        host_stats['requests'] += 1
+        host_stats['total_latency'] += latency
+        host_stats['max_latency'] = max(host_stats['max_latency'], latency)
+        if failed:
+            host_stats['failures'] += 1
+        if retried:
+            host_stats['retries'] += 1
+
+
+def get_connection_counts(url):
+    """Function to get the number of connections opened and requests sent
+    by the connection pool of the host of a URL"""
+    try:
+        pool = get_session().get_adapter(url).poolmanager.\
+            connection_from_url(url)
+    except Exception:  # pylint: disable=broad-except
+        return 0, 0
+    return getattr(pool, 'num_connections', 0), \
+        getattr(pool, 'num_requests', 0)
+
+
+def get_host_stats():
+    """Function to get request, connection reuse and latency statistics for
+    every host contacted by the current process"""
+    with _host_stats_lock:
+        host_stats_list = [(host, dict(host_stats))
+                           for host, host_stats in _host_stats.items()]
+
+    stats = {}
+    for host, host_stats in host_stats_list:
+        connections, pool_requests = \
+            get_connection_counts(host_stats.pop('url'))
+        host_stats['connections'] = connections
+        host_stats['reused_connections'] = max(pool_requests - connections,
+                                               0)
+        host_stats['average_latency'] = \
+            host_stats['total_latency'] / host_stats['requests']
+        stats[host] = host_stats
+    return stats
+
+
+def log_host_stats():
+    """Function to log the request statistics of every host contacted"""
+    for host, host_stats in get_host_stats().items():
+        logger.info("%s: %d requests (%d retried, %d failed), %d "
+                    "connections opened, %d connection reuses, average "
+                    "latency %.3f seconds, max latency %.3f seconds",
+                    host, host_stats['requests'], host_stats['retries'],
+                    host_stats['failures'], host_stats['connections'],
+                    host_stats['reused_connections'],
+                    host_stats['average_latency'],
+                    host_stats['max_latency'])
+
+
+def get_backoff(attempt):
+    """Function to get the delay before retrying a failed attempt"""
+    return settings.HTTP_BACKOFF_FACTOR * (2 ** attempt)
+
+
+def request(method, url, idempotent=None, **kwargs):
+    """Function to send a request through the shared session. Idempotent
+    requests are retried with exponential backoff on connection errors,
+    timeouts and transient server errors. When RESPONSE_ARCHIVE_MODE is set
+    idempotent requests are captured to or replayed from the response
+    archive.
+
+    :param method: HTTP method of the request
+    :param url: URL of the request
+    :param idempotent: whether the request can safely be sent again,
+        defaults to True for idempotent HTTP methods
+    :return: requests.Response"""
+    method = method.upper()
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    attempts = settings.HTTP_MAX_RETRIES + 1 if idempotent else 1
+    kwargs.setdefault('timeout', (settings.HTTP_CONNECT_TIMEOUT,
+                                  settings.HTTP_READ_TIMEOUT))
+
+    archive = get_response_archive() if idempotent else None
+    if archive is not None:
+        archive_key = get_archive_key(method, url, kwargs.get('data'))
+        if archive.mode == 'replay':
+            return archive.load(archive_key)
+
+    for attempt in range(attempts):
+        last_attempt = attempt + 1 >= attempts
+        start_time = time.perf_counter()
+        try:
+            response = get_session().request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout) as e:
+            record_host_stats(url, time.perf_counter() - start_time,
+                              failed=True, retried=not last_attempt)
+            if last_attempt:
+                raise
+            logger.warning("Request to " + get_host(url) + " failed, "
+                           "retrying: " + str(e))
+        else:
+            retry = response.status_code in RETRY_STATUS_CODES and \
+                not last_attempt
+            record_host_stats(url, time.perf_counter() - start_time,
+                              retried=retry)
+            if not retry:
+                if archive is not None:
+                    archive.store(archive_key, response)
+                return response
+            response.close()
+            logger.warning("Request to " + get_host(url) + " returned " +
+                           str(response.status_code) + ", retrying")
+        time.sleep(get_backoff(attempt))
+
+
+def get(url, **kwargs):
+    """Function to send a GET request through the shared session"""
+    return request('GET', url, **kwargs)
+
+
+def post(url, data=None, **kwargs):
+    """Function to send a POST request through the shared session"""
+    return request('POST', url, data=data, **kwargs)
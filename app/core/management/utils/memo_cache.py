@@ -0,0 +1,112 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger('dict_config_logger')
+
+
+class BoundedMemo:
+    """In memory cache of computed values, evicting the least recently used
+    value once it holds as many values as the size setting. When the
+    persist setting is enabled values are also kept in the Django cache for
+    the TTL setting, so later runs can reuse them. Settings are read when
+    the cache is used, so they can be overridden in tests"""
+
+    def __init__(self, name, size_setting, persist_setting=None,
+                 ttl_setting=None, key_prefix=''):
+        """
+        :param name: name of the cache in logs
+        :param size_setting: setting holding the number of values kept in
+            memory, 0 disables the in memory cache
+        :param persist_setting: setting enabling the Django cache
+        :param ttl_setting: setting holding the seconds values are kept in
+            the Django cache
+        :param key_prefix: prefix of Django cache keys, which should change
+            whenever the computed values do
+        """
+        self.name = name
+        self.size_setting = size_setting
+        self.persist_setting = persist_setting
+        self.ttl_setting = ttl_setting
+        self.key_prefix = key_prefix
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def is_persisted(self):
+        """Whether values are also kept in the Django cache"""
+        return bool(self.persist_setting and
+                    getattr(settings, self.persist_setting))
+
+    def disable_persistence(self):
+        """Keep values in memory only, whatever the persist setting"""
+        self.persist_setting = None
+
+    def get_cache_key(self, key):
+        """Create the Django cache key of a value"""
+        return self.key_prefix + ':' + key
+
+    def get(self, key):
+        """Get a value from the in memory cache, falling back to the Django
+        cache when values are persisted, or None"""
+        with self._lock:
+            if key in self._values:
+                self._values.move_to_end(key)
+                return self._values[key]
+
+        if self.is_persisted():
+            value = cache.get(self.get_cache_key(key))
+            if value is not None:
+                self.set(key, value, persist=False)
+            return value
+        return None
+
+    def set(self, key, value, persist=True):
+        """Add a value to the in memory cache, evicting the least recently
+        used one, and to the Django cache when values are persisted"""
+        size = getattr(settings, self.size_setting)
+        if size > 0:
+            with self._lock:
+                self._values[key] = value
+                self._values.move_to_end(key)
+                while len(self._values) > size:
+                    self._values.popitem(last=False)
+
+        if persist and self.is_persisted():
+            cache.set(self.get_cache_key(key), value,
+                      getattr(settings, self.ttl_setting))
+
+    def memoize(self, key, compute, *args):
+        """Get the value of a key, computing it with compute(*args) and
+        caching it the first time the key is seen. Computed values must
+        not be None"""
+        value = self.get(key)
+        self.record_lookup(value is not None)
+        if value is None:
+            value = compute(*args)
+            self.set(key, value)
+        return value
+
+    def record_lookup(self, hit):
+        """Count a cache hit or miss"""
+        with self._lock:
+            self._stats['hits' if hit else 'misses'] += 1
+
+    def get_stats(self):
+        """Get the number of cache hits and misses"""
+        with self._lock:
+            return dict(self._stats)
+
+    def log_stats(self):
+        """Log the number of cache hits and misses"""
+        cache_stats = self.get_stats()
+        logger.info("%s cache: %d hits, %d misses", self.name,
+                    cache_stats['hits'], cache_stats['misses'])
+
+    def clear(self):
+        """Empty the in memory cache"""
+        with self._lock:
+            self._values.clear()
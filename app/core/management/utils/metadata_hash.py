@@ -0,0 +1,76 @@
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Number of bytes of every metadata hash, stored in fixed width columns
+METADATA_HASH_SIZE = 32
+
+
+def canonicalize_value(value):
+    """Function to convert a value so equal metadata serializes the same
+    way, writing floats holding whole numbers as integers"""
+    if isinstance(value, dict):
+        return {str(key): canonicalize_value(item)
+                for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonicalize_value(item) for item in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def convert_to_canonical_json(value):
+    """Function to serialize values JSON does not support"""
+    if isinstance(value, (datetime.datetime, datetime.date,
+                          datetime.time)):
+        return value.isoformat()
+    raise TypeError("Object of type " + type(value).__name__ +
+                    " is not JSON serializable")
+
+
+def canonical_json(data):
+    """Function to serialize metadata to JSON with sorted keys and without
+    whitespace, so the result does not depend on the order of fields"""
+    return json.dumps(canonicalize_value(data), sort_keys=True,
+                      separators=(',', ':'), ensure_ascii=False,
+                      default=convert_to_canonical_json)
+
+
+def get_digest(encoded, algorithm=None):
+    """Function to hash bytes using the METADATA_HASH_ALGORITHM digest,
+    returned as METADATA_HASH_SIZE bytes"""
+    if algorithm is None:
+        algorithm = settings.METADATA_HASH_ALGORITHM
+
+    if algorithm == 'blake2b':
+        return hashlib.blake2b(encoded,
+                               digest_size=METADATA_HASH_SIZE).digest()
+
+    try:
+        digest = hashlib.new(algorithm, encoded).digest()
+    except (ValueError, TypeError) as e:
+        raise ImproperlyConfigured("Unsupported METADATA_HASH_ALGORITHM " +
+                                   str(algorithm)) from e
+    if len(digest) < METADATA_HASH_SIZE:
+        raise ImproperlyConfigured("METADATA_HASH_ALGORITHM " + algorithm +
+                                   " creates hashes shorter than " +
+                                   str(METADATA_HASH_SIZE) + " bytes")
+    return digest[:METADATA_HASH_SIZE]
+
+
+def get_metadata_hash(data, algorithm=None):
+    """Function to create the hash of metadata from its canonical JSON"""
+    return get_digest(canonical_json(data).encode('utf-8'), algorithm)
+
+
+def get_raw_hash(data, algorithm=None):
+    """Function to create the fingerprint of a raw source record. Unlike
+    the metadata hash it tells whole number floats from integers, since
+    normalization treats them differently"""
+    raw_json = json.dumps(data, sort_keys=True, separators=(',', ':'),
+                          ensure_ascii=False,
+                          default=convert_to_canonical_json)
+    return get_digest(raw_json.encode('utf-8'), algorithm)
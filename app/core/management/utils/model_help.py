@@ -1,11 +1,60 @@
+import hashlib
 import html
 import logging
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 import bleach
 from confusable_homoglyphs import categories, confusables
+from core.management.utils.memo_cache import BoundedMemo
+from django.conf import settings
+from django.db import connections
 
 logger = logging.getLogger('dict_config_logger')
 
+_sanitize_cache = BoundedMemo(
+    'Sanitized string', 'SANITIZE_CACHE_SIZE', 'SANITIZE_CACHE_PERSIST',
+    'SANITIZE_CACHE_TTL', key_prefix='sanitize:' + bleach.__version__)
+
+
+def get_sanitize_cache_stats():
+    """Function to get the number of sanitized string cache hits and
+    misses"""
+    return _sanitize_cache.get_stats()
+
+
+def log_sanitize_cache_stats():
+    """Function to log the number of sanitized string cache hits and
+    misses"""
+    _sanitize_cache.log_stats()
+
+
+def clear_sanitize_cache():
+    """Function to empty the in memory cache of sanitized strings"""
+    _sanitize_cache.clear()
+
+
+def memoize_text(kind, text, compute):
+    """Function to compute a value for a string once, reusing the value of
+    strings with the same content"""
+    memo_key = kind + ':' + hashlib.sha256(
+        text.encode('utf-8', 'surrogatepass')).hexdigest()
+    return _sanitize_cache.memoize(memo_key, compute, text)
+
+
+def clean_text(text):
+    """Function to bleach HTML tags from a string"""
+    return html.unescape(bleach.clean(text, tags={}, strip=True))
+
+
+def is_dangerous_text(text):
+    """Function to check a string for dangerous homoglyphs. ASCII only
+    holds Latin and common characters, so it can never mix scripts"""
+    if text.isascii():
+        return False
+    return bool(confusables.is_dangerous(text))
+
 
 def bleach_data_to_json(rdata):
     """Recursive function to bleach/clean HTML tags from string
@@ -19,8 +68,7 @@ def bleach_data_to_json(rdata):
     for key in keysList:
         if isinstance(rdata[key], str):
             # if string, clean
-            rdata[key] = bleach.clean(rdata[key], tags={}, strip=True)
-            rdata[key] = html.unescape(rdata[key])
+            rdata[key] = memoize_text('clean', rdata[key], clean_text)
         if isinstance(rdata[key], dict):
             # if dict, enter dict
             rdata[key] = bleach_data_to_json(rdata[key])
@@ -34,8 +82,8 @@ def confusable_homoglyphs_check(data):
     for key in data:
 
         # if string, Check homoglyph
-        if isinstance(data[key], str) and bool(confusables.
-                                               is_dangerous(data[key])):
+        if isinstance(data[key], str) and not data[key].isascii() and \
+                memoize_text('homoglyph', data[key], is_dangerous_text):
             data_is_safe = False
             logger.info("Homoglyphs does not have the expected prefered alias")
             logger.error(categories.unique_aliases(data[key]))
@@ -45,3 +93,50 @@ def confusable_homoglyphs_check(data):
             if not ret_val:
                 data_is_safe = False
     return data_is_safe
+
+
+def sanitize_metadata(metadata):
+    """Function to check metadata for dangerous homoglyphs and bleach HTML
+    tags from it.
+
+    :param metadata: dictionary to sanitize.
+    WARNING metadata will be edited
+    :return: tuple of the cleaned dictionary and whether it is safe"""
+    is_safe = confusable_homoglyphs_check(metadata)
+    return bleach_data_to_json(metadata), is_safe
+
+
+def init_sanitize_process():
+    """Function to prepare a process of the sanitizing pool. The process
+    never uses a database connection of the parent, and keeps sanitized
+    strings in its own memory only"""
+    connections.close_all()
+    _sanitize_cache.disable_persistence()
+
+
+def sanitize_metadata_batch(metadata_list, max_processes=None):
+    """Function to sanitize a list of metadata dictionaries. Batches of at
+    least SANITIZE_POOL_THRESHOLD dictionaries are spread over a pool of up
+    to max_processes processes. Pool processes are spawned rather than
+    forked, as extraction runs threads whose locks a forked process could
+    inherit held. Strings sanitized by pool processes are not added to the
+    cache of sanitized strings of this process.
+
+    :param metadata_list: list of dictionaries to sanitize.
+    WARNING the dictionaries are edited when sanitized in this process
+    :param max_processes: number of processes, defaults to
+        SANITIZE_MAX_PROCESSES
+    :return: list of (cleaned dictionary, is safe) tuples in the order of
+        metadata_list"""
+    if max_processes is None:
+        max_processes = settings.SANITIZE_MAX_PROCESSES
+    if max_processes <= 1 or \
+            len(metadata_list) < settings.SANITIZE_POOL_THRESHOLD:
+        return [sanitize_metadata(metadata) for metadata in metadata_list]
+
+    chunksize = max(math.ceil(len(metadata_list) / (max_processes * 4)), 1)
+    with ProcessPoolExecutor(max_workers=max_processes,
+                             mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_sanitize_process) as executor:
+        return list(executor.map(sanitize_metadata, metadata_list,
+                                 chunksize=chunksize))
@@ -0,0 +1,47 @@
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+_uuid7_lock = threading.Lock()
+_uuid7_state = {'timestamp': 0, 'counter': 0}
+
+# largest value of the 12 bit counter following the timestamp
+UUID7_COUNTER_MAX = 0xfff
+
+
+def uuid7():
+    """Function to create a time ordered UUID in the version 7 layout: a 48
+    bit millisecond timestamp, the version, a 12 bit counter and 62 random
+    bits. The counter keeps UUIDs created in the same millisecond in order,
+    and moves the timestamp on when it runs out"""
+    timestamp = time.time_ns() // 1000000
+    with _uuid7_lock:
+        if timestamp > _uuid7_state['timestamp']:
+            # start from a random counter in the lower half, so it rarely
+            # runs out
+            _uuid7_state['timestamp'] = timestamp
+            _uuid7_state['counter'] = \
+                int.from_bytes(os.urandom(2), 'big') & 0x7ff
+        elif _uuid7_state['counter'] < UUID7_COUNTER_MAX:
+            _uuid7_state['counter'] += 1
+        else:
+            _uuid7_state['timestamp'] += 1
+            _uuid7_state['counter'] = 0
+        timestamp = _uuid7_state['timestamp']
+        counter = _uuid7_state['counter']
+
+    random_bits = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+    value = (timestamp & ((1 << 48) - 1)) << 80 | 0x7 << 76 | \
+        counter << 64 | 0x2 << 62 | random_bits
+    return uuid.UUID(int=value)
+
+
+def get_record_uuid():
+    """Function to create the UUID of a new MetadataLedger record, time
+    ordered when LEDGER_TIME_ORDERED_UUIDS is set and random otherwise"""
+    if settings.LEDGER_TIME_ORDERED_UUIDS:
+        return uuid7()
+    return uuid.uuid4()
@@ -0,0 +1,217 @@
+import atexit
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+import requests
+from django.conf import settings
+
+logger = logging.getLogger('dict_config_logger')
+
+# every archive starts with this line so other files are never replayed
+ARCHIVE_MAGIC = b'XIA-RESPONSE-ARCHIVE 1\n'
+# each record starts with the length of its key and of its compressed body
+RECORD_HEADER = struct.Struct('>II')
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive_key(method, url, data=None):
+    """Function to create the key a request is archived under. Headers are
+    left out so tokens are never written to the archive"""
+    key = method.upper() + ' ' + url
+    if data:
+        key += '\n' + json.dumps(data, sort_keys=True)
+    return key
+
+
+def get_index_path(path):
+    """Function to get the path of the index of an archive"""
+    return path + '.idx'
+
+
+def scan_archive_records(data):
+    """Function to build the index of an archive by reading every record
+    header, returning a dictionary of key to offset and length of the
+    compressed body"""
+    index = {}
+    offset = len(ARCHIVE_MAGIC)
+    while offset + RECORD_HEADER.size <= len(data):
+        key_length, body_length = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+        key = bytes(data[offset:offset + key_length]).decode('utf-8')
+        offset += key_length
+        if offset + body_length > len(data):
+            # a record cut short by an interrupted capture
+            break
+        index[key] = (offset, body_length)
+        offset += body_length
+    return index
+
+
+class ResponseCapture:
+    """Archive appending responses to a file of compressed records, with an
+    index of key to record position written when the archive is closed.
+    Responses are added to an existing archive, so later captures of a
+    request replace earlier ones"""
+
+    mode = 'capture'
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(ARCHIVE_MAGIC)
+            self.index = {}
+        else:
+            self.index = self.read_records()
+
+    def read_records(self):
+        """Read the index of the records already in the archive"""
+        with open(self.path, 'rb') as archive_file:
+            data = archive_file.read()
+        if not data.startswith(ARCHIVE_MAGIC):
+            self.file.close()
+            raise ValueError(self.path + " is not a response archive")
+        index = scan_archive_records(data)
+        end = max([offset + length for offset, length in index.values()],
+                  default=len(ARCHIVE_MAGIC))
+        if end < len(data):
+            # drop a record cut short by an interrupted capture
+            self.file.truncate(end)
+            self.file.seek(end)
+        return index
+
+    def store(self, key, response):
+        """Add a response to the archive, replacing an earlier response to
+        the same request"""
+        body = zlib.compress(json.dumps({
+            'status_code': response.status_code,
+            'headers': dict(response.headers),
+            'text': response.text,
+        }).encode('utf-8'))
+        encoded_key = key.encode('utf-8')
+        with self.lock:
+            self.file.write(RECORD_HEADER.pack(len(encoded_key), len(body)))
+            self.file.write(encoded_key)
+            self.index[key] = (self.file.tell(), len(body))
+            self.file.write(body)
+
+    def close(self):
+        """Write the index and close the archive"""
+        with self.lock:
+            if self.file.closed:
+                return
+            size = self.file.tell()
+            self.file.close()
+            with open(get_index_path(self.path), 'w',
+                      encoding='utf-8') as index_file:
+                json.dump({'size': size, 'records': self.index}, index_file)
+        logger.info("Archived %d responses to %s", len(self.index),
+                    self.path)
+
+
+class ResponseReplay:
+    """Archive serving responses from a memory mapped file of compressed
+    records"""
+
+    mode = 'replay'
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as archive_file:
+            self.data = mmap.mmap(archive_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        if self.data[:len(ARCHIVE_MAGIC)] != ARCHIVE_MAGIC:
+            self.data.close()
+            raise ValueError(path + " is not a response archive")
+        self.index = self.read_index()
+
+    def read_index(self):
+        """Read the index of the archive, rebuilding it from the record
+        headers when it is missing or does not match the archive"""
+        try:
+            with open(get_index_path(self.path), encoding='utf-8') as \
+                    index_file:
+                index = json.load(index_file)
+            if index['size'] == len(self.data):
+                return {key: tuple(position) for key, position in
+                        index['records'].items()}
+        except (OSError, ValueError, KeyError):
+            pass
+        logger.warning("Rebuilding the index of response archive %s",
+                       self.path)
+        return scan_archive_records(self.data)
+
+    def load(self, key):
+        """Return the archived response to a request, raising a connection
+        error when the request was not captured"""
+        position = self.index.get(key)
+        if position is None:
+            raise requests.exceptions.ConnectionError(
+                "No archived response for " + key.split('\n')[0])
+        offset, length = position
+        archived = json.loads(zlib.decompress(
+            self.data[offset:offset + length]))
+
+        response = requests.Response()
+        response.status_code = archived['status_code']
+        response.headers.update(archived['headers'])
+        response._content = archived['text'].encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = key.split(' ', 1)[1].split('\n')[0]
+        return response
+
+    def close(self):
+        """Release the memory map of the archive"""
+        self.data.close()
+
+
+def get_response_archive():
+    """Function to retrieve the response archive of the current process
+    for RESPONSE_ARCHIVE_MODE, or None when responses are not archived"""
+    global _archive
+
+    mode = settings.RESPONSE_ARCHIVE_MODE
+    if mode not in ('capture', 'replay'):
+        return None
+    path = settings.RESPONSE_ARCHIVE_PATH
+    archive = _archive
+    if archive is None or archive.mode != mode or archive.path != path:
+        with _archive_lock:
+            if _archive is None or _archive.mode != mode or \
+                    _archive.path != path:
+                if _archive is not None:
+                    _archive.close()
+                if mode == 'capture':
+                    logger.info("Capturing responses to %s", path)
+                    _archive = ResponseCapture(path)
+                else:
+                    logger.info("Replaying responses from %s", path)
+                    _archive = ResponseReplay(path)
+            archive = _archive
+    return archive
+
+
+def close_response_archive():
+    """Function to close the response archive of the current process,
+    writing the index of captured responses"""
+    global _archive
+
+    with _archive_lock:
+        if _archive is not None:
+            _archive.close()
+            _archive = None
+
+
+# write the index when the process exits without closing the archive
+atexit.register(close_response_archive)
@@ -0,0 +1,75 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+
+logger = logging.getLogger('dict_config_logger')
+
+
+def get_cache_path(url):
+    """Function to get the path of the cache file for a URL"""
+    url_hash = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return os.path.join(settings.XSR_RESPONSE_CACHE_DIR,
+                        url_hash + '.json.gz')
+
+
+def get_cached_response(url):
+    """Function to retrieve the cached response for a URL, returning a
+    dictionary with the validators and body of the response or None"""
+    try:
+        with gzip.open(get_cache_path(url), 'rt', encoding='utf-8') as file:
+            cached = json.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable cached response for " + url +
+                       ": " + str(e))
+        return None
+    # guard against hash collisions
+    if cached.get('url') != url:
+        return None
+    return cached
+
+
+def get_conditional_headers(cached):
+    """Function to create the conditional request headers for a cached
+    response"""
+    headers = {}
+    if cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
+    if cached.get('last_modified'):
+        headers['If-Modified-Since'] = cached['last_modified']
+    return headers
+
+
+def store_cached_response(url, response):
+    """Function to save the validators and body of a response for a URL.
+    Responses without validators are not cached"""
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if response.status_code != 200 or not (etag or last_modified):
+        return
+
+    cached = {
+        'url': url,
+        'etag': etag,
+        'last_modified': last_modified,
+        'text': response.text,
+    }
+    os.makedirs(settings.XSR_RESPONSE_CACHE_DIR, exist_ok=True)
+    # write to a temporary file first so readers never see a partial file
+    file_descriptor, temp_path = tempfile.mkstemp(
+        dir=settings.XSR_RESPONSE_CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'wb') as raw_file, \
+                gzip.open(raw_file, 'wt', encoding='utf-8') as file:
+            json.dump(cached, file)
+        os.replace(temp_path, get_cache_path(url))
+    except OSError as e:
+        logger.warning("Unable to cache response for " + url + ": " + str(e))
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
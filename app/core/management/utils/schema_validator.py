@@ -0,0 +1,305 @@
+from collections import namedtuple
+from itertools import islice
+
+import numpy as np
+from core.management.utils.xia_internal import (is_date,
+                                                required_recommended_logs)
+from core.management.utils.xss_client import (
+    get_data_types_for_validation, get_required_fields_for_validation)
+from django.conf import settings
+
+# marks a field path that is not in a record
+MISSING = object()
+
+# codes of the values of a field matrix. dict_flatten keeps leaf values
+# only, so nested dictionaries count as missing values
+MISSING_CODE = 0
+NESTED_CODE = 1
+EMPTY_CODE = 2
+FILLED_CODE = 3
+TYPE_CODES = {type(MISSING): MISSING_CODE, dict: NESTED_CODE}
+
+
+class ValidationResult(namedtuple('ValidationResult', [
+        'missing_required', 'missing_recommended', 'datatype_errors'])):
+    """Fields of a record missing a required or recommended value or
+    holding a value of an unexpected data type, in schema order"""
+
+    __slots__ = ()
+
+    @property
+    def validation_result(self):
+        """'Y' when no required value is missing and 'N' otherwise"""
+        return 'N' if self.missing_required else 'Y'
+
+
+def get_field_value(data, segments):
+    """Function to get the value of a record at a field path split on dots,
+    the way dict_flatten names nested fields, or MISSING"""
+    value = data
+    for segment in segments:
+        if not isinstance(value, dict) or segment not in value:
+            # keys holding dots are named the same way as nested keys
+            return get_dotted_field_value(data, segments)
+        value = value[segment]
+    return value
+
+
+def get_dotted_field_value(data, segments):
+    """Function to get the value of a record at a field path whose keys may
+    hold dots, or MISSING"""
+    if not segments:
+        return data
+    if not isinstance(data, dict):
+        return MISSING
+    for end in range(1, len(segments) + 1):
+        key = '.'.join(segments[:end])
+        if key in data:
+            value = get_dotted_field_value(data[key], segments[end:])
+            if value is not MISSING:
+                return value
+    return MISSING
+
+
+def find_missing_fields(record, fields):
+    """Function to find the fields of a record without a value"""
+    missing_fields = []
+    for field, segments in fields:
+        value = record
+        for segment in segments:
+            if isinstance(value, dict) and segment in value:
+                value = value[segment]
+            else:
+                value = get_dotted_field_value(record, segments)
+                break
+        if not has_field_value(value):
+            missing_fields.append(field)
+    return tuple(missing_fields)
+
+
+def has_dotted_key(value):
+    """Function to check whether a dictionary has a key holding a dot"""
+    return isinstance(value, dict) and '.' in ''.join(value)
+
+
+def get_value_code(value):
+    """Function to get the code of a value of a field matrix"""
+    if not value and value.__class__ is str:
+        return EMPTY_CODE
+    return TYPE_CODES.get(value.__class__, FILLED_CODE)
+
+
+def get_field_matrix(records, field_groups, field_paths):
+    """Function to load the values of a batch of records at the schema field
+    paths into a matrix of objects, with a row per record and a column per
+    path, along with a matrix of the codes of the values. Each record is
+    read once, looking each parent path up once
+
+    :param field_groups: tuple of parent paths and the keys under them
+    :param field_paths: field paths in the order of the matrix columns
+    :return: matrix of values, MISSING where a record has no value, and
+        matrix of value codes"""
+    values = []
+    dotted = []
+    for record in records:
+        record_dotted = has_dotted_key(record)
+        for parent, keys in field_groups:
+            value = record
+            for segment in parent:
+                value = value.get(segment, MISSING) \
+                    if isinstance(value, dict) else MISSING
+                record_dotted = record_dotted or has_dotted_key(value)
+            if isinstance(value, dict):
+                values.extend([value.get(key, MISSING) for key in keys])
+            else:
+                values.extend([MISSING] * len(keys))
+        dotted.append(record_dotted)
+
+    shape = (len(records), len(field_paths))
+    matrix = np.fromiter(values, dtype=object,
+                         count=len(values)).reshape(shape)
+    # get_value_code inlined, as it runs for every value of the batch
+    get_type_code = TYPE_CODES.get
+    codes = np.fromiter(
+        [get_type_code(value.__class__, FILLED_CODE)
+         if value or value.__class__ is not str else EMPTY_CODE
+         for value in values],
+        dtype=np.uint8, count=len(values)).reshape(shape)
+    # keys holding dots are named the same way as nested keys
+    dotted_rows = np.fromiter(dotted, dtype=bool, count=len(records))
+    for record_index, field_index in zip(*np.nonzero(
+            (codes == MISSING_CODE) & dotted_rows[:, np.newaxis])):
+        value = get_dotted_field_value(records[record_index],
+                                       field_paths[field_index])
+        matrix[record_index, field_index] = value
+        codes[record_index, field_index] = get_value_code(value)
+    return matrix, codes
+
+
+def get_missing_fields(missing_mask, field_names):
+    """Function to get the fields each record misses from a mask of
+    missing fields"""
+    missing_fields = [[] for _ in range(missing_mask.shape[0])]
+    record_indexes, field_indexes = np.nonzero(missing_mask)
+    for record_index, field_index in zip(record_indexes.tolist(),
+                                         field_indexes.tolist()):
+        missing_fields[record_index].append(field_names[field_index])
+    return [tuple(fields) for fields in missing_fields]
+
+
+def has_field_value(value):
+    """Function to check a value counts as filled in. dict_flatten keeps
+    leaf values only and turns them into strings, so nested dictionaries
+    and empty strings are the only values missing"""
+    if value is MISSING or isinstance(value, dict):
+        return False
+    return not isinstance(value, str) or bool(value)
+
+
+def get_type_checker(data_type):
+    """Function to get the function checking a value holds a data type of
+    the schema, or None for data types that are not checked"""
+    if data_type == 'datetime':
+        return is_date
+    if isinstance(data_type, type):
+        return lambda value: isinstance(value, data_type)
+    return None
+
+
+class SchemaValidator:
+    """Validator compiled from the required and recommended fields and data
+    types of an XSS schema, checking records without flattening them"""
+
+    def __init__(self, required_column_list, recommended_column_list,
+                 expected_data_types=None):
+        self.required_fields = self.compile_fields(required_column_list)
+        self.recommended_fields = self.compile_fields(
+            recommended_column_list)
+        self.required_names = [field for field, _ in self.required_fields]
+        self.recommended_names = [field for field, _ in
+                                  self.recommended_fields]
+        self.type_checkers = []
+        for field, data_type in (expected_data_types or {}).items():
+            type_checker = get_type_checker(data_type)
+            if type_checker is not None:
+                self.type_checkers.append(
+                    (field, tuple(field.split('.')), type_checker))
+        self.compile_field_matrix()
+
+    def compile_field_matrix(self):
+        """Group the field paths under their parent paths and find the
+        column of each field in the field matrix of batch validation"""
+        field_groups = {}
+        for _, segments in self.required_fields + self.recommended_fields:
+            field_groups.setdefault(segments[:-1], {})[segments[-1]] = None
+        for _, segments, _ in self.type_checkers:
+            field_groups.setdefault(segments[:-1], {})[segments[-1]] = None
+        self.field_groups = tuple((parent, tuple(keys)) for parent, keys
+                                  in field_groups.items())
+        self.field_paths = [parent + (key,) for parent, keys
+                            in self.field_groups for key in keys]
+
+        field_columns = {segments: column for column, segments
+                         in enumerate(self.field_paths)}
+        self.required_columns = np.array(
+            [field_columns[segments] for _, segments in self.required_fields],
+            dtype=np.intp)
+        self.recommended_columns = np.array(
+            [field_columns[segments] for _, segments
+             in self.recommended_fields], dtype=np.intp)
+        self.type_columns = [(field, field_columns[segments], type_checker)
+                             for field, segments, type_checker
+                             in self.type_checkers]
+
+    @classmethod
+    def from_schema(cls, schema_data_dict, check_data_types=False):
+        """Compile a validator from an XSS schema"""
+        required_column_list, recommended_column_list = \
+            get_required_fields_for_validation(schema_data_dict)
+        expected_data_types = None
+        if check_data_types:
+            expected_data_types = get_data_types_for_validation(
+                schema_data_dict)
+        return cls(required_column_list, recommended_column_list,
+                   expected_data_types)
+
+    @staticmethod
+    def compile_fields(column_list):
+        """Split each field once, keeping schema order and dropping
+        duplicates"""
+        return tuple((field, tuple(field.split('.')))
+                     for field in dict.fromkeys(column_list))
+
+    def validate(self, record):
+        """Validate a record against the schema"""
+        missing_required = find_missing_fields(record, self.required_fields)
+        missing_recommended = find_missing_fields(record,
+                                                  self.recommended_fields)
+
+        datatype_errors = []
+        for field, segments, type_checker in self.type_checkers:
+            value = get_field_value(record, segments)
+            # only values dict_flatten keeps are type checked
+            if value is not MISSING and not isinstance(value, dict) and \
+                    not type_checker(value):
+                datatype_errors.append(field)
+
+        return ValidationResult(missing_required, missing_recommended,
+                                tuple(datatype_errors))
+
+    def validate_batch(self, records):
+        """Validate a batch of records against the schema. Each record is
+        read once into a matrix of values and a matrix of value codes, and
+        the fields each record misses are found with array operations on
+        the codes
+
+        :param records: list of records to validate
+        :return: list of ValidationResult in the order of records"""
+        records = list(records)
+        matrix, codes = get_field_matrix(records, self.field_groups,
+                                         self.field_paths)
+        presence = codes == FILLED_CODE
+        missing_required = get_missing_fields(
+            ~presence[:, self.required_columns], self.required_names)
+        missing_recommended = get_missing_fields(
+            ~presence[:, self.recommended_columns], self.recommended_names)
+
+        datatype_errors = [[] for _ in records]
+        for field, column, type_checker in self.type_columns:
+            # only values dict_flatten keeps are type checked
+            for record_index in np.flatnonzero(codes[:, column] >=
+                                               EMPTY_CODE):
+                if not type_checker(matrix[record_index, column]):
+                    datatype_errors[record_index].append(field)
+
+        return [ValidationResult(*outcome) for outcome in zip(
+            missing_required, missing_recommended,
+            map(tuple, datatype_errors))]
+
+
+def iter_validated_rows(validator, data_dict, metadata_field):
+    """Generator function validating the metadata of ledger rows in batches
+    of LEDGER_UPDATE_BATCH_SIZE rows, yielding the index of each row, the
+    row and its ValidationResult. Rows are read one batch at a time"""
+    rows = iter(data_dict)
+    batch_size = max(settings.LEDGER_UPDATE_BATCH_SIZE, 1)
+    start = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        results = validator.validate_batch(
+            [data[metadata_field] for data in batch])
+        for index, (data, result) in enumerate(zip(batch, results), start):
+            yield index, data, result
+        start += len(batch)
+
+
+def log_validation_result(index, result):
+    """Function to log the fields of a record that failed validation"""
+    for field in result.missing_required:
+        required_recommended_logs(index, "Required", field)
+    for field in result.missing_recommended:
+        required_recommended_logs(index, "Recommended", field)
+    for field in result.datatype_errors:
+        required_recommended_logs(index, "datatype", field)
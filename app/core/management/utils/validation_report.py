@@ -0,0 +1,99 @@
+import logging
+from collections import Counter
+
+from core.management.utils.schema_validator import log_validation_result
+from core.models import ValidationFailure
+from django.conf import settings
+
+logger = logging.getLogger('dict_config_logger')
+
+
+class ValidationReport:
+    """Validation outcomes of a run of a validation stage, counted per run
+    and per field. The fields of the first VALIDATION_LOG_SAMPLE records
+    failing validation are logged, the others only at debug level"""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.records = 0
+        self.invalid_records = 0
+        self.incomplete_records = 0
+        self.mistyped_records = 0
+        self.failed_records = 0
+        self.logged_records = 0
+        self.missing_required = Counter()
+        self.missing_recommended = Counter()
+        self.datatype_errors = Counter()
+        self.failures = []
+
+    def add(self, index, result, key_hash):
+        """Count the outcome of validating a record"""
+        self.records += 1
+        self.invalid_records += bool(result.missing_required)
+        self.incomplete_records += bool(result.missing_recommended)
+        self.mistyped_records += bool(result.datatype_errors)
+        self.missing_required.update(result.missing_required)
+        self.missing_recommended.update(result.missing_recommended)
+        self.datatype_errors.update(result.datatype_errors)
+
+        if not (result.missing_required or result.missing_recommended or
+                result.datatype_errors):
+            return
+        self.failed_records += 1
+        self.log_record(index, result)
+        if settings.VALIDATION_FAILURE_TABLE:
+            self.add_failures(result, key_hash)
+
+    def log_record(self, index, result):
+        """Log the fields of a record that failed validation, at debug level
+        once enough records were logged"""
+        if self.logged_records < settings.VALIDATION_LOG_SAMPLE:
+            self.logged_records += 1
+            log_validation_result(index, result)
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Record %d is missing required fields %s, "
+                         "recommended fields %s and has unexpected data "
+                         "types for %s", index, result.missing_required,
+                         result.missing_recommended, result.datatype_errors)
+
+    def add_failures(self, result, key_hash):
+        """Keep the fields of a record that failed validation for the
+        failure table, storing them in batches"""
+        for category, fields in (('Required', result.missing_required),
+                                 ('Recommended', result.missing_recommended),
+                                 ('datatype', result.datatype_errors)):
+            self.failures.extend(
+                ValidationFailure(stage=self.stage,
+                                  metadata_key_hash=key_hash,
+                                  category=category, field_name=field)
+                for field in fields)
+        if len(self.failures) >= settings.LEDGER_UPDATE_BATCH_SIZE:
+            self.store_failures()
+
+    def store_failures(self):
+        """Store the kept fields of records that failed validation"""
+        if self.failures:
+            ValidationFailure.objects.bulk_create(self.failures)
+            self.failures = []
+
+    def log_summary(self):
+        """Store the remaining failures and log the outcomes of the run"""
+        self.store_failures()
+        logger.info("%s: %d records validated, %d missing required values, "
+                    "%d missing recommended values, %d with unexpected data "
+                    "types", self.stage, self.records, self.invalid_records,
+                    self.incomplete_records, self.mistyped_records)
+        for field, count in self.missing_required.most_common():
+            logger.error("%s: %d records are missing the Required field %s",
+                         self.stage, count, field)
+        for field, count in self.missing_recommended.most_common():
+            logger.warning("%s: %d records are missing the Recommended "
+                           "field %s", self.stage, count, field)
+        for field, count in self.datatype_errors.most_common():
+            logger.warning("%s: %d records do not have the expected "
+                           "datatype for the field %s", self.stage, count,
+                           field)
+        if self.failed_records > self.logged_records:
+            logger.info("%s: fields of %d of the %d records failing "
+                        "validation were logged, the others at debug level",
+                        self.stage, self.logged_records, self.failed_records)
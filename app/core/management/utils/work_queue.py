@@ -0,0 +1,86 @@
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger('dict_config_logger')
+
+
+def get_unclaimed_records(queryset, stage, now):
+    """Function to filter records to the ones no worker of a stage holds an
+    unexpired claim on"""
+    return queryset.filter(Q(claim_expires=None) | Q(claim_expires__lt=now) |
+                           ~Q(claim_stage=stage))
+
+
+def claim_records(queryset, stage, batch_size=None, lease_seconds=None):
+    """Function to claim up to batch_size records of a queryset for a stage,
+    so workers running the stage at the same time process disjoint records.
+    Rows locked by other workers are skipped where the database supports it,
+    and claims are only taken on records no other worker claimed meanwhile.
+    Claims are kept until their lease expires, so records a stage leaves
+    eligible, such as failed loads, are retried by a later run and claims of
+    crashed workers are taken over.
+
+    :param queryset: records eligible for the stage
+    :param stage: name of the stage claiming the records
+    :param batch_size: number of records, defaults to LEDGER_CLAIM_BATCH_SIZE
+    :param lease_seconds: seconds the claim is held for, defaults to
+        LEDGER_CLAIM_LEASE
+    :return: queryset of the claimed records or None when nothing was
+        claimed"""
+    if batch_size is None:
+        batch_size = settings.LEDGER_CLAIM_BATCH_SIZE
+    if lease_seconds is None:
+        lease_seconds = settings.LEDGER_CLAIM_LEASE
+
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    model = queryset.model
+
+    with transaction.atomic():
+        candidates = get_unclaimed_records(queryset, stage, now).order_by(
+            'pk').values_list('pk', flat=True)
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        record_pks = list(candidates[:max(batch_size, 1)])
+        if not record_pks:
+            return None
+        claimed = get_unclaimed_records(
+            model._base_manager.filter(pk__in=record_pks), stage,
+            now).update(claim_stage=stage, claim_token=token,
+                        claim_expires=now + timedelta(seconds=lease_seconds))
+
+    logger.info("Claimed %d records for %s", claimed, stage)
+    return queryset.filter(claim_token=token)
+
+
+def extend_claim(queryset, stage, lease_seconds=None):
+    """Function to renew the claims of a stage on records of a queryset, so
+    records still being processed are not claimed by another worker once
+    the lease taken by claim_records runs out
+
+    :param queryset: claimed records, usually filtered on their claim token
+    :param stage: name of the stage holding the claims
+    :param lease_seconds: seconds the claims are held for from now,
+        defaults to LEDGER_CLAIM_LEASE
+    :return: number of records whose claim was renewed"""
+    if lease_seconds is None:
+        lease_seconds = settings.LEDGER_CLAIM_LEASE
+    return queryset.filter(claim_stage=stage).update(
+        claim_expires=timezone.now() + timedelta(seconds=lease_seconds))
+
+
+def iter_claimed_batches(queryset, stage, batch_size=None,
+                         lease_seconds=None):
+    """Generator function claiming batches of records of a queryset for a
+    stage until no unclaimed records are left"""
+    while True:
+        claimed = claim_records(queryset, stage, batch_size, lease_seconds)
+        if claimed is None:
+            return
+        yield claimed
@@ -1,13 +1,23 @@
 import datetime
 import hashlib
 import logging
+import re
 from distutils.util import strtobool
 
+from core.management.utils.memo_cache import BoundedMemo
 from core.models import XIAConfiguration
 from dateutil.parser import parse
 
 logger = logging.getLogger('dict_config_logger')
 
+# ISO 8601 date with an optional time, fraction of a second and UTC offset
+_iso_date = re.compile(
+    r'(\d{4})-(\d{2})-(\d{2})'
+    r'(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:\.\d{1,6})?)?'
+    r'(?:Z|[+-](\d{2}):?(\d{2}))?)?', re.ASCII)
+
+_date_cache = BoundedMemo('Date check', 'DATE_CACHE_SIZE')
+
 
 def get_publisher_detail():
     """Retrieve publisher from XIA configuration """
@@ -97,21 +107,53 @@ def required_recommended_logs(id_num, category, field):
             " for the field " + field)
 
 
+def is_iso_date(string):
+    """Function to check whether a string is a valid ISO 8601 date, with an
+    optional time and UTC offset. Only strings dateutil also reads as dates
+    pass"""
+    match = _iso_date.fullmatch(string)
+    if not match:
+        return False
+    year, month, day, hour, minute, second, offset_hours, offset_minutes = \
+        match.groups()
+    try:
+        datetime.datetime(int(year), int(month), int(day), int(hour or 0),
+                          int(minute or 0), int(second or 0))
+    except ValueError:
+        return False
+    return offset_hours is None or (int(offset_hours) < 24 and
+                                    int(offset_minutes) < 60)
+
+
+def clear_date_cache():
+    """Function to empty the in memory cache of date checks"""
+    _date_cache.clear()
+
+
 def is_date(string, fuzzy=False):
     """
-    Return whether the string can be interpreted as a date.
+    Return whether the string can be interpreted as a date. ISO 8601 dates
+    are checked without dateutil, and the results of the last
+    DATE_CACHE_SIZE strings are kept in memory.
 
     :param string: str, string to check for date
     :param fuzzy: bool, ignore unknown tokens in string if True
     """
-    if isinstance(string, str):
-        try:
-            parse(string, fuzzy=fuzzy)
-            return True
+    if not isinstance(string, str):
+        return False
+    if is_iso_date(string):
+        return True
 
-        except ValueError:
-            return False
-    else:
+    return _date_cache.memoize((string, fuzzy), is_parsed_date, string,
+                               fuzzy)
+
+
+def is_parsed_date(string, fuzzy=False):
+    """Function to check whether dateutil can parse a string as a date"""
+    try:
+        parse(string, fuzzy=fuzzy)
+        return True
+    except (ValueError, OverflowError):
         return False
 
 
@@ -1,6 +1,6 @@
 import logging
 
-import requests
+from core.management.utils import http_client
 from core.models import XISConfiguration
 from requests.auth import AuthBase
 
@@ -21,9 +21,9 @@ def posting_metadata_ledger_to_xis(renamed_data):
             XIA load_target_metadata() """
     headers = {'Content-Type': 'application/json'}
 
-    xis_response = requests.post(url=get_xis_metadata_api_endpoint(),
-                                 data=renamed_data, headers=headers,
-                                 auth=TokenAuth())
+    xis_response = http_client.post(url=get_xis_metadata_api_endpoint(),
+                                    data=renamed_data, headers=headers,
+                                    auth=TokenAuth())
     return xis_response
 
 
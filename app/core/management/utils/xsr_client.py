@@ -1,19 +1,40 @@
+import functools
 import hashlib
+import itertools
 import json
 import logging
+import math
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-import html2text
-import pandas as pd
 import requests
-from bs4 import BeautifulSoup
-from core.management.utils.eccr_client import get_eccr_uuid
-from core.management.utils.xia_internal import (dict_flatten, get_key_dict,
+from core.management.utils import http_client
+from core.management.utils.checkpoint import (get_checkpoint_start_pages,
+                                              record_checkpoint_page)
+from core.management.utils.eccr_client import get_eccr_uuid, get_eccr_uuids
+from core.management.utils.html_converter import contains_html, html_to_text
+from core.management.utils.response_cache import (get_cached_response,
+                                                  get_conditional_headers,
+                                                  store_cached_response)
+from core.management.utils.xia_internal import (convert_date_to_isoformat,
+                                                dict_flatten, get_key_dict,
                                                 traverse_dict_with_key_list)
+from django.conf import settings
+from django.db import connection
 
 logger = logging.getLogger('dict_config_logger')
 
 
+class XSRResponse(namedtuple('XSRResponse', ['status_code', 'text',
+                                             'response'])):
+    """Status code and body of an XSR response along with the response. The
+    body of a 304 response to a conditional request is the cached body"""
+
+    __slots__ = ()
+
+
 def get_xsr_api_endpoint(xsr_obj, endpoint):
     """Setting API endpoint from XIA and XIS communication """
     logger.debug("Retrieve xsr_api_endpoint from XSR configuration")
@@ -21,8 +42,10 @@ def get_xsr_api_endpoint(xsr_obj, endpoint):
     return xsr_endpoint, xsr_obj.token
 
 
-def get_xsr_api_response(xsr_obj, endpoint):
-    """Function to get api response from xsr endpoint"""
+def get_xsr_api_response(xsr_obj, endpoint, conditional=False):
+    """Function to get api response from xsr endpoint as an XSRResponse.
+    Conditional requests send the validators of the cached response for the
+    endpoint, and a 304 response carries the cached body"""
     # url of rss feed
 
     xsr_data, token = get_xsr_api_endpoint(xsr_obj, endpoint)
@@ -30,14 +53,41 @@ def get_xsr_api_response(xsr_obj, endpoint):
     url = xsr_data
     headers = {"Authorization-Key": token}
 
+    cached = None
+    # archived responses always carry the full body so runs are comparable
+    if conditional and settings.XSR_CONDITIONAL_REQUESTS and \
+            not settings.RESPONSE_ARCHIVE_MODE:
+        cached = get_cached_response(url)
+        if cached:
+            headers.update(get_conditional_headers(cached))
+
     # creating HTTP response object from given url
     try:
-        resp = requests.get(url, headers=headers)
+        resp = http_client.get(url, headers=headers)
     except requests.exceptions.RequestException as e:
         logger.error(e)
+        logger.error("Extraction can continue from the last stored page "
+                     "with extract_source_metadata --resume")
         raise SystemExit('Exiting! Can not make connection with XSR.')
 
-    return resp
+    if resp.status_code == 304 and cached:
+        return XSRResponse(resp.status_code, cached['text'], resp)
+    return XSRResponse(resp.status_code, resp.text, resp)
+
+
+def save_xsr_response(xsr_obj, endpoint, resp):
+    """Function to cache the validators and body of an XSRResponse"""
+    if settings.XSR_CONDITIONAL_REQUESTS:
+        url, _ = get_xsr_api_endpoint(xsr_obj, endpoint)
+        store_cached_response(url, resp.response)
+
+
+def complete_search_page(xsr_obj, endpoint, resp, code, page, last_page):
+    """Function to cache a page of search results for a CWR code once it
+    has been stored and record it in the extraction checkpoint"""
+    if resp is not None:
+        save_xsr_response(xsr_obj, endpoint, resp)
+    record_checkpoint_page(xsr_obj, code, page, last_page)
 
 
 # Function to convert
@@ -62,14 +112,13 @@ def custom_jobs_edits(source_data):
                     list_to_string(data["MatchedObjectDescriptor"][key])
 
 
-def extract_source(xsr_obj):
-    """function to parse xml xsr data and convert to dictionary"""
-
-    page = 1
-
-    resp = get_xsr_api_response(xsr_obj, "/api/codelist/cyberworkroles")
+def get_cwr_code_list(xsr_obj):
+    """Function to retrieve the list of cyber work role codes from XSR"""
+    endpoint = "/api/codelist/cyberworkroles"
+    resp = get_xsr_api_response(xsr_obj, endpoint, conditional=True)
 
     cwr_dict = json.loads(resp.text)
+    save_xsr_response(xsr_obj, endpoint, resp)
 
     cwr_code = cwr_dict["CodeList"][0]["ValidValue"]
     cwr_list = []
@@ -77,51 +126,315 @@ def extract_source(xsr_obj):
     for data in cwr_code:
         cwr_list.append(data["Code"])
 
-    cwr_len = len(cwr_list)
-    source_df_list = []
-
-    for code in cwr_list:
-        endpoint = '/api/Search?cwr=' + code
-        resp_code = get_xsr_api_response(xsr_obj , endpoint)
-
-        if resp.status_code == 200:
-            source_data_dict = json.loads(resp_code.text)
-
-            logger.info("Retrieving data from source page " + str(page))
-
-            source_data = source_data_dict["SearchResult"]["SearchResultItems"]
-
-            source_df = pd.DataFrame(source_data)
-
+    return cwr_list
+
+
+def get_number_of_pages(search_result):
+    """Function to find the number of result pages for a search result"""
+    user_area = search_result.get("UserArea") or {}
+    if user_area.get("NumberOfPages"):
+        return int(user_area["NumberOfPages"])
+    # fall back to the total result count when the page count is missing
+    if search_result.get("SearchResultCountAll"):
+        return math.ceil(int(search_result["SearchResultCountAll"]) /
+                         settings.XSR_RESULTS_PER_PAGE)
+    return 1
+
+
+def get_code_search_pages(xsr_obj, code, start_page=1):
+    """Generator function to retrieve the search results for a CWR code one
+    page at a time, starting from start_page. For each page it yields the
+    items of the page (None when the page is unchanged since it was last
+    cached), the time taken to retrieve it and a function caching the page
+    and recording the checkpoint once it has been stored"""
+    page = start_page
+
+    while True:
+        start_time = time.perf_counter()
+        endpoint = '/api/Search?cwr=' + code + '&Page=' + str(page) + \
+            '&ResultsPerPage=' + str(settings.XSR_RESULTS_PER_PAGE)
+        resp_code = get_xsr_api_response(xsr_obj, endpoint,
+                                         conditional=True)
+
+        if resp_code.status_code not in (200, 304):
+            logger.error("Retrieving page " + str(page) + " for code " +
+                         code + " failed with status " +
+                         str(resp_code.status_code))
+            return
+
+        search_result = json.loads(resp_code.text)["SearchResult"]
+        source_data = search_result.get("SearchResultItems") or []
+
+        last_page = not source_data or \
+            page >= get_number_of_pages(search_result)
+
+        if resp_code.status_code == 304:
+            logger.info("Page " + str(page) + " for code " + code +
+                        " is unchanged")
+            yield None, time.perf_counter() - start_time, \
+                functools.partial(complete_search_page, xsr_obj, endpoint,
+                                  None, code, page, last_page)
+        else:
+            yield source_data, time.perf_counter() - start_time, \
+                functools.partial(complete_search_page, xsr_obj, endpoint,
+                                  resp_code, code, page, last_page)
+
+        if last_page:
+            return
+        page = page + 1
+
+
+def is_float_column(values):
+    """Function to check whether a dataframe would store a column of top
+    level values as floats, which it does for numbers mixed with floats or
+    missing values"""
+    has_number = False
+    has_float_or_null = False
+    for value in values:
+        if value is None:
+            has_float_or_null = True
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            return False
+        elif isinstance(value, float):
+            has_number = True
+            has_float_or_null = True
+        elif -2 ** 63 <= value < 2 ** 64:
+            has_number = True
+        else:
+            return False
+    return has_number and has_float_or_null
+
+
+def source_page_to_records(source_data):
+    """Function to align a page of search results to the columns of a
+    dataframe of the page. Every record gets every column in the order they
+    are first seen, missing and null values become empty strings and
+    numbers in float columns become floats"""
+    columns = list(dict.fromkeys(
+        column for item in source_data for column in item))
+    float_columns = {column for column in columns if is_float_column(
+        [item.get(column) for item in source_data])}
+
+    source_records = []
+    for item in source_data:
+        record = {}
+        for column in columns:
+            value = item.get(column)
+            if value is None or (isinstance(value, float) and
+                                 math.isnan(value)):
+                value = ''
+            elif column in float_columns:
+                value = float(value)
+            record[column] = value
+        source_records.append(record)
+    return source_records
+
+
+def code_page_to_records(source_data, code, eccr_uuid):
+    """Function to convert a page of search results for a CWR code to a
+    list of records"""
+    source_records = source_page_to_records(source_data)
+
+    for record in source_records:
+        record["code"] = code
+        if eccr_uuid:
+            record["eccr_uuid"] = str(eccr_uuid)
+        else:
+            record["eccr_uuid"] = ''
+    return source_records
+
+
+def iter_code_source(xsr_obj, code, eccr_uuids=None, start_page=1):
+    """Generator function to retrieve XSR data for a CWR code one page at a
+    time, starting from start_page. For each page it yields a list of
+    records (None for unchanged pages), the time taken to retrieve it and a
+    function caching the page and recording the checkpoint once it has been
+    stored. The ECCR UUID is read from eccr_uuids when the code was resolved
+    in advance, otherwise it is looked up when a page changed"""
+    eccr_uuid = None
+    eccr_resolved = False
+    if eccr_uuids is not None and code in eccr_uuids:
+        eccr_uuid = eccr_uuids[code]
+        eccr_resolved = True
+
+    for source_data, latency, complete_page in \
+            get_code_search_pages(xsr_obj, code, start_page):
+        if source_data is None:
+            yield None, latency, complete_page
+            continue
+        if not eccr_resolved:
+            start_time = time.perf_counter()
             eccr_uuid = get_eccr_uuid(code)
-            source_df["code"] = code
-            if eccr_uuid:
-                source_df["eccr_uuid"] = str(eccr_uuid)
-            else:
-                source_df["eccr_uuid"] = eccr_uuid
-
-            logger.info("Retrieving data from source page " + str(page))
-            source_df_list.append(source_df)
-
-            if page >= cwr_len:
-                source_df_final = pd.concat(source_df_list).reset_index(
-                    drop=True)
-                logger.info("Completed retrieving data from source")
-                return source_df_final
-            page = page + 1
-
-
-def read_source_file(xsr_obj):
-    """sending source data in dataframe format"""
+            eccr_resolved = True
+            latency += time.perf_counter() - start_time
+        yield code_page_to_records(source_data, code, eccr_uuid), \
+            latency, complete_page
+
+
+def get_start_page(code, start_pages=None):
+    """Function to find the page extraction of a CWR code starts from"""
+    if start_pages is None:
+        return 1
+    return start_pages.get(code, 1)
+
+
+def extract_code_source(xsr_obj, code, eccr_uuids=None, start_pages=None):
+    """Function to retrieve every page of XSR data for a CWR code as a list
+    of record list (None for unchanged pages) and completion function pairs
+    along with the time taken to retrieve them"""
+    source_page_list = []
+    latency = 0
+
+    for source_records, page_latency, complete_page in iter_code_source(
+            xsr_obj, code, eccr_uuids, get_start_page(code, start_pages)):
+        latency += page_latency
+        source_page_list.append((source_records, complete_page))
+
+    log_code_source(code, latency, sum(
+        source_records is not None for source_records, _ in
+        source_page_list))
+    return source_page_list, latency
+
+
+def log_code_source(code, latency, changed_pages):
+    """Function to log the time taken to retrieve a CWR code"""
+    if changed_pages:
+        logger.info("Retrieved data for code %s in %.3f seconds", code,
+                    latency)
+    else:
+        logger.info("No changed data for code %s, checked in %.3f seconds",
+                    code, latency)
+
+
+def extract_code_source_in_thread(xsr_obj, code, eccr_uuids=None,
+                                  start_pages=None):
+    """Function to retrieve XSR data for a CWR code from a worker thread and
+    release the thread's database connection afterwards"""
+    try:
+        return extract_code_source(xsr_obj, code, eccr_uuids, start_pages)
+    finally:
+        connection.close()
+
+
+def extract_codes_concurrently(xsr_obj, cwr_list, max_workers,
+                               max_in_flight, eccr_uuids=None,
+                               start_pages=None):
+    """Generator function to retrieve XSR data for CWR codes using a pool of
+    workers, keeping at most max_in_flight codes pending at a time. Results
+    are yielded in the same order as cwr_list"""
+    codes = iter(cwr_list)
+    in_flight = deque()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for code in itertools.islice(codes, max_in_flight):
+            in_flight.append(executor.submit(extract_code_source_in_thread,
+                                             xsr_obj, code, eccr_uuids,
+                                             start_pages))
+
+        while in_flight:
+            result = in_flight.popleft().result()
+            # keep the workers busy while the caller handles this result
+            for code in itertools.islice(codes, 1):
+                in_flight.append(executor.submit(
+                    extract_code_source_in_thread, xsr_obj, code,
+                    eccr_uuids, start_pages))
+            yield result
+
+
+def iter_codes_serially(xsr_obj, cwr_list, latencies, eccr_uuids=None,
+                        start_pages=None):
+    """Generator function to retrieve XSR data for CWR codes one page at a
+    time, recording the time taken for each code in latencies"""
+    for code in cwr_list:
+        latency = 0
+        changed_pages = 0
+        for source_records, page_latency, complete_page in iter_code_source(
+                xsr_obj, code, eccr_uuids, get_start_page(code, start_pages)):
+            latency += page_latency
+            if source_records is not None:
+                changed_pages += 1
+                yield source_records
+            # the page has been stored once the caller asks for more
+            complete_page()
+        log_code_source(code, latency, changed_pages)
+        latencies.append(latency)
+
+
+def iter_codes_concurrently(xsr_obj, cwr_list, latencies, max_workers,
+                            max_in_flight, eccr_uuids=None, start_pages=None):
+    """Generator function to retrieve XSR data for CWR codes using a pool of
+    workers, recording the time taken for each code in latencies"""
+    logger.info("Retrieving data for %d codes using %d workers",
+                len(cwr_list), max_workers)
+    for source_page_list, latency in extract_codes_concurrently(
+            xsr_obj, cwr_list, max_workers, max_in_flight, eccr_uuids,
+            start_pages):
+        latencies.append(latency)
+        for source_records, complete_page in source_page_list:
+            if source_records is not None:
+                yield source_records
+            # the page has been stored once the caller asks for more
+            complete_page()
+
+
+def log_code_latencies(cwr_list, latencies, elapsed):
+    """Function to log a summary of per code retrieval latency"""
+    if not latencies:
+        return
+    slowest = max(range(len(latencies)), key=latencies.__getitem__)
+    logger.info("Retrieved %d codes in %.3f seconds (total request time "
+                "%.3f seconds, slowest code %s at %.3f seconds)",
+                len(latencies), elapsed, sum(latencies),
+                cwr_list[slowest], latencies[slowest])
+
+
+def extract_source(xsr_obj, max_workers=None, max_in_flight=None,
+                   resume=False):
+    """Generator function to retrieve XSR data for every CWR code, yielding
+    a list of records for each page of search results. When resuming, codes
+    and pages stored by an earlier run within the freshness window are not
+    retrieved again"""
+    if max_workers is None:
+        max_workers = settings.XSR_MAX_WORKERS
+    if max_in_flight is None:
+        max_in_flight = settings.XSR_MAX_IN_FLIGHT
+    max_in_flight = max(max_in_flight, max_workers, 1)
+
+    start_time = time.perf_counter()
+    latencies = []
+
+    cwr_list = get_cwr_code_list(xsr_obj)
+
+    start_pages = None
+    if resume:
+        start_pages = get_checkpoint_start_pages(xsr_obj, cwr_list)
+        cwr_list = [code for code in cwr_list if code in start_pages]
+
+    # resolve every code's ECCR UUID before retrieving any search results
+    eccr_uuids = get_eccr_uuids(cwr_list)
+
+    if max_workers > 1:
+        source_pages = iter_codes_concurrently(xsr_obj, cwr_list, latencies,
+                                               max_workers, max_in_flight,
+                                               eccr_uuids, start_pages)
+    else:
+        source_pages = iter_codes_serially(xsr_obj, cwr_list, latencies,
+                                           eccr_uuids, start_pages)
+
+    for page, source_records in enumerate(source_pages, start=1):
+        logger.info("Retrieving data from source page " + str(page))
+        yield source_records
+
+    log_code_latencies(cwr_list, latencies, time.perf_counter() - start_time)
+    logger.info("Completed retrieving data from source")
+
+
+def read_source_file(xsr_obj, resume=False):
+    """Generator function sending source data as a list of records one page
+    at a time, using the number of workers configured for the XSR"""
     logger.info("Retrieving data from XSR")
-    # load rss from web to convert to xml
-    xsr_items = extract_source(xsr_obj)
-    # convert xsr dictionary list to Dataframe
-    source_df = pd.DataFrame(xsr_items)
-    logger.info("Changing null values to None for source dataframe")
-    std_source_df = source_df.where(pd.notnull(source_df),
-                                    None)
-    return [std_source_df]
+    yield from extract_source(xsr_obj, max_workers=xsr_obj.max_workers,
+                              resume=resume)
 
 
 def get_source_metadata_key_value(data_dict):
@@ -183,7 +496,7 @@ def convert_html(element, target_data_dict):
     check_key_dict = traverse_dict_with_key_list(check_key_dict, key_list)
     if check_key_dict and key_list[-1] in check_key_dict:
         check_key_dict[key_list[-1]] = \
-            html2text.html2text(check_key_dict[key_list[-1]])
+            html_to_text(check_key_dict[key_list[-1]])
 
 
 def find_html(data_dict):
@@ -191,6 +504,64 @@ def find_html(data_dict):
     data_flattened = dict_flatten(data_dict, [])
 
     for element in data_flattened.keys():
-        if data_flattened[element] and bool(BeautifulSoup(str(data_flattened[element]),"html.parser").find()):
+        if data_flattened[element] and contains_html(
+                str(data_flattened[element])):
             convert_html(element, data_dict)
     return data_dict
+
+
+def is_date_path(path):
+    """Function to check whether a flattened field name holds a date"""
+    path_lower = path.lower()
+    return path_lower.find("date") != -1 or path_lower.find("time") != -1
+
+
+def has_dotted_key(data_dict):
+    """Function to check whether any field name of a record contains a
+    dot"""
+    for key, value in data_dict.items():
+        if "." in key or (isinstance(value, dict) and has_dotted_key(value)):
+            return True
+    return False
+
+
+def copy_json_value(value):
+    """Function to copy a value the way a JSON round trip would"""
+    if isinstance(value, dict):
+        return {str(key): copy_json_value(item)
+                for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [copy_json_value(item) for item in value]
+    return convert_date_to_isoformat(value)
+
+
+def normalize_source_value(value, path):
+    """Function to normalize a field of a record given its flattened field
+    name"""
+    if isinstance(value, dict):
+        return {key: normalize_source_value(item, path + "." + key)
+                for key, item in value.items()}
+    # convert int to date
+    if isinstance(value, int) and is_date_path(path):
+        value = datetime.fromtimestamp(value)
+    # convert HTML to text, only strings and lists can contain tags
+    if isinstance(value, str):
+        if contains_html(value):
+            value = html_to_text(value)
+    elif isinstance(value, list) and contains_html(str(value)):
+        value = html_to_text(value)
+    # convert date to iso format
+    return copy_json_value(value)
+
+
+def normalize_source_record(data_dict):
+    """Function to convert int to date, HTML to text and date to iso format
+    in a single pass over a record. The result is a new record matching
+    find_dates and find_html followed by a JSON round trip"""
+    if has_dotted_key(data_dict):
+        # flattened field names of dotted keys are ambiguous, so convert
+        # these records the way find_dates and find_html do
+        return json.loads(json.dumps(find_html(find_dates(data_dict)),
+                                     default=convert_date_to_isoformat))
+    return {key: normalize_source_value(value, key)
+            for key, value in data_dict.items()}
@@ -1,6 +1,6 @@
 import logging
 
-import requests
+from core.management.utils import http_client
 from core.management.utils.xia_internal import dict_flatten
 from core.models import XIAConfiguration
 
@@ -26,14 +26,14 @@ def read_json_data(source_schema_ref, target_schema_ref=None):
             request_path += '&sourceIRI=' + source_schema_ref
         else:
             request_path += '&sourceName=' + source_schema_ref
-        schema = requests.get(request_path)
+        schema = http_client.get(request_path)
         json_content = schema.json()['schema_mapping']
     else:
         if(source_schema_ref.startswith('xss:')):
             request_path += 'schemas/?iri=' + source_schema_ref
         else:
             request_path += 'schemas/?name=' + source_schema_ref
-        schema = requests.get(request_path)
+        schema = http_client.get(request_path)
         json_content = schema.json()['schema']
     return json_content
 
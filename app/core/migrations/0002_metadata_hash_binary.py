@@ -0,0 +1,156 @@
+import datetime
+import hashlib
+import json
+
+import core.models
+from django.db import migrations, models
+
+# Number of ledger records rehashed per query
+REHASH_BATCH_SIZE = 1000
+
+# Number of bytes of the binary hashes, as created when this migration
+# was written
+METADATA_HASH_SIZE = 32
+
+
+def canonicalize_value(value):
+    """Convert a value so equal metadata serializes the same way, writing
+    floats holding whole numbers as integers"""
+    if isinstance(value, dict):
+        return {str(key): canonicalize_value(item)
+                for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonicalize_value(item) for item in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def convert_to_canonical_json(value):
+    """Serialize values JSON does not support"""
+    if isinstance(value, (datetime.datetime, datetime.date,
+                          datetime.time)):
+        return value.isoformat()
+    raise TypeError("Object of type " + type(value).__name__ +
+                    " is not JSON serializable")
+
+
+def get_metadata_hash(data):
+    """Hash the canonical JSON of metadata with blake2b. This is a copy of
+    the hashing of metadata_hash when this migration was written, so later
+    changes to it or to METADATA_HASH_ALGORITHM do not change what the
+    migration computes"""
+    encoded = json.dumps(canonicalize_value(data), sort_keys=True,
+                         separators=(',', ':'), ensure_ascii=False,
+                         default=convert_to_canonical_json).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=METADATA_HASH_SIZE).digest()
+
+
+def iter_ledger_batches(MetadataLedger, *fields):
+    """Retrieve the ledger records in primary key order one batch at a
+    time"""
+    last_pk = None
+    while True:
+        batch = MetadataLedger.objects.only('pk', *fields).order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        batch = list(batch[:REHASH_BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1].pk
+
+
+def rehash_metadata(apps, schema_editor):
+    """Hash the canonical JSON of stored metadata into the binary hash
+    fields, leaving target hashes empty for records not transformed yet.
+    Stored source metadata has already been sanitized while extraction
+    hashes it before sanitizing, so records whose text sanitizing changed
+    look changed once on the next extraction"""
+    MetadataLedger = apps.get_model('core', 'MetadataLedger')
+    for batch in iter_ledger_batches(MetadataLedger, 'source_metadata',
+                                     'target_metadata',
+                                     'target_metadata_hash'):
+        for record in batch:
+            record.source_metadata_digest = get_metadata_hash(
+                record.source_metadata)
+            if record.target_metadata_hash:
+                record.target_metadata_digest = get_metadata_hash(
+                    record.target_metadata)
+        MetadataLedger.objects.bulk_update(
+            batch, ['source_metadata_digest', 'target_metadata_digest'])
+
+
+def rehash_metadata_to_hex(apps, schema_editor):
+    """Hash stored metadata the way hashes were created before they were
+    stored as binary"""
+    MetadataLedger = apps.get_model('core', 'MetadataLedger')
+    for batch in iter_ledger_batches(MetadataLedger, 'source_metadata',
+                                     'target_metadata',
+                                     'target_metadata_digest'):
+        for record in batch:
+            record.source_metadata_hash = hashlib.sha512(
+                str(record.source_metadata).encode('utf-8')).hexdigest()
+            if record.target_metadata_digest:
+                record.target_metadata_hash = hashlib.sha512(
+                    str(record.target_metadata).encode('utf-8')).hexdigest()
+        MetadataLedger.objects.bulk_update(
+            batch, ['source_metadata_hash', 'target_metadata_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metadataledger',
+            name='source_metadata_digest',
+            field=core.models.FixedBinaryField(
+                max_length=METADATA_HASH_SIZE, null=True),
+        ),
+        migrations.AddField(
+            model_name='metadataledger',
+            name='target_metadata_digest',
+            field=core.models.FixedBinaryField(
+                blank=True, max_length=METADATA_HASH_SIZE, null=True),
+        ),
+        migrations.RunPython(rehash_metadata, rehash_metadata_to_hex),
+        # defaults let the hex hash fields be added back when reversing
+        migrations.AlterField(
+            model_name='metadataledger',
+            name='source_metadata_hash',
+            field=models.CharField(default='', max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='metadataledger',
+            name='target_metadata_hash',
+            field=models.CharField(default='', max_length=200),
+        ),
+        migrations.RemoveField(
+            model_name='metadataledger',
+            name='source_metadata_hash',
+        ),
+        migrations.RemoveField(
+            model_name='metadataledger',
+            name='target_metadata_hash',
+        ),
+        migrations.RenameField(
+            model_name='metadataledger',
+            old_name='source_metadata_digest',
+            new_name='source_metadata_hash',
+        ),
+        migrations.RenameField(
+            model_name='metadataledger',
+            old_name='target_metadata_digest',
+            new_name='target_metadata_hash',
+        ),
+        migrations.AlterField(
+            model_name='metadataledger',
+            name='source_metadata_hash',
+            field=core.models.FixedBinaryField(
+                max_length=METADATA_HASH_SIZE),
+        ),
+    ]
@@ -0,0 +1,18 @@
+import core.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_metadata_hash_binary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metadataledger',
+            name='source_metadata_raw_hash',
+            field=core.models.FixedBinaryField(
+                blank=True, max_length=32, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_metadataledger_source_metadata_raw_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractionCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('code', models.CharField(max_length=200)),
+                ('page', models.IntegerField(default=0)),
+                ('started_date', models.DateTimeField(blank=True, null=True)),
+                ('completed_date', models.DateTimeField(blank=True, null=True)),
+                ('xsr_configuration', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.xsrconfiguration')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='extractioncheckpoint',
+            constraint=models.UniqueConstraint(fields=('xsr_configuration', 'code'), name='unique_extraction_checkpoint'),
+        ),
+    ]
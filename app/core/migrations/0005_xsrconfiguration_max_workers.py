@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_extractioncheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='xsrconfiguration',
+            name='max_workers',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Enter the number of workers retrieving CWR codes from this XSR concurrently, or leave blank to use XSR_MAX_WORKERS', null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_xsrconfiguration_max_workers'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='metadataledger',
+            index=models.Index(fields=['source_metadata_key_hash', 'record_lifecycle_status'], name='ledger_source_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='metadataledger',
+            index=models.Index(fields=['target_metadata_key_hash', 'record_lifecycle_status'], name='ledger_target_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='metadataledger',
+            index=models.Index(fields=['record_lifecycle_status', 'source_metadata_validation_status'], name='ledger_source_valid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='metadataledger',
+            index=models.Index(fields=['record_lifecycle_status', 'source_metadata_transformation_date'], name='ledger_transform_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='metadataledger',
+            index=models.Index(fields=['record_lifecycle_status', 'target_metadata_validation_status'], name='ledger_target_valid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='metadataledger',
+            index=models.Index(fields=['target_metadata_transmission_status', 'record_lifecycle_status'], name='ledger_transmission_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:44
+
+import core.management.utils.record_uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_metadataledger_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='metadataledger',
+            name='metadata_record_uuid',
+            field=models.UUIDField(default=core.management.utils.record_uuid.get_record_uuid, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_metadataledger_record_uuid_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='metadataledger',
+            index=models.Index(fields=['record_lifecycle_status', 'metadata_record_inactivation_date'], name='ledger_inactivation_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_metadataledger_inactivation_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metadataledger',
+            name='claim_expires',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='metadataledger',
+            name='claim_stage',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='metadataledger',
+            name='claim_token',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='metadataledger',
+            index=models.Index(fields=['claim_token'], name='ledger_claim_idx'),
+        ),
+    ]
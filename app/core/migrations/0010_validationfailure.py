@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:58
+
+from django.db import migrations, models
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_metadataledger_claims'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValidationFailure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('stage', models.CharField(choices=[('validate_source', 'Source'), ('validate_target', 'Target')], max_length=20)),
+                ('metadata_key_hash', models.CharField(max_length=200)),
+                ('category', models.CharField(choices=[('Required', 'Required'), ('Recommended', 'Recommended'), ('datatype', 'Data type')], max_length=20)),
+                ('field_name', models.CharField(max_length=255)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['stage', 'field_name'], name='validation_failure_field_idx'), models.Index(fields=['metadata_key_hash'], name='validation_failure_key_idx')],
+            },
+        ),
+    ]
@@ -1,9 +1,10 @@
 import logging
-import uuid
 
-import requests
-from core.management.utils.model_help import (bleach_data_to_json,
-                                              confusable_homoglyphs_check)
+from core.management.utils import http_client
+from core.management.utils.metadata_hash import METADATA_HASH_SIZE
+from core.management.utils.model_help import (sanitize_metadata,
+                                              sanitize_metadata_batch)
+from core.management.utils.record_uuid import get_record_uuid
 from django.core.validators import RegexValidator
 from django.db import models
 from django.forms import ValidationError
@@ -23,6 +24,15 @@ rcheck = (r'(?!(\A( \x09\x0A\x0D\x20-\x7E # ASCII '
           r'| \xF4\x80-\x8F{2} # plane 16 )*\Z))')
 
 
+class FixedBinaryField(models.BinaryField):
+    """Binary field stored in a fixed width column on MySQL"""
+
+    def db_type(self, connection):
+        if connection.vendor == 'mysql':
+            return 'binary(%d)' % self.max_length
+        return super(FixedBinaryField, self).db_type(connection)
+
+
 class XSRConfiguration(models.Model):
     """Model for XSR Configuration """
 
@@ -34,6 +44,13 @@ class XSRConfiguration(models.Model):
         help_text='Enter the XSR Token',
         max_length=200
     )
+    max_workers = models.PositiveSmallIntegerField(
+        help_text='Enter the number of workers retrieving CWR codes from '
+                  'this XSR concurrently, or leave blank to use '
+                  'XSR_MAX_WORKERS',
+        blank=True,
+        null=True
+    )
 
 
 class ECCRConfiguration(models.Model):
@@ -86,7 +103,7 @@ class XIAConfiguration(TimeStampedModel):
         else:
             request_path += 'schemas/?name=' + self.target_metadata_schema
             conf += 'mappings/?targetName=' + self.target_metadata_schema
-        schema = requests.get(request_path)
+        schema = http_client.get(request_path)
         target = schema.json()['schema']
 
         # Read json file and store as a dictionary for processing
@@ -95,7 +112,7 @@ class XIAConfiguration(TimeStampedModel):
             request_path += '&sourceIRI=' + self.source_metadata_schema
         else:
             request_path += '&sourceName=' + self.source_metadata_schema
-        schema = requests.get(request_path)
+        schema = http_client.get(request_path)
         mapping = schema.json()['schema_mapping']
 
         return target, mapping
@@ -174,6 +191,31 @@ class XISConfiguration(TimeStampedModel):
         return super(XISConfiguration, self).save(*args, **kwargs)
 
 
+class MetadataLedgerQuerySet(models.QuerySet):
+    """QuerySet sanitizing source metadata written by bulk operations, which
+    skip MetadataLedger.save"""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        sanitized = sanitize_metadata_batch(
+            [obj.source_metadata for obj in objs])
+        for obj, (source_metadata, is_safe) in zip(objs, sanitized):
+            obj.apply_sanitized_source_metadata(source_metadata, is_safe)
+        return super(MetadataLedgerQuerySet, self).bulk_create(
+            objs, *args, **kwargs)
+
+    def update(self, **kwargs):
+        # expressions such as the Case of bulk_update are written as they are
+        if isinstance(kwargs.get('source_metadata'), dict):
+            kwargs['source_metadata'], is_safe = \
+                sanitize_metadata(kwargs['source_metadata'])
+            if not is_safe:
+                # If data check failed setting metadata to inactive
+                kwargs['record_lifecycle_status'] = 'Inactive'
+                kwargs['metadata_record_inactivation_date'] = timezone.now()
+        return super(MetadataLedgerQuerySet, self).update(**kwargs)
+
+
 class MetadataLedger(TimeStampedModel):
     """Model for MetadataLedger """
 
@@ -185,7 +227,8 @@ class MetadataLedger(TimeStampedModel):
     metadata_record_inactivation_date = models.DateTimeField(blank=True,
                                                              null=True)
     metadata_record_uuid = models.UUIDField(primary_key=True,
-                                            default=uuid.uuid4, editable=False)
+                                            default=get_record_uuid,
+                                            editable=False)
     record_lifecycle_status = models.CharField(
         max_length=10, blank=True, choices=RECORD_ACTIVATION_STATUS_CHOICES)
     source_metadata = models.JSONField(blank=True,
@@ -195,8 +238,10 @@ class MetadataLedger(TimeStampedModel):
                                                                   "Format "
                                                                   "Entered")])
     source_metadata_extraction_date = models.DateTimeField(auto_now_add=True)
-    source_metadata_hash = models.CharField(max_length=200)
+    source_metadata_hash = FixedBinaryField(max_length=METADATA_HASH_SIZE)
     source_metadata_key = models.TextField()
+    source_metadata_raw_hash = FixedBinaryField(
+        max_length=METADATA_HASH_SIZE, blank=True, null=True)
     source_metadata_key_hash = models.CharField(max_length=200)
     source_metadata_transformation_date = models.DateTimeField(blank=True,
                                                                null=True)
@@ -205,7 +250,8 @@ class MetadataLedger(TimeStampedModel):
     source_metadata_validation_status = models.CharField(
         max_length=10, blank=True, choices=METADATA_VALIDATION_CHOICES)
     target_metadata = models.JSONField(default=dict)
-    target_metadata_hash = models.CharField(max_length=200)
+    target_metadata_hash = FixedBinaryField(max_length=METADATA_HASH_SIZE,
+                                            blank=True, null=True)
     target_metadata_key = models.TextField()
     target_metadata_key_hash = models.CharField(max_length=200)
     target_metadata_transmission_date = models.DateTimeField(blank=True,
@@ -221,17 +267,56 @@ class MetadataLedger(TimeStampedModel):
         max_length=10, blank=True, choices=METADATA_VALIDATION_CHOICES)
     eccr_uuid = models.TextField(blank=True, null=True)
     code = models.CharField(max_length=200, blank=True, null=True)
-
-    def save(self, *args, **kwargs):
-        source_data = self.source_metadata
-        # Checking for confusable hologlyphs
-        data_checked = confusable_homoglyphs_check(source_data)
-        if not data_checked:
+    claim_stage = models.CharField(max_length=20, blank=True, null=True)
+    claim_token = models.CharField(max_length=32, blank=True, null=True)
+    claim_expires = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        # each stage filters on the lifecycle status of records and either
+        # looks up a key or finds the records waiting for it
+        indexes = [
+            models.Index(fields=['source_metadata_key_hash',
+                                 'record_lifecycle_status'],
+                         name='ledger_source_key_idx'),
+            models.Index(fields=['target_metadata_key_hash',
+                                 'record_lifecycle_status'],
+                         name='ledger_target_key_idx'),
+            models.Index(fields=['record_lifecycle_status',
+                                 'source_metadata_validation_status'],
+                         name='ledger_source_valid_idx'),
+            models.Index(fields=['record_lifecycle_status',
+                                 'source_metadata_transformation_date'],
+                         name='ledger_transform_idx'),
+            models.Index(fields=['record_lifecycle_status',
+                                 'target_metadata_validation_status'],
+                         name='ledger_target_valid_idx'),
+            models.Index(fields=['target_metadata_transmission_status',
+                                 'record_lifecycle_status'],
+                         name='ledger_transmission_idx'),
+            models.Index(fields=['record_lifecycle_status',
+                                 'metadata_record_inactivation_date'],
+                         name='ledger_inactivation_idx'),
+            models.Index(fields=['claim_token'], name='ledger_claim_idx'),
+        ]
+
+    objects = MetadataLedgerQuerySet.as_manager()
+
+    def apply_sanitized_source_metadata(self, source_metadata, is_safe):
+        """Stores cleaned source metadata, setting the record to inactive
+        when it contains confusable homoglyphs"""
+        if not is_safe:
             # If data check failed setting metadata to inactive
             self.record_lifecycle_status = "Inactive"
             self.metadata_record_inactivation_date = timezone.now()
-        # cleaning metadata using bleach
-        self.source_metadata = bleach_data_to_json(source_data)
+        self.source_metadata = source_metadata
+
+    def sanitize_source_metadata(self):
+        """Checks source metadata for confusable homoglyphs and cleans it"""
+        self.apply_sanitized_source_metadata(
+            *sanitize_metadata(self.source_metadata))
+
+    def save(self, *args, **kwargs):
+        self.sanitize_source_metadata()
         return super(MetadataLedger, self).save(*args, **kwargs)
 
 
@@ -258,3 +343,53 @@ class MetadataFieldOverwrite(TimeStampedModel):
 
     def save(self, *args, **kwargs):
         return super(MetadataFieldOverwrite, self).save(*args, **kwargs)
+
+
+class ExtractionCheckpoint(TimeStampedModel):
+    """Model for the extraction progress of a CWR code from an XSR, used to
+    resume an interrupted extraction"""
+
+    xsr_configuration = models.ForeignKey(XSRConfiguration,
+                                          on_delete=models.CASCADE)
+    code = models.CharField(max_length=200)
+    page = models.IntegerField(default=0)
+    started_date = models.DateTimeField(blank=True, null=True)
+    completed_date = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['xsr_configuration', 'code'],
+                                    name='unique_extraction_checkpoint')
+        ]
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f'{self.code} page {self.page}'
+
+
+class ValidationFailure(TimeStampedModel):
+    """Model for a field of a metadata record that failed validation, kept
+    when VALIDATION_FAILURE_TABLE is set"""
+
+    STAGE_CHOICES = [('validate_source', 'Source'),
+                     ('validate_target', 'Target')]
+    CATEGORY_CHOICES = [('Required', 'Required'),
+                        ('Recommended', 'Recommended'),
+                        ('datatype', 'Data type')]
+
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES)
+    metadata_key_hash = models.CharField(max_length=200)
+    category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
+    field_name = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['stage', 'field_name'],
+                         name='validation_failure_field_idx'),
+            models.Index(fields=['metadata_key_hash'],
+                         name='validation_failure_key_idx'),
+        ]
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f'{self.metadata_key_hash} {self.category} {self.field_name}'
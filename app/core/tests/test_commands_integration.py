@@ -1,7 +1,6 @@
 import logging
 from unittest.mock import patch
 
-import pandas as pd
 from core.management.commands.extract_source_metadata import (
     extract_metadata_using_key, store_source_metadata)
 from core.models import MetadataLedger
@@ -47,8 +46,7 @@ class CommandIntegration(TestSetUp):
         """Test for the keys and hash creation and save in
         Metadata_ledger table """
 
-        data = {1: self.source_metadata}
-        input_data = pd.DataFrame.from_dict(data, orient='index')
+        input_data = [dict(self.source_metadata)]
         with patch('core.management.commands.extract_source_metadata'
                    '.add_publisher_to_source',
                    return_value=input_data):
@@ -1,11 +1,17 @@
+import gzip
+import json
 import logging
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch
 
-import pandas as pd
 from core.management.commands.extract_source_metadata import (
-    add_publisher_to_source, extract_metadata_using_key, get_source_metadata)
+    add_publisher_to_source, extract_metadata_using_key, get_source_metadata,
+    store_source_metadata, store_source_metadata_batch)
 from core.management.commands.load_target_metadata import (
-    get_records_to_load_into_xis, post_data_to_xis,
+    get_records_to_load, get_records_to_load_into_xis, post_data_to_xis,
     rename_metadata_ledger_fields)
 from core.management.commands.transform_source_metadata import (
     create_target_metadata_dict, get_metadata_fields_to_overwrite,
@@ -18,8 +24,11 @@ from core.management.commands.validate_source_metadata import (
 from core.management.commands.validate_target_metadata import (
     get_target_metadata_for_validation, update_previous_instance_in_metadata,
     validate_target_using_key)
+from core.management.utils.metadata_hash import get_metadata_hash, get_raw_hash
+from core.management.utils.work_queue import claim_records
+from core.management.utils.xsr_client import normalize_source_record
 from core.models import (MetadataFieldOverwrite, MetadataLedger,
-                         XIAConfiguration, XISConfiguration)
+                         XIAConfiguration, XISConfiguration, XSRConfiguration)
 from ddt import ddt
 from django.core.management import call_command
 from django.db.utils import OperationalError
@@ -59,13 +68,37 @@ class CommandTests(TestSetUp):
         with patch('core.management.commands.extract_source_metadata'
                    '.read_source_file') as read_obj, patch(
             'core.management.commands.extract_source_metadata'
-            '.extract_metadata_using_key', return_value=None) as \
+            '.extract_metadata_using_key', return_value=1) as \
                 mock_extract_obj:
             read_obj.return_value = read_obj
-            read_obj.return_value = [
-                pd.DataFrame.from_dict(self.test_data, orient='index')]
-            get_source_metadata()
+            read_obj.return_value = [[self.test_data]]
+            source_stats_list = get_source_metadata()
             self.assertEqual(mock_extract_obj.call_count, 1)
+            self.assertEqual(source_stats_list[0]['records'], 1)
+            self.assertEqual(source_stats_list[0]['stored'], 1)
+
+    def test_get_source_metadata_isolates_failures(self):
+        """Test a failing XSR does not stop the extraction of other XSRs"""
+        XSRConfiguration.objects.create(xsr_api_endpoint='http://failing',
+                                        token='token')
+
+        def read_source(xsr_obj, resume=False):
+            if xsr_obj.xsr_api_endpoint == 'http://failing':
+                raise SystemExit('Exiting! Can not make connection with '
+                                 'XSR.')
+            return [[self.test_data], [self.test_data]]
+
+        with patch('core.management.commands.extract_source_metadata'
+                   '.read_source_file', side_effect=read_source), \
+                patch('core.management.commands.extract_source_metadata'
+                      '.extract_metadata_using_key', return_value=1):
+            source_stats_list = get_source_metadata(max_sources=2)
+
+        self.assertEqual([source_stats['pages'] for source_stats in
+                          source_stats_list], [2, 0])
+        self.assertIsNone(source_stats_list[0]['error'])
+        self.assertIn('Can not make connection',
+                      source_stats_list[1]['error'])
 
     def test_add_publisher_to_source(self):
         """Test for Add publisher column to source metadata and return
@@ -76,36 +109,215 @@ class CommandTests(TestSetUp):
                       '.XIAConfiguration.objects') as xisCfg:
             xiaConfig = XIAConfiguration(publisher='JKO')
             xisCfg.first.return_value = xiaConfig
-            test_df = pd.DataFrame.from_dict(self.test_data)
-            result = add_publisher_to_source(test_df)
-            key_exist = 'SOURCESYSTEM' in result.columns
-            self.assertTrue(key_exist)
+            result = add_publisher_to_source([dict(self.test_data)])
+            self.assertEqual(result[0]['SOURCESYSTEM'], 'JKO')
 
     def test_extract_metadata_using_key(self):
         """Test to creating key, hash of key & hash of metadata"""
 
-        data = {1: self.source_metadata}
-        data_df = pd.DataFrame.from_dict(data, orient='index')
+        data = [dict(self.source_metadata)]
         with patch(
                 'core.management.commands.extract_source_metadata'
                 '.add_publisher_to_source',
-                return_value=data_df), \
+                return_value=data), \
                 patch(
                     'core.management.commands.extract_source_metadata'
                     '.get_source_metadata_key_value',
                     return_value=None) as mock_get_source, \
                 patch(
                     'core.management.commands.extract_source_metadata'
-                    '.store_source_metadata',
-                    return_value=None) as mock_store_source:
+                    '.get_unchanged_source_keys',
+                    return_value=set()), \
+                patch(
+                    'core.management.commands.extract_source_metadata'
+                    '.store_source_metadata_batch',
+                    return_value=1) as mock_store_source:
             mock_get_source.return_value = mock_get_source
             mock_get_source.exclude.return_value = mock_get_source
             mock_get_source.filter.side_effect = [
                 mock_get_source, mock_get_source]
 
-            extract_metadata_using_key(data_df)
+            extract_metadata_using_key(data)
             self.assertEqual(mock_get_source.call_count, 1)
             self.assertEqual(mock_store_source.call_count, 1)
+            self.assertEqual(len(mock_store_source.call_args[0][0]), 1)
+
+    def test_store_source_metadata_batch(self):
+        """Test a batch of records is stored with one query to read active
+        versions, one to deactivate changed versions and one insert"""
+        changed_metadata = dict(self.source_metadata, code='changed')
+        changed_hash = get_metadata_hash(changed_metadata)
+        store_source_metadata_batch([
+            (self.key_value, self.key_value_hash, self.hash_value,
+             dict(self.source_metadata), None)])
+
+        with self.assertNumQueries(5):
+            # savepoint and release wrap the update and insert
+            created = store_source_metadata_batch([
+                (self.key_value, self.key_value_hash, changed_hash,
+                 changed_metadata, None),
+                ('new_key', 'new_key_hash', self.hash_value,
+                 dict(self.source_metadata), None),
+                ('new_key', 'new_key_hash', self.hash_value,
+                 dict(self.source_metadata), None)])
+        unchanged = store_source_metadata_batch([
+            (self.key_value, self.key_value_hash, changed_hash,
+             changed_metadata, None)])
+
+        self.assertEqual(created, 2)
+        self.assertEqual(unchanged, 0)
+        self.assertEqual(list(MetadataLedger.objects.filter(
+            source_metadata_key_hash=self.key_value_hash).order_by(
+            'record_lifecycle_status').values_list(
+            'record_lifecycle_status', 'code')),
+            [('Active', 'changed'),
+             ('Inactive', self.source_metadata.get('code'))])
+        self.assertTrue(MetadataLedger.objects.get(
+            record_lifecycle_status='Inactive').
+            metadata_record_inactivation_date)
+
+    def test_store_source_metadata_batch_raw_hash(self):
+        """Test an unchanged record extracted from a new raw record keeps
+        its version and remembers the new raw record"""
+        first_raw_hash = get_raw_hash({'record': 'first'})
+        second_raw_hash = get_raw_hash({'record': 'second'})
+        store_source_metadata(self.key_value, self.key_value_hash,
+                              self.hash_value, dict(self.source_metadata),
+                              first_raw_hash)
+
+        created = store_source_metadata_batch([
+            (self.key_value, self.key_value_hash, self.hash_value,
+             dict(self.source_metadata), second_raw_hash)])
+
+        self.assertEqual(created, 0)
+        self.assertEqual(bytes(MetadataLedger.objects.get(
+            source_metadata_key_hash=self.key_value_hash).
+            source_metadata_raw_hash), second_raw_hash)
+
+    def test_extract_metadata_using_key_unchanged(self):
+        """Test records extracted from an unchanged raw record are not
+        normalized or stored again"""
+        source_record = {
+            "MatchedObjectDescriptor": {
+                "PositionID": "1",
+                "QualificationSummary": "<p>Must have experience</p>"},
+            "code": "code", "eccr_uuid": ""}
+        with patch('core.management.commands.extract_source_metadata'
+                   '.get_publisher_detail', return_value='AGENT'), \
+                patch('core.management.commands.extract_source_metadata'
+                      '.normalize_source_record',
+                      side_effect=normalize_source_record) as mock_normalize:
+            extract_metadata_using_key([dict(source_record)])
+            extract_metadata_using_key([dict(source_record)])
+
+            self.assertEqual(mock_normalize.call_count, 1)
+
+            source_record["MatchedObjectDescriptor"] = {
+                "PositionID": "1",
+                "QualificationSummary": "<p>Must have training</p>"}
+            extract_metadata_using_key([dict(source_record)])
+
+            self.assertEqual(mock_normalize.call_count, 2)
+            self.assertEqual(MetadataLedger.objects.filter(
+                record_lifecycle_status='Active').count(), 1)
+            self.assertEqual(MetadataLedger.objects.count(), 2)
+
+    # Test cases for benchmark_source_normalization
+    def test_benchmark_source_normalization(self):
+        """Test both normalization paths give identical metadata"""
+        source_data = {"SearchResult": {"SearchResultItems": [
+            {"MatchedObjectDescriptor": {
+                "PositionID": "1", "PublicationStartDate": 1718050925,
+                "QualificationSummary": "<p>Must have experience</p>"},
+             "RelevanceRank": 1},
+            {"MatchedObjectDescriptor": {"PositionID": "2"},
+             "Extra": None}]}}
+        out = StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as source:
+            json.dump(source_data, source)
+            source.flush()
+            call_command('benchmark_source_normalization', source.name,
+                         '--repeat', '1', stdout=out)
+
+        self.assertIn('Normalized 2 records in 1 pages', out.getvalue())
+        self.assertIn('Normalized records are identical', out.getvalue())
+
+    # Test cases for purge_inactive_metadata
+    def test_purge_inactive_metadata(self):
+        """Test old inactive records are archived in batches and deleted"""
+        for num in range(5):
+            MetadataLedger.objects.create(
+                record_lifecycle_status='Inactive',
+                metadata_record_inactivation_date=timezone.now() -
+                timedelta(days=100 if num < 3 else 1),
+                source_metadata={'num': num},
+                source_metadata_hash=get_metadata_hash({'num': num}),
+                source_metadata_key='key' + str(num),
+                source_metadata_key_hash='key' + str(num))
+        MetadataLedger.objects.create(
+            record_lifecycle_status='Active', source_metadata={'num': 5},
+            source_metadata_hash=get_metadata_hash({'num': 5}),
+            source_metadata_key='key5', source_metadata_key_hash='key5')
+
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as archive_dir:
+            call_command('purge_inactive_metadata', '--days', '30',
+                         '--batch-size', '2', '--dry-run', stdout=out)
+            self.assertEqual(MetadataLedger.objects.count(), 6)
+
+            call_command('purge_inactive_metadata', '--days', '30',
+                         '--batch-size', '2', '--archive-dir', archive_dir,
+                         stdout=out)
+            archive_name, = os.listdir(archive_dir)
+            with gzip.open(os.path.join(archive_dir, archive_name),
+                           'rt') as archive_file:
+                archived = [json.loads(line) for line in archive_file]
+
+        self.assertIn('3 inactive records (', out.getvalue())
+        self.assertIn('3 inactive records purged', out.getvalue())
+        self.assertEqual(sorted(record['source_metadata_key']
+                                for record in archived),
+                         ['key0', 'key1', 'key2'])
+        self.assertEqual(archived[0]['source_metadata_hash'],
+                         get_metadata_hash(
+                             archived[0]['source_metadata']).hex())
+        self.assertEqual(sorted(MetadataLedger.objects.values_list(
+            'source_metadata_key', flat=True)), ['key3', 'key4', 'key5'])
+
+    def test_purge_inactive_metadata_table_size(self):
+        """Test the table is optimized on request and the change of its
+        size is reported where the database reports it"""
+        MetadataLedger.objects.create(
+            record_lifecycle_status='Inactive',
+            metadata_record_inactivation_date=timezone.now() -
+            timedelta(days=100), source_metadata={'num': 0},
+            source_metadata_hash=get_metadata_hash({'num': 0}),
+            source_metadata_key='key0', source_metadata_key_hash='key0')
+
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as archive_dir, \
+                patch('core.management.commands.purge_inactive_metadata.'
+                      'get_table_size', side_effect=[65536, 16384]), \
+                patch('core.management.commands.purge_inactive_metadata.'
+                      'optimize_table') as mock_optimize:
+            call_command('purge_inactive_metadata', '--days', '30',
+                         '--archive-dir', archive_dir, '--optimize',
+                         stdout=out)
+
+        self.assertEqual(mock_optimize.call_count, 1)
+        self.assertIn('went from 65536 to 16384 bytes', out.getvalue())
+
+    # Test cases for benchmark_ledger_inserts
+    def test_benchmark_ledger_inserts(self):
+        """Test inserts are timed for both key types and rolled back"""
+        out = StringIO()
+        call_command('benchmark_ledger_inserts', '--rows', '20',
+                     '--batch-size', '10', '--repeat', '2', stdout=out)
+
+        self.assertIn('random:', out.getvalue())
+        self.assertIn('ordered:', out.getvalue())
+        self.assertIn('median of 2 rounds', out.getvalue())
+        self.assertEqual(MetadataLedger.objects.count(), 0)
 
     # Test cases for validate_source_metadata
 
@@ -140,7 +352,30 @@ class CommandTests(TestSetUp):
             validate_source_using_key(data, self.test_required_column_names,
                                       recommended_column_name)
             self.assertEqual(
-                mock_store_source_valid_status.call_count, 2)
+                mock_store_source_valid_status.call_count, 1)
+            self.assertEqual(
+                mock_store_source_valid_status.call_args[0][1], [123, 123])
+
+    def test_validate_source_using_key_chunked(self):
+        """Test validation results are written once per chunk of records"""
+        data = [{'source_metadata_key_hash': 123,
+                 'source_metadata': self.source_metadata},
+                {'source_metadata_key_hash': 456,
+                 'source_metadata': self.source_metadata},
+                {'source_metadata_key_hash': 789,
+                 'source_metadata': self.source_metadata}]
+
+        with patch('core.management.commands.'
+                   'validate_source_metadata'
+                   '.store_source_metadata_validation_status',
+                   return_value=None) as mock_store_source_valid_status, \
+                self.settings(LEDGER_UPDATE_BATCH_SIZE=2):
+            validate_source_using_key(data, self.test_required_column_names,
+                                      [])
+            self.assertEqual(
+                [store_call[0][1] for store_call in
+                 mock_store_source_valid_status.call_args_list],
+                [[123, 456], [789]])
 
     def test_validate_source_using_key_more_than_zero(self):
         """Test to Validating source data against required/ recommended column
@@ -176,8 +411,7 @@ class CommandTests(TestSetUp):
                 source_metadata_extraction_date=None)
 
         store_source_metadata_validation_status(
-            source_data_dict, self.key_value_hash, 'Y',
-            'Active', self.source_metadata)
+            source_data_dict, [self.key_value_hash], 'Y', 'Active')
 
         result_metadata = \
             MetadataLedger.objects.values(
@@ -210,8 +444,7 @@ class CommandTests(TestSetUp):
                 source_metadata_extraction_date=None)
 
         store_source_metadata_validation_status(
-            source_data_dict, self.key_value_hash, 'N',
-            'Inactive', self.source_metadata)
+            source_data_dict, [self.key_value_hash], 'N', 'Inactive')
 
         result_metadata = \
             MetadataLedger.objects.values(
@@ -273,8 +506,7 @@ class CommandTests(TestSetUp):
         """Test storing target metadata in MetadataLedger"""
         # with patch('core.management.commands.transform_source_metadata'
         #            '.MetadataLedger') as mock_data,\
-        with patch('core.models.confusable_homoglyphs_check'), \
-                patch('core.models.bleach_data_to_json') as mock_bleach:
+        with patch('core.models.sanitize_metadata') as mock_sanitize:
 
             metadata_ledger = MetadataLedger(
                 record_lifecycle_status='Active',
@@ -284,7 +516,7 @@ class CommandTests(TestSetUp):
                 source_metadata_key_hash=self.key_value_hash,
                 source_metadata_extraction_date=timezone.now())
 
-            mock_bleach.return_value = self.source_metadata
+            mock_sanitize.return_value = self.source_metadata, True
 
             metadata_ledger.save()
             store_transformed_source_metadata(
@@ -470,6 +702,9 @@ class CommandTests(TestSetUp):
         with patch('core.management.commands.'
                    'load_target_metadata.post_data_to_xis', return_value=None
                    )as mock_post_data_to_xis, \
+                patch('core.management.commands.load_target_metadata.'
+                      'claim_records',
+                      side_effect=lambda queryset, stage: queryset), \
                 patch('core.management.commands.load_target_metadata.'
                       'MetadataLedger.objects') as meta_obj:
             meta_data = MetadataLedger(
@@ -498,6 +733,9 @@ class CommandTests(TestSetUp):
                 'core.management.commands.load_target_metadata'
                 '.post_data_to_xis', return_value=None)as \
                 mock_post_data_to_xis, \
+                patch('core.management.commands.load_target_metadata.'
+                      'claim_records',
+                      side_effect=lambda queryset, stage: queryset), \
                 patch(
                     'core.management.commands.'
                     'load_target_metadata.MetadataLedger.objects') as meta_obj:
@@ -521,7 +759,8 @@ class CommandTests(TestSetUp):
                       '.XIAConfiguration.objects') as xiaCfg, \
                 patch('core.management.commands.load_target_metadata.'
                       'MetadataLedger.objects') as meta_obj, \
-                patch('requests.post') as response_obj, \
+                patch('core.management.utils.xis_client.'
+                      'http_client.post') as response_obj, \
                 patch(
                     'core.management.commands.'
                     'load_target_metadata'
@@ -557,7 +796,8 @@ class CommandTests(TestSetUp):
                       '.XIAConfiguration.objects') as xiaCfg, \
                 patch('core.management.commands.load_target_metadata.'
                       'MetadataLedger.objects') as meta_obj, \
-                patch('requests.post') as response_obj, \
+                patch('core.management.utils.xis_client.'
+                      'http_client.post') as response_obj, \
                 patch('core.management.utils.xis_client.'
                       'XISConfiguration.objects') as xisCfg, \
                 patch('core.management.commands.load_target_metadata.'
@@ -580,3 +820,34 @@ class CommandTests(TestSetUp):
             post_data_to_xis(data)
             self.assertEqual(response_obj.call_count, 2)
             self.assertEqual(mock_check_records_to_load.call_count, 1)
+
+    def test_post_data_to_xis_renews_claim(self):
+        """Test the claim on the records of a batch is renewed before each
+        record is posted, so it does not expire while the batch is
+        posted"""
+        MetadataLedger.objects.bulk_create(
+            [MetadataLedger(record_lifecycle_status='Active',
+                            source_metadata={'row': row},
+                            source_metadata_key='key_' + str(row),
+                            source_metadata_key_hash='key_' + str(row),
+                            target_metadata_transmission_status='Ready')
+             for row in range(2)])
+        with patch('core.management.commands.load_target_metadata.'
+                   'rename_metadata_ledger_fields',
+                   return_value=self.xis_expected_data), \
+                patch('core.management.commands.load_target_metadata.'
+                      'posting_metadata_ledger_to_xis') as mock_post, \
+                patch('core.management.commands.load_target_metadata.'
+                      'get_records_to_load_into_xis', return_value=None), \
+                self.settings(LEDGER_CLAIM_LEASE=60):
+            mock_post.return_value.status_code = 201
+            data = claim_records(get_records_to_load(), 'load')
+            MetadataLedger.objects.update(
+                claim_expires=timezone.now() - timedelta(seconds=1))
+
+            post_data_to_xis(list(data))
+
+        self.assertEqual(mock_post.call_count, 2)
+        for claim_expires in MetadataLedger.objects.values_list(
+                'claim_expires', flat=True):
+            self.assertGreater(claim_expires, timezone.now())
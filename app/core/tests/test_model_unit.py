@@ -1,8 +1,20 @@
+import json
+import re
 from unittest.mock import patch
 
+from core.management.commands.extract_source_metadata import \
+    get_active_records_for_keys
+from core.management.commands.load_target_metadata import get_records_to_load
+from core.management.commands.transform_source_metadata import \
+    get_source_metadata_for_transformation
+from core.management.commands.validate_source_metadata import \
+    get_source_metadata_for_validation
+from core.management.commands.validate_target_metadata import \
+    get_target_metadata_for_validation
 from core.models import (MetadataFieldOverwrite, MetadataLedger,
                          XIAConfiguration, XISConfiguration, XSRConfiguration)
 from django.core.exceptions import ValidationError
+from django.db import connection, models
 from django.test import TestCase, tag
 from django.utils import timezone
 
@@ -58,7 +70,7 @@ class ModelTests(TestCase):
     def test_xia_field_overwrite(self):
         """Test that field_overwrite in an XIA Configuration generates
         MetadataFieldOverwrite objects """
-        with patch("core.models.requests") as mock:
+        with patch("core.models.http_client") as mock:
             target_schema = {"schema": {
                 "start": {"test": {"use": "Required"}}}}
             transform_schema = {"schema_mapping": {
@@ -185,3 +197,127 @@ class ModelTests(TestCase):
                          target_metadata_validation_date)
         self.assertEqual(metadataLedger.target_metadata_validation_status,
                          target_metadata_validation_status)
+
+    def test_metadata_ledger_bulk_create_sanitizes(self):
+        """Test records created in bulk are sanitized like saved records"""
+        MetadataLedger.objects.bulk_create([
+            MetadataLedger(record_lifecycle_status='Active',
+                           source_metadata={'name': '<b>Name</b>'},
+                           source_metadata_hash=b'1' * 32,
+                           source_metadata_key='safe',
+                           source_metadata_key_hash='safe'),
+            MetadataLedger(record_lifecycle_status='Active',
+                           source_metadata={'name': 'Alloρ'},
+                           source_metadata_hash=b'2' * 32,
+                           source_metadata_key='unsafe',
+                           source_metadata_key_hash='unsafe')])
+
+        safe = MetadataLedger.objects.get(source_metadata_key='safe')
+        unsafe = MetadataLedger.objects.get(source_metadata_key='unsafe')
+        self.assertEqual(safe.source_metadata, {'name': 'Name'})
+        self.assertEqual(safe.record_lifecycle_status, 'Active')
+        self.assertEqual(unsafe.record_lifecycle_status, 'Inactive')
+        self.assertTrue(unsafe.metadata_record_inactivation_date)
+
+    def test_metadata_ledger_update_sanitizes(self):
+        """Test source metadata written by update is sanitized"""
+        MetadataLedger.objects.create(record_lifecycle_status='Active',
+                                      source_metadata={'name': 'Name'},
+                                      source_metadata_hash=b'1' * 32,
+                                      source_metadata_key='key',
+                                      source_metadata_key_hash='key')
+
+        MetadataLedger.objects.filter(source_metadata_key='key').update(
+            source_metadata={'name': '<i>Alloρ</i>'})
+
+        record = MetadataLedger.objects.get(source_metadata_key='key')
+        self.assertEqual(record.source_metadata, {'name': 'Alloρ'})
+        self.assertEqual(record.record_lifecycle_status, 'Inactive')
+
+    def test_metadata_ledger_bulk_update_source_metadata(self):
+        """Test source metadata can be written by bulk_update, which updates
+        with an expression instead of a dictionary"""
+        record = MetadataLedger.objects.create(
+            record_lifecycle_status='Active', source_metadata={'name': 'Name'},
+            source_metadata_hash=b'1' * 32, source_metadata_key='key',
+            source_metadata_key_hash='key')
+        record.source_metadata = {'name': 'Other name'}
+
+        MetadataLedger.objects.bulk_update([record], ['source_metadata'])
+
+        record.refresh_from_db()
+        self.assertEqual(record.source_metadata, {'name': 'Other name'})
+
+    def seed_metadata_ledger(self, count=500):
+        """Seed finished and inactive records, so the pending records of
+        every stage are a small share of the ledger and the optimizer
+        prefers an index"""
+        now = timezone.now()
+        models.QuerySet(MetadataLedger).bulk_create([
+            MetadataLedger(record_lifecycle_status=('Active', 'Inactive')[
+                               index % 2],
+                           source_metadata_key=f'seed{index}',
+                           source_metadata_key_hash=f'seed{index}',
+                           source_metadata={'name': 'Name'},
+                           source_metadata_hash=b'1' * 32,
+                           source_metadata_extraction_date=now,
+                           source_metadata_validation_status=('Y', 'N')[
+                               index // 2 % 2],
+                           source_metadata_validation_date=now,
+                           source_metadata_transformation_date=now,
+                           target_metadata_key=f'seed{index}',
+                           target_metadata_key_hash=f'seed{index}',
+                           target_metadata_validation_status=('Y', 'N')[
+                               index // 2 % 2],
+                           target_metadata_transmission_status=(
+                               'Successful', 'Pending')[index // 2 % 2],
+                           target_metadata_transmission_date=now)
+            for index in range(count)])
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute('ANALYZE TABLE core_metadataledger')
+            else:
+                cursor.execute('ANALYZE core_metadataledger')
+
+    def get_chosen_indexes(self, queryset):
+        """Get the names of the indexes the query plan of a queryset reads"""
+        if connection.vendor == 'sqlite':
+            return set(re.findall(r'USING (?:COVERING )?INDEX (\w+)',
+                                  queryset.explain()))
+        # MySQL names the chosen index "key", PostgreSQL "Index Name",
+        # possible_keys lists indexes the optimizer only considered
+        index_names = set()
+        plans = [json.loads(queryset.explain(format='json'))]
+        while plans:
+            plan = plans.pop()
+            if isinstance(plan, list):
+                plans.extend(plan)
+            elif isinstance(plan, dict):
+                for name, value in plan.items():
+                    if name in ('key', 'Index Name') and \
+                            isinstance(value, str):
+                        index_names.update(re.findall(r'\w+', value))
+                    else:
+                        plans.append(value)
+        return index_names
+
+    def assertUsesIndex(self, queryset, index_name):
+        """Assert the query plan of a queryset chooses an index"""
+        self.assertIn(index_name, self.get_chosen_indexes(queryset),
+                      queryset.explain())
+
+    def test_metadata_ledger_stage_queries_use_indexes(self):
+        """Test the queries of every stage are served by an index"""
+        self.seed_metadata_ledger()
+        self.assertUsesIndex(get_active_records_for_keys(['key']),
+                             'ledger_source_key_idx')
+        self.assertUsesIndex(get_source_metadata_for_validation(),
+                             'ledger_source_valid_idx')
+        self.assertUsesIndex(get_source_metadata_for_transformation(),
+                             'ledger_transform_idx')
+        self.assertUsesIndex(get_target_metadata_for_validation(),
+                             'ledger_target_valid_idx')
+        self.assertUsesIndex(get_target_metadata_for_validation().filter(
+            target_metadata_key_hash='key'), 'ledger_target_key_idx')
+        self.assertUsesIndex(get_records_to_load(),
+                             'ledger_transmission_idx')
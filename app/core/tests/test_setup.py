@@ -2,6 +2,7 @@ from unittest.mock import patch
 from uuid import UUID
 
 import pandas as pd
+from core.management.utils.metadata_hash import get_metadata_hash
 from core.models import XSRConfiguration
 from django.test import TestCase
 
@@ -17,6 +18,11 @@ class TestSetUp(TestCase):
         self.patcher = patch('core.tasks.conformance_alerts_Command')
         self.mock_alert = self.patcher.start()
 
+        # keep tests from reading or writing the XSR response cache
+        self.settings_override = self.settings(XSR_CONDITIONAL_REQUESTS=False)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
         self.source_metadata = {
             "id": 1,
             "Test": "0",
@@ -34,9 +40,7 @@ class TestSetUp(TestCase):
         self.key_value_hash = "902b044e8abbea677ac6b5d75b70b9c7d819a1d246" \
                               "10812898f4c168fa2b7c4b85dc7143605f0e8da20ce" \
                               "73f65cbcae0fa08f0d21d40dbb9d9eafd876b8575a5"
-        self.hash_value = "9cb7277d49f4649452bf16455f462258b85345251b4fe655" \
-                          "7000acf7812bb0b3db399fc2132bef042923ef6843c3026fe" \
-                          "1d0bc0914a378a34ad3d9141f1ee38b"
+        self.hash_value = get_metadata_hash(self.source_metadata)
 
         self.test_data = {
             "key1": ["val1"],
@@ -75,7 +79,7 @@ class TestSetUp(TestCase):
         }
         self.key_value = "TestData 123_AGENT"
         self.key_value_hash = "d2a7f8cc5d5484a4dde099c6a21a903a"
-        self.hash_value = "f454114ba41034e14df2a8f3c14a047d"
+        self.hash_value = get_metadata_hash(self.source_metadata)
 
         self.target_metadata = {
             "Course": {
@@ -103,7 +107,7 @@ class TestSetUp(TestCase):
 
         self.target_key_value = "TestData 123_AGENT"
         self.target_key_value_hash = "d2a7f8cc5d5484a4dde099c6a21a903a"
-        self.target_hash_value = "eaf3e57b7f21b4d813f1258fb4ebf89d"
+        self.target_hash_value = get_metadata_hash(self.target_metadata)
 
         self.source_metadata_overwrite = {
             "Test": "0",
@@ -119,7 +123,8 @@ class TestSetUp(TestCase):
         }
         self.key_value_overwrite = "TestData 234_AGENT"
         self.key_value_hash_overwrite = "5a9a682afe965fb2aa1f9f50e5148ebd"
-        self.hash_value_overwrite = "81b86d6ac3b4d8561bd26f11d8feea9a"
+        self.hash_value_overwrite = get_metadata_hash(
+            self.source_metadata_overwrite)
 
         self.target_metadata_overwrite = {
             "Course": {
@@ -148,7 +153,8 @@ class TestSetUp(TestCase):
         self.target_overwrite_key_value = "TestData 234_AGENT"
         self.target_overwrite_key_value_hash = \
             "d2a7f8cc5d5484a4dde099c6a21a903a"
-        self.target_overwrite_hash_value = "eaf3e57b7f21b4d813f1258fb4ebf89d"
+        self.target_overwrite_hash_value = get_metadata_hash(
+            self.target_metadata_overwrite)
 
         self.xia_data = {
             'metadata_record_uuid': UUID(
@@ -255,7 +261,7 @@ class TestSetUp(TestCase):
         }
         self.key_value_invalid = "TestData 1234_AGENT"
         self.key_value_hash_invalid = "eaf3e57b7f21b4d813f1258fb4ebf89d"
-        self.hash_value_invalid = "d9eccc6651c0b95db975aca43fa9b481"
+        self.hash_value_invalid = get_metadata_hash(self.metadata_invalid)
 
         self.target_metadata_invalid = {
             "Course": {
@@ -283,7 +289,8 @@ class TestSetUp(TestCase):
 
         self.target_key_value_invalid = "TestData 1234_AGENT"
         self.target_key_value_hash_invalid = "d9eccc6651c0b95db975aca43fa9b481"
-        self.target_hash_value_invalid = "eaf3e57b7f21b4d813f1258fb4ebf89d"
+        self.target_hash_value_invalid = get_metadata_hash(
+            self.target_metadata_invalid)
 
         self.source_target_mapping = {
             "Course": {
@@ -514,7 +521,7 @@ class TestSetUp(TestCase):
         }
         self.key_value = "TestData 123_AGENT"
         self.key_value_hash = "d2a7f8cc5d5484a4dde099c6a21a903a"
-        self.hash_value = "f454114ba41034e14df2a8f3c14a047d"
+        self.hash_value = get_metadata_hash(self.source_metadata)
 
         self.target_metadata = {
             "p2881_course_profile": {
@@ -542,7 +549,7 @@ class TestSetUp(TestCase):
 
         self.target_key_value = "TestData 123_AGENT"
         self.target_key_value_hash = "d2a7f8cc5d5484a4dde099c6a21a903a"
-        self.target_hash_value = "eaf3e57b7f21b4d813f1258fb4ebf89d"
+        self.target_hash_value = get_metadata_hash(self.target_metadata)
 
         self.source_metadata_overwrite = {
             "Test": "0",
@@ -558,7 +565,8 @@ class TestSetUp(TestCase):
         }
         self.key_value_overwrite = "TestData 234_AGENT"
         self.key_value_hash_overwrite = "5a9a682afe965fb2aa1f9f50e5148ebd"
-        self.hash_value_overwrite = "81b86d6ac3b4d8561bd26f11d8feea9a"
+        self.hash_value_overwrite = get_metadata_hash(
+            self.source_metadata_overwrite)
 
         self.target_metadata_overwrite = {
             "p2881_course_profile": {
@@ -587,7 +595,8 @@ class TestSetUp(TestCase):
         self.target_overwrite_key_value = "TestData 234_AGENT"
         self.target_overwrite_key_value_hash = \
             "d2a7f8cc5d5484a4dde099c6a21a903a"
-        self.target_overwrite_hash_value = "eaf3e57b7f21b4d813f1258fb4ebf89d"
+        self.target_overwrite_hash_value = get_metadata_hash(
+            self.target_metadata_overwrite)
         self.xis_expected_data = {
             'unique_record_identifier': UUID(
                 '09edea0e-6c83-40a6-951e-2acee3e99502'),
@@ -681,7 +690,7 @@ class TestSetUp(TestCase):
         }
         self.key_value_invalid = "TestData 1234_AGENT"
         self.key_value_hash_invalid = "eaf3e57b7f21b4d813f1258fb4ebf89d"
-        self.hash_value_invalid = "d9eccc6651c0b95db975aca43fa9b481"
+        self.hash_value_invalid = get_metadata_hash(self.metadata_invalid)
 
         self.target_metadata_invalid = {
             "p2881_course_profile": {
@@ -709,7 +718,8 @@ class TestSetUp(TestCase):
 
         self.target_key_value_invalid = "TestData 1234_AGENT"
         self.target_key_value_hash_invalid = "d9eccc6651c0b95db975aca43fa9b481"
-        self.target_hash_value_invalid = "eaf3e57b7f21b4d813f1258fb4ebf89d"
+        self.target_hash_value_invalid = get_metadata_hash(
+            self.target_metadata_invalid)
 
         self.source_target_mapping = {
             "p2881_course_profile": {
@@ -1,39 +1,86 @@
+import copy
 import hashlib
 import json
 import logging
-from datetime import datetime
-from unittest.mock import patch
-
-import pandas as pd
+import os
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import Mock, PropertyMock, patch
+
+import requests
+from core.management.utils import http_client, model_help
+from core.management.utils.checkpoint import (get_checkpoint_start_pages,
+                                              record_checkpoint_page)
 from core.management.utils.eccr_client import (get_eccr_api_endpoint,
-                                               get_eccr_uuid)
+                                               get_eccr_cache_stats,
+                                               get_eccr_uuid, get_eccr_uuids,
+                                               parse_eccr_job,
+                                               search_eccr_uuids)
+from core.management.utils.html_converter import (clear_html_cache,
+                                                  contains_html,
+                                                  get_html_cache_stats,
+                                                  html_to_text)
+from core.management.utils.memo_cache import BoundedMemo
+from core.management.utils.metadata_hash import (METADATA_HASH_SIZE,
+                                                 canonical_json,
+                                                 get_metadata_hash)
 from core.management.utils.model_help import (bleach_data_to_json,
-                                              confusable_homoglyphs_check)
-from core.management.utils.xia_internal import (dict_flatten,
+                                              clear_sanitize_cache,
+                                              confusable_homoglyphs_check,
+                                              get_sanitize_cache_stats,
+                                              init_sanitize_process,
+                                              sanitize_metadata_batch)
+from core.management.utils.record_uuid import get_record_uuid, uuid7
+from core.management.utils.response_archive import (ResponseCapture,
+                                                    ResponseReplay,
+                                                    close_response_archive,
+                                                    get_archive_key,
+                                                    get_index_path)
+from core.management.utils.response_cache import (get_cached_response,
+                                                  get_conditional_headers,
+                                                  store_cached_response)
+from core.management.utils.schema_validator import (SchemaValidator,
+                                                    ValidationResult,
+                                                    iter_validated_rows)
+from core.management.utils.validation_report import ValidationReport
+from core.management.utils.work_queue import (claim_records, extend_claim,
+                                              iter_claimed_batches)
+from core.management.utils.xia_internal import (clear_date_cache,
+                                                convert_date_to_isoformat,
+                                                dict_flatten,
                                                 flatten_dict_object,
                                                 get_key_dict,
                                                 get_publisher_detail,
                                                 get_target_metadata_key_value,
-                                                is_date,
+                                                is_date, is_iso_date,
                                                 required_recommended_logs,
                                                 type_cast_overwritten_values,
                                                 update_flattened_object)
 from core.management.utils.xis_client import get_xis_metadata_api_endpoint
 from core.management.utils.xsr_client import (convert_html,
                                               convert_int_to_date,
+                                              extract_code_source,
                                               extract_source, find_dates,
-                                              find_html,
+                                              find_html, get_code_search_pages,
+                                              get_number_of_pages,
                                               get_source_metadata_key_value,
                                               get_xsr_api_endpoint,
                                               get_xsr_api_response,
-                                              list_to_string, read_source_file)
+                                              list_to_string,
+                                              normalize_source_record,
+                                              read_source_file,
+                                              source_page_to_records)
 from core.management.utils.xss_client import (
     get_data_types_for_validation, get_required_fields_for_validation,
     get_source_validation_schema, get_target_metadata_for_transformation,
     get_target_validation_schema, read_json_data, xss_get)
-from core.models import XIAConfiguration, XISConfiguration
+from core.models import (ExtractionCheckpoint, MetadataLedger,
+                         ValidationFailure, XIAConfiguration, XISConfiguration)
 from ddt import data, ddt, unpack
+from django.core.exceptions import ImproperlyConfigured
 from django.test import tag
+from django.utils import timezone
 
 from .test_setup import TestSetUp
 
@@ -55,7 +102,8 @@ class UtilsTests(TestSetUp):
     def test_get_xsr_api_response(self):
         """Test to Function to get api response from xsr endpoint"""
         with patch('core.management.utils.xsr_client.get_xsr_api_endpoint') \
-                as xsr_ep, patch('requests.get') as response_obj:
+                as xsr_ep, patch('core.management.utils.xsr_client.'
+                                 'http_client.get') as response_obj:
             xsr_ep.return_value = self.xsr_api_endpoint_url, self.token
             response_obj.return_value = response_obj
 
@@ -66,25 +114,247 @@ class UtilsTests(TestSetUp):
     def test_extract_source(self):
         """Test function to parse xml xsr data and convert to dictionary"""
         with patch('core.management.utils.xsr_client.'
-                   'get_xsr_api_response') as mock_xsr:
+                   'get_xsr_api_response') as mock_xsr, \
+                patch('core.management.utils.xsr_client.'
+                      'get_eccr_uuids', return_value={}), \
+                patch('core.management.utils.xsr_client.'
+                      'get_eccr_uuid', return_value=None):
             source_data = {"CodeList": [{"ValidValue": [{
                 "Code": "eccr_link"}]}],
                 "SearchResult": {"SearchResultItems":
-                                 {1: {"key": "val"}}}}
-            # dict_data = {"SearchResult": {"SearchResultItems": "val"}}
+                                 [{"key": "val"}]}}
+            mock_xsr.return_value.text = json.dumps(source_data)
+            mock_xsr.return_value.status_code = 200
+
+            ret = list(extract_source(self.xsrConfig))
+            self.assertEqual(len(ret), 1)
+            self.assertEqual(ret[0], [{"key": "val", "code": "eccr_link",
+                                       "eccr_uuid": ""}])
+
+    def test_extract_source_concurrent_order(self):
+        """Test concurrent extraction keeps the order of the code list"""
+        codes = ['code' + str(num) for num in range(6)]
+
+        def code_source(xsr_obj, code, eccr_uuids=None, start_pages=None):
+            return [([{"code": code, "page": 1}], Mock()),
+                    ([{"code": code, "page": 2}], Mock())], 0.01
+
+        with patch('core.management.utils.xsr_client.'
+                   'get_cwr_code_list', return_value=codes), \
+                patch('core.management.utils.xsr_client.'
+                      'get_eccr_uuids', return_value={}), \
+                patch('core.management.utils.xsr_client.'
+                      'extract_code_source', side_effect=code_source):
+            ret = list(extract_source(self.xsrConfig, max_workers=3,
+                                      max_in_flight=2))
+
+            self.assertEqual([page[0]['code'] for page in ret],
+                             [code for code in codes for _ in range(2)])
+            self.assertEqual([page[0]['page'] for page in ret],
+                             [1, 2] * len(codes))
+
+    def test_extract_code_source(self):
+        """Test retrieving XSR data for a single CWR code"""
+        with patch('core.management.utils.xsr_client.'
+                   'get_xsr_api_response') as mock_xsr, \
+                patch('core.management.utils.xsr_client.'
+                      'get_eccr_uuid', return_value=None):
+            source_data = {"SearchResult": {"SearchResultItems":
+                                            [{"key": "val"}]}}
             mock_xsr.return_value.text = json.dumps(source_data)
             mock_xsr.return_value.status_code = 200
 
-            ret = extract_source('')
-            self.assertIsInstance(ret, pd.DataFrame)
+            source_page_list, latency = extract_code_source(self.xsrConfig,
+                                                            'code')
+            self.assertEqual(len(source_page_list), 1)
+            self.assertEqual([record['code'] for record in
+                              source_page_list[0][0]], ['code'])
+            self.assertGreaterEqual(latency, 0)
+
+    def test_extract_code_source_failed(self):
+        """Test a failed CWR code request returns no data"""
+        with patch('core.management.utils.xsr_client.'
+                   'get_xsr_api_response') as mock_xsr, \
+                patch('core.management.utils.xsr_client.'
+                      'get_eccr_uuid', return_value=None):
+            mock_xsr.return_value.status_code = 500
+
+            source_page_list, _ = extract_code_source(self.xsrConfig, 'code')
+            self.assertEqual(source_page_list, [])
+
+    def test_extract_code_source_resolved_uuid(self):
+        """Test codes resolved in advance are not looked up again"""
+        eccr_uuids = {'code': {'job': {'reference': 'ref', 'job_type': '',
+                                       'name': ''}}}
+        with patch('core.management.utils.xsr_client.'
+                   'get_xsr_api_response') as mock_xsr, \
+                patch('core.management.utils.xsr_client.'
+                      'get_eccr_uuid') as mock_eccr:
+            source_data = {"SearchResult": {"SearchResultItems":
+                                            [{"key": "val"}]}}
+            mock_xsr.return_value.text = json.dumps(source_data)
+            mock_xsr.return_value.status_code = 200
+
+            source_page_list, _ = extract_code_source(self.xsrConfig, 'code',
+                                                      eccr_uuids)
+            self.assertEqual(source_page_list[0][0][0]['eccr_uuid'],
+                             str(eccr_uuids['code']))
+            self.assertEqual(mock_eccr.call_count, 0)
+
+    def test_get_code_search_pages(self):
+        """Test search results are retrieved for every page of a code"""
+        with patch('core.management.utils.xsr_client.'
+                   'get_xsr_api_response') as mock_xsr:
+            pages = [{"SearchResult": {
+                "SearchResultItems": [{"key": "val" + str(page)}],
+                "UserArea": {"NumberOfPages": "3"}}} for page in range(3)]
+            mock_xsr.return_value.status_code = 200
+            type(mock_xsr.return_value).text = PropertyMock(
+                side_effect=[json.dumps(page) for page in pages])
+
+            ret = [items for items, _, _ in
+                   get_code_search_pages(self.xsrConfig, 'code')]
+
+            self.assertEqual(ret, [[{"key": "val0"}], [{"key": "val1"}],
+                                   [{"key": "val2"}]])
+            self.assertEqual(mock_xsr.call_count, 3)
+            self.assertIn('Page=3', mock_xsr.call_args[0][1])
+
+    def test_get_code_search_pages_start_page(self):
+        """Test search results are retrieved from the start page and stored
+        pages are recorded in the checkpoint"""
+        with patch('core.management.utils.xsr_client.'
+                   'get_xsr_api_response') as mock_xsr:
+            search_result = {"SearchResult": {
+                "SearchResultItems": [{"key": "val"}],
+                "UserArea": {"NumberOfPages": "3"}}}
+            mock_xsr.return_value.status_code = 200
+            mock_xsr.return_value.text = json.dumps(search_result)
+
+            for _, _, complete_page in \
+                    get_code_search_pages(self.xsrConfig, 'code', 2):
+                complete_page()
+
+            self.assertEqual(mock_xsr.call_count, 2)
+            self.assertIn('Page=2', mock_xsr.call_args_list[0][0][1])
+            checkpoint = ExtractionCheckpoint.objects.get(code='code')
+            self.assertEqual(checkpoint.page, 3)
+            self.assertIsNotNone(checkpoint.completed_date)
+
+    def test_get_checkpoint_start_pages(self):
+        """Test resumed extraction skips completed codes and continues
+        interrupted codes after their last stored page"""
+        record_checkpoint_page(self.xsrConfig, 'complete', 1, True)
+        record_checkpoint_page(self.xsrConfig, 'interrupted', 1, False)
+        record_checkpoint_page(self.xsrConfig, 'interrupted', 2, False)
+        record_checkpoint_page(self.xsrConfig, 'stale', 1, False)
+        ExtractionCheckpoint.objects.filter(code='stale').update(
+            started_date=timezone.now() - timedelta(days=2))
+
+        with self.settings(XSR_CHECKPOINT_MAX_AGE=24 * 60 * 60):
+            start_pages = get_checkpoint_start_pages(
+                self.xsrConfig, ['complete', 'interrupted', 'stale', 'new'])
+
+        self.assertEqual(start_pages, {'interrupted': 3, 'stale': 1,
+                                       'new': 1})
+
+    def test_extract_source_resume(self):
+        """Test resumed extraction only retrieves unfinished codes"""
+        with patch('core.management.utils.xsr_client.'
+                   'get_cwr_code_list', return_value=['done', 'todo']), \
+                patch('core.management.utils.xsr_client.'
+                      'get_checkpoint_start_pages',
+                      return_value={'todo': 2}), \
+                patch('core.management.utils.xsr_client.'
+                      'get_eccr_uuids', return_value={}) as mock_uuids, \
+                patch('core.management.utils.xsr_client.'
+                      'iter_codes_serially', return_value=iter([])) as \
+                mock_iter:
+            list(extract_source(self.xsrConfig, max_workers=1, resume=True))
+
+            mock_uuids.assert_called_once_with(['todo'])
+            self.assertEqual(mock_iter.call_args[0][1], ['todo'])
+            self.assertEqual(mock_iter.call_args[0][4], {'todo': 2})
+
+    def test_get_xsr_api_response_not_modified(self):
+        """Test conditional requests send the cached validators and return
+        the cached body when the response is unchanged"""
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                self.settings(XSR_CONDITIONAL_REQUESTS=True,
+                              XSR_RESPONSE_CACHE_DIR=cache_dir), \
+                patch('core.management.utils.xsr_client.'
+                      'http_client.get') as mock_get:
+            url = self.xsr_api_endpoint_url + '/endpoint'
+            store_cached_response(url, Mock(status_code=200,
+                                            headers={'ETag': '"v1"'},
+                                            text='{"cached": true}'))
+            not_modified = Mock(status_code=304, headers={}, text='')
+            mock_get.return_value = not_modified
+
+            resp = get_xsr_api_response(self.xsrConfig, '/endpoint',
+                                        conditional=True)
+
+            self.assertEqual(resp.status_code, 304)
+            self.assertEqual(json.loads(resp.text), {"cached": True})
+            self.assertIs(resp.response, not_modified)
+            self.assertEqual(not_modified.text, '')
+            self.assertEqual(
+                mock_get.call_args[1]['headers']['If-None-Match'], '"v1"')
+
+    def test_extract_source_skips_unchanged_code(self):
+        """Test codes whose pages are all unchanged are not extracted"""
+        search_result = {"SearchResult": {
+            "SearchResultItems": [{"key": "val"}],
+            "UserArea": {"NumberOfPages": "1"}}}
+        with patch('core.management.utils.xsr_client.'
+                   'get_cwr_code_list', return_value=['code']), \
+                patch('core.management.utils.xsr_client.'
+                      'get_eccr_uuids', return_value={}), \
+                patch('core.management.utils.xsr_client.'
+                      'get_xsr_api_response') as mock_xsr, \
+                patch('core.management.utils.xsr_client.'
+                      'get_eccr_uuid') as mock_eccr:
+            mock_xsr.return_value.status_code = 304
+            mock_xsr.return_value.text = json.dumps(search_result)
+
+            ret = list(extract_source(self.xsrConfig))
+
+            self.assertEqual(ret, [])
+            self.assertEqual(mock_eccr.call_count, 0)
+
+    def test_store_cached_response(self):
+        """Test responses are cached with their validators"""
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                self.settings(XSR_RESPONSE_CACHE_DIR=cache_dir):
+            resp = requests.Response()
+            resp.status_code = 200
+            resp.headers['Last-Modified'] = 'Wed, 21 Oct 2015 07:28:00 GMT'
+            resp._content = b'{"key": "val"}'
+
+            store_cached_response('http://example/api', resp)
+            cached = get_cached_response('http://example/api')
+
+            self.assertEqual(cached['text'], '{"key": "val"}')
+            self.assertEqual(get_conditional_headers(cached),
+                             {'If-Modified-Since':
+                              'Wed, 21 Oct 2015 07:28:00 GMT'})
+            self.assertIsNone(get_cached_response('http://example/other'))
+
+    @data(({"UserArea": {"NumberOfPages": "4"}}, 4),
+          ({"SearchResultCountAll": 1001}, 3), ({}, 1))
+    @unpack
+    def test_get_number_of_pages(self, search_result, expected):
+        """Test the page count is read from the search result"""
+        with self.settings(XSR_RESULTS_PER_PAGE=500):
+            self.assertEqual(get_number_of_pages(search_result), expected)
 
     @patch('core.management.utils.xsr_client.extract_source',
-           return_value=dict({1: {'a': 'b'}}))
+           return_value=iter([[{'a': 'b'}]]))
     def test_read_source_file(self, extract):
         """test to check if data is present for extraction """
 
-        result_data = read_source_file(self.xsrConfig)
-        self.assertIsInstance(result_data, list)
+        result_data = list(read_source_file(self.xsrConfig))
+        self.assertEqual(result_data, [[{'a': 'b'}]])
 
     def test_listToString(self):
         converted_string = list_to_string('[1, 2, 3, 4]')
@@ -109,6 +379,125 @@ class UtilsTests(TestSetUp):
         convert_html('html_code', html_dict)
         self.assertTrue(isinstance(html_dict['html_code'], str))
 
+    @data(('<p>text</p>', True), ('a < b', False), ('<!-- note -->', False),
+          ('</p>', False), ('plain text', False))
+    @unpack
+    def test_contains_html(self, text, expected):
+        """Test only text with an HTML tag is detected as HTML"""
+        self.assertEqual(contains_html(text), expected)
+
+    def test_html_to_text_cached(self):
+        """Test HTML is converted once and the text is reused"""
+        clear_html_cache()
+        stats = get_html_cache_stats()
+        with patch('core.management.utils.html_converter.html2text.'
+                   'html2text', return_value='text') as mock_convert:
+            first = html_to_text('<p>text</p>')
+            second = html_to_text('<p>text</p>')
+
+            self.assertEqual(first, 'text')
+            self.assertEqual(second, 'text')
+            self.assertEqual(mock_convert.call_count, 1)
+            self.assertEqual(get_html_cache_stats()['hits'],
+                             stats['hits'] + 1)
+            self.assertEqual(get_html_cache_stats()['misses'],
+                             stats['misses'] + 1)
+
+    def test_html_to_text_persisted(self):
+        """Test converted text is reused across runs when persisted"""
+        with patch('core.management.utils.html_converter.html2text.'
+                   'html2text', return_value='text') as mock_convert, \
+                self.settings(HTML_CACHE_PERSIST=True, HTML_CACHE_SIZE=1):
+            clear_html_cache()
+            html_to_text('<p>persisted</p>')
+            html_to_text('<p>evicted</p>')
+            clear_html_cache()
+            html_to_text('<p>persisted</p>')
+
+            self.assertEqual(mock_convert.call_count, 2)
+
+    def test_bounded_memo(self):
+        """Test the least recently used values are evicted and every lookup
+        is counted"""
+        memo = BoundedMemo('Test', 'DATE_CACHE_SIZE')
+        compute = Mock(side_effect=lambda value: value.upper())
+        with self.settings(DATE_CACHE_SIZE=2):
+            memo.memoize('a', compute, 'a')
+            memo.memoize('b', compute, 'b')
+            memo.memoize('a', compute, 'a')
+            memo.memoize('c', compute, 'c')
+
+            self.assertEqual(memo.get('a'), 'A')
+            self.assertIsNone(memo.get('b'))
+            self.assertEqual(memo.memoize('c', compute, 'c'), 'C')
+            self.assertEqual(compute.call_count, 3)
+            self.assertEqual(memo.get_stats(), {'hits': 2, 'misses': 3})
+
+    def test_get_metadata_hash(self):
+        """Test metadata hashes do not depend on field order or on whole
+        numbers being written as floats"""
+        first = get_metadata_hash({"a": 1, "b": {"c": [1.0, "d"]}})
+        second = get_metadata_hash({"b": {"c": [1, "d"]}, "a": 1.0})
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(first), METADATA_HASH_SIZE)
+        self.assertNotEqual(first, get_metadata_hash({"a": 2}))
+        self.assertEqual(canonical_json({"b": 1.5, "a": "é"}),
+                         '{"a":"é","b":1.5}')
+
+    @data('blake2b', 'sha256', 'sha512')
+    def test_get_metadata_hash_algorithm(self, algorithm):
+        """Test the configured digest is used to hash metadata"""
+        with self.settings(METADATA_HASH_ALGORITHM=algorithm):
+            metadata_hash = get_metadata_hash({"a": 1})
+
+        self.assertEqual(len(metadata_hash), METADATA_HASH_SIZE)
+        self.assertEqual(metadata_hash,
+                         get_metadata_hash({"a": 1}, algorithm=algorithm))
+
+    @data('md5', 'unknown')
+    def test_get_metadata_hash_unsupported(self, algorithm):
+        """Test digests that are unknown or too short are rejected"""
+        with self.assertRaises(ImproperlyConfigured):
+            get_metadata_hash({"a": 1}, algorithm=algorithm)
+
+    def test_source_page_to_records(self):
+        """Test records of a page get the values a dataframe of the page
+        would hold"""
+        source_data = [{"id": "1", "rank": 1, "flag": True},
+                       {"id": "2", "flag": None, "extra": {"a": None}}]
+        source_records = source_page_to_records(source_data)
+
+        self.assertEqual(source_records, [
+            {"id": "1", "rank": 1.0, "flag": True, "extra": ''},
+            {"id": "2", "rank": '', "flag": '', "extra": {"a": None}}])
+        self.assertEqual(list(source_records[1]),
+                         ["id", "rank", "flag", "extra"])
+        self.assertIsInstance(source_records[0]["rank"], float)
+
+    def test_normalize_source_record(self):
+        """Test a record is normalized the same way as by find_dates and
+        find_html followed by a JSON round trip"""
+        record = {
+            "MatchedObjectDescriptor": {
+                "PositionID": "1",
+                "PublicationStartDate": 1718050925,
+                "QualificationSummary": "<p>Must have <b>experience</b></p>",
+                "JobCategory": [{"Name": "IT", "Code": "2210"}],
+                "UserArea": {"Details": {"LowGrade": 9, "Empty": None}}},
+            "RelevanceRank": 1.0,
+            "code": "code"}
+        expected = json.loads(json.dumps(
+            find_html(find_dates(copy.deepcopy(record))),
+            default=convert_date_to_isoformat))
+
+        result = normalize_source_record(record)
+
+        self.assertEqual(str(result), str(expected))
+        self.assertEqual(
+            record["MatchedObjectDescriptor"]["PublicationStartDate"],
+            1718050925)
+
     def test_convert_int_to_date(self):
 
         date_int = {'date': 1718050925}
@@ -182,13 +571,36 @@ class UtilsTests(TestSetUp):
         result = get_key_dict(first_value, second_value)
         self.assertEquals(result, expected_result)
 
-    @data((1, False), ("1990-12-1", True), ("Monday at 12:01am", True))
+    @data((1, False), ("1990-12-1", True), ("Monday at 12:01am", True),
+          ("2021-06-30T23:59:59.9970", True),
+          ("9999-12-31T00:00:00-05:00", True), ("2021-02-30", False),
+          ("", False))
     @unpack
     def test_is_date(self, value_to_be_tested, result):
         """tests whether the string can be interpreted as a date."""
         check = is_date(value_to_be_tested)
         self.assertEqual(check, result)
 
+    @data(("2021-06-30", True), ("2021-06-30T23:59Z", True),
+          ("2021-06-30 23:59:59.997+0530", True), ("2021-13-30", False),
+          ("2021-06-30T24:00", False), ("30/06/2021", False))
+    @unpack
+    def test_is_iso_date(self, value_to_be_tested, result):
+        """Test ISO 8601 dates are recognized without dateutil"""
+        self.assertEqual(is_iso_date(value_to_be_tested), result)
+
+    def test_is_date_cached(self):
+        """Test dateutil checks each string that is not an ISO 8601 date
+        once"""
+        clear_date_cache()
+        with patch('core.management.utils.xia_internal.parse',
+                   side_effect=ValueError) as mock_parse:
+            self.assertTrue(is_date("2021-06-30T00:00:00.0000"))
+            self.assertFalse(is_date("not a date"))
+            self.assertFalse(is_date("not a date"))
+
+            self.assertEqual(mock_parse.call_count, 1)
+
     @data(('key_field1', 'key_field2', 'key_field3'),
           ('key_field1', 'key_field2', 'key_field3'))
     @unpack
@@ -428,7 +840,7 @@ class UtilsTests(TestSetUp):
         """Test for retrieving XSS json schemas """
         with patch('core.management.utils.xss_client.xss_get') as \
             xss_host, patch('core.management.utils.xss_client.'
-                            'requests') as req:
+                            'http_client') as req:
             xss_api = "http://test_xss_api"
             schema = {"schema": {"test": "val"}}
             xss_host.return_value = xss_api
@@ -454,7 +866,7 @@ class UtilsTests(TestSetUp):
         with patch('core.management.utils.eccr_client.'
                    'get_eccr_api_endpoint') as mock_url, \
                 patch('core.management.utils.eccr_client.'
-                      'requests.request') as mock_response:
+                      'http_client.request') as mock_response:
             mock_url.return_value = mock_url
             mock_response.return_value.json.return_value = [{'@id': '@id',
                                                              '@type': '@type',
@@ -464,6 +876,225 @@ class UtilsTests(TestSetUp):
             response = get_eccr_uuid('')
             self.assertTrue(response)
 
+    # Test cases for HTTP_CLIENT
+
+    def test_http_request_retries_idempotent(self):
+        """Test idempotent requests are retried on transient errors"""
+        with patch('core.management.utils.http_client.get_session') as \
+                mock_session, \
+                patch('core.management.utils.http_client.time.sleep') as \
+                mock_sleep, self.settings(HTTP_MAX_RETRIES=3,
+                                          HTTP_BACKOFF_FACTOR=0.5):
+            unavailable = Mock(status_code=503)
+            mock_session.return_value.request.side_effect = [
+                requests.exceptions.ConnectionError(), unavailable,
+                Mock(status_code=200)]
+
+            response = http_client.get(self.xsr_api_endpoint_url)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                mock_session.return_value.request.call_count, 3)
+            self.assertEqual([call[0][0] for call in
+                              mock_sleep.call_args_list], [0.5, 1.0])
+            self.assertTrue(unavailable.close.called)
+
+    def test_http_request_no_retry_post(self):
+        """Test non idempotent requests are sent once"""
+        with patch('core.management.utils.http_client.get_session') as \
+                mock_session, \
+                patch('core.management.utils.http_client.time.sleep'):
+            mock_session.return_value.request.return_value = \
+                Mock(status_code=503)
+
+            response = http_client.post(self.xsr_api_endpoint_url, data={})
+
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(
+                mock_session.return_value.request.call_count, 1)
+
+    def test_response_archive_replay(self):
+        """Test captured responses are replayed without the network"""
+        with tempfile.TemporaryDirectory() as archive_dir, \
+                patch('core.management.utils.http_client.get_session') as \
+                mock_session:
+            archive_path = archive_dir + '/archive.bin'
+            captured = requests.Response()
+            captured.status_code = 200
+            captured.headers['Content-Type'] = 'application/json'
+            captured._content = b'{"key": "val"}'
+            mock_session.return_value.request.return_value = captured
+
+            with self.settings(RESPONSE_ARCHIVE_MODE='capture',
+                               RESPONSE_ARCHIVE_PATH=archive_path):
+                http_client.get(self.xsr_api_endpoint_url)
+                http_client.request('POST', self.xsr_api_endpoint_url,
+                                    idempotent=True, data={'data': 'q'})
+                close_response_archive()
+
+            mock_session.reset_mock()
+            with self.settings(RESPONSE_ARCHIVE_MODE='replay',
+                               RESPONSE_ARCHIVE_PATH=archive_path):
+                response = http_client.get(self.xsr_api_endpoint_url)
+                posted = http_client.request(
+                    'POST', self.xsr_api_endpoint_url, idempotent=True,
+                    data={'data': 'q'})
+                with self.assertRaises(requests.exceptions.ConnectionError):
+                    http_client.get(self.xsr_api_endpoint_url + '/other')
+                close_response_archive()
+
+            self.assertEqual(response.json(), {"key": "val"})
+            self.assertEqual(response.headers['content-type'],
+                             'application/json')
+            self.assertEqual(posted.json(), {"key": "val"})
+            self.assertEqual(mock_session.return_value.request.call_count,
+                             0)
+
+    def test_response_archive_rebuilds_index(self):
+        """Test archives whose index is missing are replayed after reading
+        every record header"""
+        with tempfile.TemporaryDirectory() as archive_dir:
+            archive_path = archive_dir + '/archive.bin'
+            response = requests.Response()
+            response.status_code = 404
+            response._content = b'missing'
+            capture = ResponseCapture(archive_path)
+            capture.store(get_archive_key('GET', 'http://example/a'),
+                          response)
+            capture.close()
+            os.remove(get_index_path(archive_path))
+
+            replay = ResponseReplay(archive_path)
+            replayed = replay.load(get_archive_key('GET',
+                                                   'http://example/a'))
+            replay.close()
+
+            self.assertEqual(replayed.status_code, 404)
+            self.assertEqual(replayed.text, 'missing')
+
+    def test_http_request_timeout(self):
+        """Test requests are sent with the configured timeouts"""
+        with patch('core.management.utils.http_client.get_session') as \
+                mock_session, self.settings(HTTP_CONNECT_TIMEOUT=2,
+                                            HTTP_READ_TIMEOUT=5):
+            mock_session.return_value.request.return_value = \
+                Mock(status_code=200)
+
+            http_client.get(self.xsr_api_endpoint_url)
+
+            self.assertEqual(
+                mock_session.return_value.request.call_args[1]['timeout'],
+                (2, 5))
+
+    def test_get_host_stats(self):
+        """Test request statistics are collected per host"""
+        with patch('core.management.utils.http_client.get_session') as \
+                mock_session, \
+                patch('core.management.utils.http_client.'
+                      'get_connection_counts', return_value=(1, 3)):
+            mock_session.return_value.request.return_value = \
+                Mock(status_code=200)
+
+            for _ in range(3):
+                http_client.get('http://stats.example/api')
+
+            host_stats = http_client.get_host_stats()['stats.example']
+            self.assertEqual(host_stats['requests'], 3)
+            self.assertEqual(host_stats['connections'], 1)
+            self.assertEqual(host_stats['reused_connections'], 2)
+
+    def test_get_eccr_uuid_cached(self):
+        """Test ECCR UUIDs are cached and each response is parsed once"""
+        with patch('core.management.utils.eccr_client.'
+                   'get_eccr_api_endpoint',
+                   return_value=self.eccr_host_example), \
+                patch('core.management.utils.eccr_client.'
+                      'http_client.request') as mock_response, \
+                self.settings(ECCR_CACHE_TTL=60):
+            mock_response.return_value.json.return_value = [
+                {'@id': '@id', '@type': '@type', 'name': {'@value': 'name'}}]
+            stats = get_eccr_cache_stats()
+
+            first = get_eccr_uuid('cached_code')
+            second = get_eccr_uuid('cached_code')
+
+            self.assertEqual(first, second)
+            self.assertEqual(first['job']['name'], 'name')
+            self.assertEqual(mock_response.call_count, 1)
+            self.assertEqual(mock_response.return_value.json.call_count, 1)
+            self.assertEqual(get_eccr_cache_stats()['hits'],
+                             stats['hits'] + 1)
+            self.assertEqual(get_eccr_cache_stats()['misses'],
+                             stats['misses'] + 1)
+
+    def test_get_eccr_uuid_endpoint_changed(self):
+        """Test changing the ECCR endpoint invalidates cached UUIDs"""
+        with patch('core.management.utils.eccr_client.'
+                   'get_eccr_api_endpoint') as mock_url, \
+                patch('core.management.utils.eccr_client.'
+                      'http_client.request') as mock_response, \
+                self.settings(ECCR_CACHE_TTL=60):
+            mock_response.return_value.json.return_value = []
+            mock_url.return_value = 'http://eccr-one'
+            get_eccr_uuid('changed_code')
+            mock_url.return_value = 'http://eccr-two'
+            get_eccr_uuid('changed_code')
+
+            self.assertEqual(mock_response.call_count, 2)
+
+    def test_search_eccr_uuids(self):
+        """Test combined ECCR searches match results to codes by marking"""
+        with patch('core.management.utils.eccr_client.'
+                   'http_client.request') as mock_response:
+            mock_response.return_value.json.return_value = [
+                {'@id': 'ref_b', 'markings': ['code_b']},
+                {'@id': 'ref_a', 'markings': 'code_a'},
+                {'@id': 'ref_a2', 'markings': [{'@value': 'code_a'}]}]
+
+            ret = search_eccr_uuids(self.eccr_host_example,
+                                    ['code_a', 'code_b', 'code_c'])
+
+            self.assertEqual(ret['code_a']['job']['reference'], 'ref_a')
+            self.assertEqual(ret['code_b']['job']['reference'], 'ref_b')
+            self.assertNotIn('code_c', ret)
+            self.assertEqual(mock_response.call_count, 1)
+            self.assertIn('markings:code_a OR markings:code_b',
+                          mock_response.call_args[1]['data']['data'])
+
+    def test_get_eccr_uuids(self):
+        """Test ECCR UUIDs are resolved in batches with a per code fallback
+        and cached"""
+        with patch('core.management.utils.eccr_client.'
+                   'get_eccr_api_endpoint',
+                   return_value=self.eccr_host_example), \
+                patch('core.management.utils.eccr_client.'
+                      'search_eccr_uuids') as mock_batch, \
+                patch('core.management.utils.eccr_client.'
+                      'search_eccr_uuid', return_value=None) as mock_single, \
+                self.settings(ECCR_CACHE_TTL=60, ECCR_BATCH_SIZE=2):
+            mock_batch.side_effect = lambda endpoint, codes: {
+                code: {'job': {'reference': code}} for code in codes
+                if code != 'batch_c'}
+            codes = ['batch_a', 'batch_b', 'batch_c']
+
+            first = get_eccr_uuids(codes)
+            second = get_eccr_uuids(codes)
+
+            self.assertEqual(first, second)
+            self.assertEqual(first['batch_a']['job']['reference'], 'batch_a')
+            self.assertIsNone(first['batch_c'])
+            self.assertEqual(mock_batch.call_count, 2)
+            mock_single.assert_called_once_with(self.eccr_host_example,
+                                                'batch_c')
+
+    @data(([], None), ([{'@id': ''}], None),
+          ([{'@id': 'ref'}], {'job': {'reference': 'ref', 'job_type': '',
+                                      'name': ''}}))
+    @unpack
+    def test_parse_eccr_job(self, results, expected):
+        """Test job references are created from ECCR search results"""
+        self.assertEqual(parse_eccr_job(results), expected)
+
     # Test cases for MODEL_HELP
 
     def test_bleach_data_to_json(self):
@@ -479,3 +1110,246 @@ class UtilsTests(TestSetUp):
         homoglyph_data = confusable_homoglyphs_check(
             self.source_metadata_overwrite)
         self.assertTrue(homoglyph_data)
+
+    def test_bleach_data_to_json_memoized(self):
+        """Test strings with the same content are bleached once"""
+        clear_sanitize_cache()
+        with patch('core.management.utils.model_help.bleach.clean',
+                   side_effect=lambda text, **kwargs: text.upper()) as \
+                mock_clean:
+            cleaned = bleach_data_to_json({'a': 'text &amp; more',
+                                           'b': {'c': 'text &amp; more'}})
+
+        self.assertEqual(cleaned, {'a': 'TEXT & MORE',
+                                   'b': {'c': 'TEXT & MORE'}})
+        self.assertEqual(mock_clean.call_count, 1)
+
+    def test_confusable_homoglyphs_check_ascii(self):
+        """Test ASCII strings skip the homoglyph lookup and dangerous
+        strings are still found"""
+        clear_sanitize_cache()
+        with patch('core.management.utils.model_help.confusables.'
+                   'is_dangerous', return_value=True) as mock_dangerous:
+            self.assertTrue(confusable_homoglyphs_check({'a': 'Alloc'}))
+            self.assertEqual(mock_dangerous.call_count, 0)
+
+        self.assertFalse(confusable_homoglyphs_check({'a': {'b': 'Alloρ'}}))
+        self.assertFalse(confusable_homoglyphs_check({'a': 'Alloρ'}))
+        self.assertGreater(get_sanitize_cache_stats()['hits'], 0)
+
+    def test_sanitize_metadata_batch_pool(self):
+        """Test large batches sanitized by a process pool keep their
+        order"""
+        metadata_list = [{'name': '<b>Name ' + str(num) + '</b>'}
+                         for num in range(4)] + [{'name': 'Alloρ'}]
+        with self.settings(SANITIZE_POOL_THRESHOLD=2):
+            sanitized = sanitize_metadata_batch(metadata_list,
+                                                max_processes=2)
+
+        self.assertEqual(sanitized[:4], [({'name': 'Name ' + str(num)}, True)
+                                         for num in range(4)])
+        self.assertEqual(sanitized[4], ({'name': 'Alloρ'}, False))
+
+    def test_init_sanitize_process(self):
+        """Test pool processes keep sanitized strings in memory only"""
+        with patch.object(model_help._sanitize_cache, 'persist_setting',
+                          'SANITIZE_CACHE_PERSIST'), \
+                self.settings(SANITIZE_CACHE_PERSIST=True):
+            init_sanitize_process()
+
+            self.assertFalse(model_help._sanitize_cache.is_persisted())
+
+    def test_uuid7(self):
+        """Test time ordered UUIDs keep the order they are created in"""
+        uuids = [uuid7() for _ in range(5000)]
+
+        self.assertEqual(uuids, sorted(uuids))
+        self.assertEqual(len(set(uuids)), len(uuids))
+        self.assertEqual({value.version for value in uuids}, {7})
+        self.assertEqual({value.variant for value in uuids},
+                         {uuid.RFC_4122})
+
+    def test_get_record_uuid(self):
+        """Test new ledger records get time ordered UUIDs when enabled"""
+        with self.settings(LEDGER_TIME_ORDERED_UUIDS=True):
+            self.assertEqual(get_record_uuid().version, 7)
+        with self.settings(LEDGER_TIME_ORDERED_UUIDS=False):
+            self.assertEqual(get_record_uuid().version, 4)
+
+    def test_schema_validator(self):
+        """Test compiled schemas find the fields dict_flatten finds
+        missing"""
+        validator = SchemaValidator(
+            ['Course.CourseCode', 'Course.CourseTitle', 'Course.Provider',
+             'Course.Section', 'Technical.Flag', 'dotted.key'],
+            ['Course.Notes', 'General.Keywords'],
+            {'Course.StartDate': 'datetime', 'Course.Hours': int,
+             'Course.Other': 'float'})
+        record = {'Course': {'CourseCode': 'ABC', 'CourseTitle': '',
+                             'Section': {}, 'Notes': 'notes',
+                             'StartDate': 'not a date', 'Hours': '4',
+                             'Other': 1.5},
+                  'Technical': {'Flag': False},
+                  'dotted.key': 'value',
+                  'General': 'text'}
+
+        result = validator.validate(record)
+
+        self.assertEqual(result.missing_required,
+                         ('Course.CourseTitle', 'Course.Provider',
+                          'Course.Section'))
+        self.assertEqual(result.missing_recommended, ('General.Keywords',))
+        self.assertEqual(result.datatype_errors,
+                         ('Course.StartDate', 'Course.Hours'))
+        self.assertEqual(result.validation_result, 'N')
+
+        flattened = dict_flatten(record, [])
+        for field in result.missing_required + result.missing_recommended:
+            self.assertFalse(flattened.get(field))
+
+    def test_schema_validator_validate_batch(self):
+        """Test batches of records get the results of validating each
+        record"""
+        validator = SchemaValidator(
+            ['Course.CourseCode', 'Course.Section.Code', 'Technical.Flag',
+             'dotted.key'],
+            ['Course.Notes', 'General.Keywords'],
+            {'Course.StartDate': 'datetime', 'Course.Hours': int})
+        records = [
+            {'Course': {'CourseCode': 'ABC', 'Section': {'Code': ''},
+                        'StartDate': '2021-01-01', 'Hours': 4},
+             'Technical': {'Flag': False}, 'dotted.key': 'value'},
+            {'Course': 'text', 'Technical': {}, 'General': {'Keywords': 1}},
+            {'Course.Section': {'Code': 'A1'}, 'Course': {'Hours': '4'},
+             'dotted': {'key': ''}},
+            {}]
+
+        results = validator.validate_batch(records)
+
+        self.assertEqual(results,
+                         [validator.validate(record) for record in records])
+        self.assertEqual(results[0].missing_required, ('Course.Section.Code',))
+        self.assertEqual(results[2].missing_required,
+                         ('Course.CourseCode', 'Technical.Flag',
+                          'dotted.key'))
+        self.assertEqual(results[2].datatype_errors, ('Course.Hours',))
+        self.assertEqual(validator.validate_batch([]), [])
+
+    def test_iter_validated_rows_in_chunks(self):
+        """Test rows are read and validated in chunks of
+        LEDGER_UPDATE_BATCH_SIZE rows"""
+        validator = SchemaValidator(['Code'], [])
+        rows = ({'metadata': {'Code': str(row) if row % 2 else ''}}
+                for row in range(5))
+
+        with self.settings(LEDGER_UPDATE_BATCH_SIZE=2), \
+                patch.object(validator, 'validate_batch',
+                             wraps=validator.validate_batch) as mock_batch:
+            validated = [(index, result.validation_result) for index, _,
+                         result in iter_validated_rows(validator, rows,
+                                                       'metadata')]
+
+        self.assertEqual(validated, [(0, 'N'), (1, 'Y'), (2, 'N'), (3, 'Y'),
+                                     (4, 'N')])
+        self.assertEqual([len(call[0][0]) for call in
+                          mock_batch.call_args_list], [2, 2, 1])
+
+    def test_schema_validator_from_schema(self):
+        """Test validators are compiled from XSS schemas"""
+        validator = SchemaValidator.from_schema(
+            {'Course': {'CourseCode': {'use': 'Required'},
+                        'CourseTitle': {'use': 'Recommended'}}})
+
+        result = validator.validate({'Course': {'CourseCode': 'ABC'}})
+
+        self.assertEqual(result.validation_result, 'Y')
+        self.assertEqual(result.missing_recommended, ('Course.CourseTitle',))
+
+    def test_validation_report_sampled(self):
+        """Test validation outcomes are counted per field and only a sample
+        of failing records is logged field by field"""
+        report = ValidationReport('validate_target')
+        failing = ValidationResult(('Course.CourseCode',),
+                                   ('Course.Notes',), ())
+        with self.settings(VALIDATION_LOG_SAMPLE=1,
+                           VALIDATION_FAILURE_TABLE=False), \
+                patch('core.management.utils.validation_report.'
+                      'log_validation_result') as mock_log:
+            report.add(0, failing, 'key0')
+            report.add(1, ValidationResult((), (), ()), 'key1')
+            report.add(2, failing, 'key2')
+            report.log_summary()
+
+            self.assertEqual(mock_log.call_count, 1)
+        self.assertEqual(report.records, 3)
+        self.assertEqual(report.invalid_records, 2)
+        self.assertEqual(report.missing_required['Course.CourseCode'], 2)
+        self.assertEqual(report.missing_recommended['Course.Notes'], 2)
+        self.assertFalse(ValidationFailure.objects.exists())
+
+    def test_validation_report_failure_table(self):
+        """Test failing fields are stored when the failure table is on"""
+        report = ValidationReport('validate_source')
+        with self.settings(VALIDATION_FAILURE_TABLE=True):
+            report.add(0, ValidationResult(('KEY',), (), ('End_date',)),
+                       'key0')
+            report.log_summary()
+
+        self.assertEqual(
+            set(ValidationFailure.objects.values_list(
+                'stage', 'metadata_key_hash', 'category', 'field_name')),
+            {('validate_source', 'key0', 'Required', 'KEY'),
+             ('validate_source', 'key0', 'datatype', 'End_date')})
+
+    def create_claimable_records(self, count):
+        """Create active ledger records for the claim tests"""
+        MetadataLedger.objects.bulk_create(
+            [MetadataLedger(record_lifecycle_status='Active',
+                            source_metadata={'row': row},
+                            source_metadata_key='key_' + str(row),
+                            source_metadata_key_hash='key_' + str(row))
+             for row in range(count)])
+        return MetadataLedger.objects.filter(record_lifecycle_status='Active')
+
+    def test_claim_records_disjoint(self):
+        """Test workers claiming records of a stage get disjoint batches"""
+        queryset = self.create_claimable_records(5)
+
+        first = set(claim_records(queryset, 'transform', 3, 60))
+        second = set(claim_records(queryset, 'transform', 3, 60))
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertFalse(first & second)
+        self.assertIsNone(claim_records(queryset, 'transform', 3, 60))
+
+    def test_claim_records_expired_or_other_stage(self):
+        """Test expired claims and claims of other stages are claimed
+        again"""
+        queryset = self.create_claimable_records(2)
+        claim_records(queryset, 'validate_source', 2, 60)
+
+        self.assertEqual(len(claim_records(queryset, 'transform', 2, 60)), 2)
+        self.assertIsNone(claim_records(queryset, 'transform', 2, 60))
+
+        queryset.update(claim_expires=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(claim_records(queryset, 'transform', 2, 60)), 2)
+
+    def test_extend_claim(self):
+        """Test renewed claims are not taken over by another worker"""
+        queryset = self.create_claimable_records(2)
+        claimed = claim_records(queryset, 'load', 2, 60)
+        queryset.update(claim_expires=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(extend_claim(claimed, 'transform', 60), 0)
+        self.assertEqual(extend_claim(claimed, 'load', 60), 2)
+        self.assertIsNone(claim_records(queryset, 'load', 2, 60))
+
+    def test_iter_claimed_batches(self):
+        """Test batches are claimed until no records are left"""
+        queryset = self.create_claimable_records(5)
+
+        batches = [len(batch) for batch in
+                   iter_claimed_batches(queryset, 'load', 2, 60)]
+
+        self.assertEqual(batches, [2, 2, 1])
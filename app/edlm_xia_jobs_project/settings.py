@@ -212,3 +212,148 @@ if os.environ.get('TMP_SOURCE_DIR') is not None and\
 else:
     TMP_SOURCE_DIR = os.path.join(BASE_DIR, 'tmp', 'source')
 TMP_SOURCE_DIR = os.path.join(TMP_SOURCE_DIR, '')
+
+# Number of workers used to retrieve CWR codes from XSR concurrently and the
+# maximum number of code requests pending at a time. A single worker
+# retrieves codes one after another.
+
+XSR_MAX_WORKERS = int(os.environ.get('XSR_MAX_WORKERS', 1))
+XSR_MAX_IN_FLIGHT = int(os.environ.get('XSR_MAX_IN_FLIGHT',
+                                       XSR_MAX_WORKERS * 2))
+
+# Number of XSR configurations extracted at the same time. Each XSR uses its
+# own max_workers, or XSR_MAX_WORKERS when it is not set. A single source
+# extracts XSR configurations one after another.
+
+XSR_MAX_SOURCES = int(os.environ.get('XSR_MAX_SOURCES', 1))
+
+# Number of search results requested from XSR per page. Pages are retrieved
+# until the page count reported by XSR is reached.
+
+XSR_RESULTS_PER_PAGE = int(os.environ.get('XSR_RESULTS_PER_PAGE', 500))
+
+# Number of seconds extraction progress is reused for when resuming with
+# extract_source_metadata --resume. Codes started earlier are extracted again
+# from the first page.
+
+XSR_CHECKPOINT_MAX_AGE = int(os.environ.get('XSR_CHECKPOINT_MAX_AGE',
+                                            24 * 60 * 60))
+
+# Outbound HTTP connection pool, timeouts (in seconds) and retries for
+# idempotent requests. Retries wait HTTP_BACKOFF_FACTOR * 2 ** attempt
+# seconds before sending the request again. Every worker of every XSR
+# extracted at the same time may hold a connection, so HTTP_POOL_MAXSIZE
+# has to be raised along with a per-XSR max_workers above XSR_MAX_WORKERS.
+
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 10))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 120))
+HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 3))
+HTTP_BACKOFF_FACTOR = float(os.environ.get('HTTP_BACKOFF_FACTOR', 0.5))
+HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 10))
+HTTP_POOL_MAXSIZE = int(os.environ.get(
+    'HTTP_POOL_MAXSIZE', max(XSR_MAX_SOURCES * XSR_MAX_WORKERS, 10)))
+
+# Cache of XSR responses used to send conditional requests. Pages of search
+# results that are unchanged since they were cached are not extracted again.
+
+XSR_CONDITIONAL_REQUESTS = os.environ.get(
+    'XSR_CONDITIONAL_REQUESTS', 'true').lower() in ('true', '1', 'yes')
+XSR_RESPONSE_CACHE_DIR = os.environ.get(
+    'XSR_RESPONSE_CACHE_DIR', os.path.join(BASE_DIR, 'tmp', 'xsr_cache'))
+
+# Archive of XSR, ECCR and XSS responses used to benchmark extraction
+# offline. "capture" writes every response received to the archive and
+# "replay" serves responses from the archive without using the network.
+# Conditional XSR requests are not sent while responses are archived.
+
+RESPONSE_ARCHIVE_MODE = os.environ.get('RESPONSE_ARCHIVE_MODE', '').lower()
+RESPONSE_ARCHIVE_PATH = os.environ.get(
+    'RESPONSE_ARCHIVE_PATH',
+    os.path.join(BASE_DIR, 'tmp', 'response_archive.bin'))
+
+# Number of seconds ECCR UUIDs looked up for CWR codes are kept in the cache.
+# Set to 0 to look up every code on every run.
+
+ECCR_CACHE_TTL = int(os.environ.get('ECCR_CACHE_TTL', 7 * 24 * 60 * 60))
+
+# Number of CWR codes combined into a single ECCR search when resolving ECCR
+# UUIDs before extraction. Codes the combined search does not resolve are
+# searched one at a time.
+
+ECCR_BATCH_SIZE = int(os.environ.get('ECCR_BATCH_SIZE', 25))
+
+# Number of HTML fields whose converted text is kept in memory during
+# extraction, and whether converted text is also kept in the cache for
+# HTML_CACHE_TTL seconds so later runs can reuse it.
+
+HTML_CACHE_SIZE = int(os.environ.get('HTML_CACHE_SIZE', 4096))
+HTML_CACHE_PERSIST = os.environ.get(
+    'HTML_CACHE_PERSIST', 'false').lower() in ('true', '1', 'yes')
+HTML_CACHE_TTL = int(os.environ.get('HTML_CACHE_TTL', 7 * 24 * 60 * 60))
+
+# Number of strings whose sanitized text and homoglyph verdict are kept in
+# memory, and whether they are also kept in the cache for SANITIZE_CACHE_TTL
+# seconds so later runs can reuse them.
+
+SANITIZE_CACHE_SIZE = int(os.environ.get('SANITIZE_CACHE_SIZE', 16384))
+SANITIZE_CACHE_PERSIST = os.environ.get(
+    'SANITIZE_CACHE_PERSIST', 'false').lower() in ('true', '1', 'yes')
+SANITIZE_CACHE_TTL = int(os.environ.get('SANITIZE_CACHE_TTL',
+                                        7 * 24 * 60 * 60))
+
+# Number of strings that are not ISO 8601 dates whose date check result is
+# kept in memory.
+
+DATE_CACHE_SIZE = int(os.environ.get('DATE_CACHE_SIZE', 4096))
+
+# Number of processes sanitizing batches of at least SANITIZE_POOL_THRESHOLD
+# records before they are stored. A single process sanitizes every batch
+# itself.
+
+SANITIZE_MAX_PROCESSES = int(os.environ.get('SANITIZE_MAX_PROCESSES', 1))
+SANITIZE_POOL_THRESHOLD = int(os.environ.get('SANITIZE_POOL_THRESHOLD',
+                                             2000))
+
+# Create time ordered (version 7 layout) UUIDs for new MetadataLedger
+# records, so inserts append to the primary key index instead of splitting
+# pages at random.
+
+LEDGER_TIME_ORDERED_UUIDS = os.environ.get(
+    'LEDGER_TIME_ORDERED_UUIDS', 'false').lower() in ('true', '1', 'yes')
+
+# Inactive MetadataLedger records older than LEDGER_RETENTION_DAYS days are
+# moved to compressed history files in LEDGER_ARCHIVE_DIR by the
+# purge_inactive_metadata command, LEDGER_PURGE_BATCH_SIZE records at a time.
+
+LEDGER_RETENTION_DAYS = int(os.environ.get('LEDGER_RETENTION_DAYS', 90))
+LEDGER_PURGE_BATCH_SIZE = int(os.environ.get('LEDGER_PURGE_BATCH_SIZE', 1000))
+LEDGER_ARCHIVE_DIR = os.environ.get(
+    'LEDGER_ARCHIVE_DIR', os.path.join(BASE_DIR, 'tmp', 'ledger_archive'))
+
+# Validation, transformation and loading claim LEDGER_CLAIM_BATCH_SIZE
+# MetadataLedger records at a time for LEDGER_CLAIM_LEASE seconds, so
+# several processes running the same stage work on disjoint records.
+# Loading renews the lease before posting each record of a batch.
+
+LEDGER_CLAIM_BATCH_SIZE = int(os.environ.get('LEDGER_CLAIM_BATCH_SIZE', 500))
+LEDGER_CLAIM_LEASE = int(os.environ.get('LEDGER_CLAIM_LEASE', 900))
+
+# Validation checks LEDGER_UPDATE_BATCH_SIZE records at a time and writes
+# their results with one update per outcome.
+
+LEDGER_UPDATE_BATCH_SIZE = int(os.environ.get('LEDGER_UPDATE_BATCH_SIZE',
+                                              500))
+
+# Validation logs a summary of missing and mistyped fields per run, the
+# fields of the first VALIDATION_LOG_SAMPLE records failing validation and
+# those of the others at debug level. With VALIDATION_FAILURE_TABLE set the
+# failing fields of every record are also stored in ValidationFailure.
+
+VALIDATION_LOG_SAMPLE = int(os.environ.get('VALIDATION_LOG_SAMPLE', 10))
+VALIDATION_FAILURE_TABLE = os.environ.get(
+    'VALIDATION_FAILURE_TABLE', 'false').lower() in ('true', '1', 'yes')
+
+# Digest used to hash the canonical JSON of source and target metadata.
+# Changing it makes every record look changed on the next run.
+
+METADATA_HASH_ALGORITHM = os.environ.get('METADATA_HASH_ALGORITHM', 'blake2b')